@@ -4,7 +4,7 @@ except ImportError:
     from urllib.request import urlopen, URLError
 from bs4 import BeautifulSoup
 from os.path import join, dirname, basename
-from os import makedirs
+from os import makedirs, fstat
 from errno import EEXIST
 from threading import Thread
 try:
@@ -15,7 +15,13 @@ from re import compile, sub
 from sys import stderr, stdout
 from itertools import takewhile
 import argparse
-from json import dump, load
+from json import dump, load, loads, JSONDecoder
+from mmap import mmap, ACCESS_READ
+from collections import Mapping
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 from zipfile import ZipFile
 from tempfile import gettempdir
 import warnings
@@ -32,6 +38,7 @@ RootPackURL = "http://www.keil.com/pack/index.idx"
 LocalPackDir = dirname(__file__)
 LocalPackIndex = join(LocalPackDir, "index.json")
 LocalPackAliases = join(LocalPackDir, "aliases.json")
+LocalPackOffsets = join(LocalPackDir, ".index_offsets")
 
 
 protocol_matcher = compile("\w*://")
@@ -64,6 +71,138 @@ class Reader (Thread) :
             self.queue.task_done()
 
 
+whitespace_matcher = compile(r"\s*")
+
+class DeviceIndex (Mapping) :
+    """A read-only view of a device index, such as index.json, that only
+    parses the devices that are looked up.
+
+    The index file is memory-mapped, and the location of the description of
+    every device within it is found once and kept in the offsets file, for
+    as long as the index file is not modified. Looking up a device then only
+    reads and parses the description of that device.
+
+    :param filename: The device index to view
+    :type filename: str
+    :param offsets_filename: Where to keep the locations of the devices
+    :type offsets_filename: str
+    """
+    def __init__ (self, filename=LocalPackIndex,
+                  offsets_filename=LocalPackOffsets) :
+        self.filename = filename
+        self.offsets_filename = offsets_filename
+        self._map = None
+        self._offsets = None
+        self._devices = {}
+
+    def _open (self) :
+        if self._offsets is not None :
+            return
+        with open(self.filename, "rb") as fd :
+            info = fstat(fd.fileno())
+            stamp = (info.st_size, info.st_mtime)
+            data = (mmap(fd.fileno(), 0, access=ACCESS_READ)
+                    if info.st_size else b"")
+        offsets = None
+        try :
+            with open(self.offsets_filename, "rb") as fd :
+                cached_stamp, offsets = pickle.load(fd)
+            if cached_stamp != stamp :
+                offsets = None
+        except Exception :
+            offsets = None
+        if offsets is None :
+            offsets = self._find_offsets(data)
+            try :
+                with open(self.offsets_filename, "wb") as fd :
+                    pickle.dump((stamp, offsets), fd, protocol=2)
+            except (IOError, OSError) :
+                pass
+        self._map = data
+        self._offsets = offsets
+
+    @staticmethod
+    def _find_offsets (data) :
+        """Find the (start, end) byte offsets of the description of every
+        device within the JSON object of a device index.
+
+        The index is decoded as latin-1, so that the character offsets are
+        also byte offsets.
+        """
+        text = data[:].decode("latin-1")
+        decoder = JSONDecoder()
+        skip = lambda pos : whitespace_matcher.match(text, pos).end()
+        offsets = {}
+        pos = skip(0)
+        if text[pos:pos + 1] != "{" :
+            raise ValueError("The device index is not a JSON object")
+        pos = skip(pos + 1)
+        if text[pos:pos + 1] == "}" :
+            return offsets
+        while True :
+            name, pos = decoder.raw_decode(text, pos)
+            pos = skip(pos)
+            if text[pos:pos + 1] != ":" :
+                raise ValueError("Expecting ':' at offset %d" % pos)
+            start = skip(pos + 1)
+            _, end = decoder.raw_decode(text, start)
+            offsets[name] = (start, end)
+            pos = skip(end)
+            if text[pos:pos + 1] == "," :
+                pos = skip(pos + 1)
+            elif text[pos:pos + 1] == "}" :
+                return offsets
+            else :
+                raise ValueError("Expecting ',' or '}' at offset %d" % pos)
+
+    def close (self) :
+        """Unmap the index file, so that it may be replaced"""
+        if self._map is not None and not isinstance(self._map, bytes) :
+            self._map.close()
+        self._map = None
+        self._offsets = None
+        self._devices = {}
+
+    def __getitem__ (self, name) :
+        try :
+            return self._devices[name]
+        except KeyError :
+            pass
+        self._open()
+        start, end = self._offsets[name]
+        device = loads(self._map[start:end].decode("utf-8"))
+        self._devices[name] = device
+        return device
+
+    def __contains__ (self, name) :
+        self._open()
+        return name in self._offsets
+
+    def __iter__ (self) :
+        self._open()
+        return iter(self._offsets)
+
+    def __len__ (self) :
+        self._open()
+        return len(self._offsets)
+
+
+_device_index = None
+
+def shared_device_index () :
+    """Get the DeviceIndex of the local index.json shared by this process"""
+    global _device_index
+    if _device_index is None :
+        _device_index = DeviceIndex()
+    return _device_index
+
+def _close_shared_device_index () :
+    global _device_index
+    if _device_index is not None :
+        _device_index.close()
+        _device_index = None
+
+
 class Cache () :
     """ The Cache object is the only relevant API object at the moment
 
@@ -321,6 +460,7 @@ class Cache () :
         self._index = {}
         self.counter = 0
         do_queue(Reader, self._generate_index_helper, self.get_urls())
+        _close_shared_device_index()
         with open(LocalPackIndex, "wb+") as out:
             self._index["version"] = "0.1.0"
             dump(self._index, out)
@@ -342,7 +482,7 @@ class Cache () :
 
     def dump_index_to_file(self, file) :
         with open(file, "wb+") as out:
-            dump(self.index, out)
+            dump(dict(self.index), out)
 
     @property
     def index(self) :
@@ -366,10 +506,11 @@ class Cache () :
                      u'IROM1': {u'size': u'0x80000', u'start': u'0x00000000'}}}
 
 
+        The index of index.json is shared by all Cache objects, and only
+        parses the devices that are looked up; see DeviceIndex.
         """
         if not self._index :
-            with open(LocalPackIndex) as i :
-                self._index = load(i)
+            self._index = shared_device_index()
         return self._index
     @property
     def aliases(self) :
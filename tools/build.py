@@ -38,6 +38,7 @@ from tools.options import extract_mcus
 from tools.build_api import build_library, build_mbed_libs, build_lib
 from tools.build_api import mcu_toolchain_matrix
 from tools.build_api import print_build_results
+from tools.build_scheduler import Build, run_builds
 from tools.settings import CPPCHECK_CMD, CPPCHECK_MSG_FORMAT
 from tools.settings import CPPCHECK_CMD, CPPCHECK_MSG_FORMAT, CLI_COLOR_MAP
 from tools.notifier.term import TerminalNotifier
@@ -54,7 +55,10 @@ if __name__ == '__main__':
                         default=None, help="The source (input) directory", action="append")
 
     parser.add_argument("--build", dest="build_dir", type=argparse_dir_not_parent(ROOT),
-                      default=None, help="The build (output) directory")
+                      default=None, help="The build (output) directory. When "
+                      "more than one target or toolchain is built, each "
+                      "builds into its own <build>/<target>/<toolchain> "
+                      "subdirectory")
 
     parser.add_argument("--no-archive", dest="no_archive", action="store_true",
                       default=False, help="Do not produce archive (.ar) file, but rather .o")
@@ -175,6 +179,15 @@ if __name__ == '__main__':
                                "Currently set search path: %s"
                        % (toolchain, search_path))
 
+    # One build of the mbed library, or of the library in --source, for
+    # every target and toolchain, followed by the additional libraries.
+    # The builds of different targets and toolchains run at once, so with
+    # --source each of them needs a build directory of its own.
+    builds = []
+    built = []
+    separate_build_dirs = len([
+        None for toolchain in toolchains for target in targets
+        if toolchain in TARGET_MAP[target].supported_toolchains]) > 1
     for toolchain in toolchains:
         for target in targets:
             tt_id = "%s::%s" % (toolchain, target)
@@ -182,52 +195,65 @@ if __name__ == '__main__':
                 # Log this later
                 print("%s skipped: toolchain not supported" % tt_id)
                 skipped.append(tt_id)
+                continue
+
+            built.append(tt_id)
+            notify = TerminalNotifier(options.verbose, options.silent)
+            mcu = TARGET_MAP[target]
+            profile = extract_profile(parser, options, toolchain)
+            if options.source_dir:
+                build_dir = options.build_dir
+                if separate_build_dirs:
+                    build_dir = join(build_dir, target, toolchain)
+                builds.append(Build(
+                    (tt_id, None), build_library,
+                    (options.source_dir, build_dir, mcu, toolchain),
+                    dict(jobs=options.jobs,
+                         clean=options.clean,
+                         archive=(not options.no_archive),
+                         macros=options.macros,
+                         name=options.artifact_name,
+                         build_profile=profile,
+                         ignore=options.ignore,
+                         notify=notify)))
             else:
-                try:
-                    notify = TerminalNotifer(options.verbose, options.silent)
-                    mcu = TARGET_MAP[target]
-                    profile = extract_profile(parser, options, toolchain)
-                    if options.source_dir:
-                        lib_build_res = build_library(
-                            options.source_dir, options.build_dir, mcu, toolchain,
-                            jobs=options.jobs,
-                            clean=options.clean,
-                            archive=(not options.no_archive),
-                            macros=options.macros,
-                            name=options.artifact_name,
-                            build_profile=profile,
-                            ignore=options.ignore,
-                        )
-                    else:
-                        lib_build_res = build_mbed_libs(
-                            mcu, toolchain,
-                            jobs=options.jobs,
-                            clean=options.clean,
-                            macros=options.macros,
-                            build_profile=profile,
-                            ignore=options.ignore,
-                        )
-
-                    for lib_id in libraries:
-                        build_lib(
-                            lib_id, mcu, toolchain,
-                            clean=options.clean,
-                            macros=options.macros,
-                            jobs=options.jobs,
-                            build_profile=profile,
-                            ignore=options.ignore,
-                        )
-                    if lib_build_res:
-                        successes.append(tt_id)
-                    else:
-                        skipped.append(tt_id)
-                except Exception as e:
-                    if options.verbose:
-                        import traceback
-                        traceback.print_exc(file=sys.stdout)
-                        sys.exit(1)
-                    failures.append(tt_id)
-                    print(e)
+                builds.append(Build(
+                    (tt_id, None), build_mbed_libs, (mcu, toolchain),
+                    dict(jobs=options.jobs,
+                         clean=options.clean,
+                         macros=options.macros,
+                         build_profile=profile,
+                         ignore=options.ignore,
+                         notify=notify)))
+
+            for lib_id in libraries:
+                builds.append(Build(
+                    (tt_id, lib_id), build_lib, (lib_id, mcu, toolchain),
+                    dict(clean=options.clean,
+                         macros=options.macros,
+                         jobs=options.jobs,
+                         build_profile=profile,
+                         ignore=options.ignore,
+                         notify=notify),
+                    depends=[(tt_id, None)]))
+
+    def build_done(key, result):
+        if result.status == "FAIL":
+            if options.verbose:
+                print(result.traceback)
+            print(result.reason)
+
+    results = run_builds(builds, jobs=options.jobs, notify=build_done)
+
+    for tt_id in built:
+        tt_results = [result for key, result in results.items()
+                      if key[0] == tt_id]
+        if any(result.status == "FAIL" for result in tt_results):
+            failures.append(tt_id)
+        elif results[(tt_id, None)].value:
+            successes.append(tt_id)
+        else:
+            skipped.append(tt_id)
 
     # Write summary of the builds
     print("\nCompleted in: (%.2f)s\n" % (time() - start))
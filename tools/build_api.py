@@ -28,15 +28,15 @@ from os.path import join, exists, dirname, basename, abspath, normpath, splitext
 from os.path import relpath
 from os import linesep, remove, makedirs
 from time import time
-from intelhex import IntelHex
 from json import load, dump
 from jinja2 import FileSystemLoader
 from jinja2.environment import Environment
 
 from .arm_pack_manager import Cache
+from .flash_image import FlashImage
 from .utils import (mkdir, run_cmd, run_cmd_ext, NotSupportedException,
                     ToolException, InvalidReleaseTargetException,
-                    intelhex_offset, integer)
+                    integer)
 from .paths import (MBED_CMSIS_PATH, MBED_TARGETS_PATH, MBED_LIBRARIES,
                     MBED_HEADER, MBED_DRIVERS, MBED_PLATFORM, MBED_HAL,
                     MBED_CONFIG_FILE, MBED_LIBRARIES_DRIVERS,
@@ -120,13 +120,19 @@ def add_result_to_report(report, result):
     result_wrap = {0: result}
     report[target][toolchain][id_name].append(result_wrap)
 
-def get_config(src_paths, target, toolchain_name, app_config=None):
+def get_config(src_paths, target, toolchain_name, app_config=None,
+               build_profile=None):
     """Get the configuration object for a target-toolchain combination
 
     Positional arguments:
     src_paths - paths to scan for the configuration files
     target - the device we are building for
     toolchain_name - the string that identifies the build tools
+
+    Keyword arguments:
+    app_config - location of a chosen mbed_app.json file
+    build_profile - the build profile of the builds that will use the
+                    feature scans of this process
     """
     # Convert src_paths to a list if needed
     if not isinstance(src_paths, list):
@@ -134,7 +140,8 @@ def get_config(src_paths, target, toolchain_name, app_config=None):
 
     # Pass all params to the unified prepare_resources()
     toolchain = prepare_toolchain(src_paths, None, target, toolchain_name,
-                                  app_config=app_config)
+                                  app_config=app_config,
+                                  build_profile=build_profile)
 
     # Scan src_path for config files
     resources = toolchain.scan_resources(src_paths[0])
@@ -301,7 +308,7 @@ def target_supports_toolchain(target, toolchain_name):
 def prepare_toolchain(src_paths, build_dir, target, toolchain_name,
                       macros=None, clean=False, jobs=1,
                       notify=None, config=None, app_config=None,
-                      build_profile=None, ignore=None):
+                      build_profile=None, ignore=None, job_server=None):
     """ Prepares resource related objects - toolchain, target, config
 
     Positional arguments:
@@ -318,6 +325,8 @@ def prepare_toolchain(src_paths, build_dir, target, toolchain_name,
     app_config - location of a chosen mbed_app.json file
     build_profile - a list of mergeable build profiles
     ignore - list of paths to add to mbedignore
+    job_server - a JobServer limiting the compiles running at once across
+                 builds
     """
 
     # We need to remove all paths which are repeated to avoid
@@ -347,6 +356,7 @@ def prepare_toolchain(src_paths, build_dir, target, toolchain_name,
 
     toolchain.config = config
     toolchain.jobs = jobs
+    toolchain.job_server = job_server
     toolchain.build_all = clean
 
     if ignore:
@@ -358,26 +368,50 @@ def _printihex(ihex):
     import pprint
     pprint.PrettyPrinter().pprint(ihex.todict())
 
-def _real_region_size(region):
-    try:
-        part = intelhex_offset(region.filename, offset=region.start)
-        return (part.maxaddr() - part.minaddr()) + 1
-    except AttributeError:
+def _region_image(region, images):
+    """Load the contents of a region once, as a FlashImage
+
+    Positional arguments:
+    region - the region to load
+    images - a dictionary caching the images of regions by region name
+    """
+    if region.name not in images:
+        images[region.name] = FlashImage.from_file(region.filename,
+                                                   region.start)
+    return images[region.name]
+
+def _real_region_size(region, images=None):
+    if isinstance(region.filename, list):
         return region.size
+    if images is None:
+        with FlashImage.from_file(region.filename, region.start) as part:
+            return (part.maxaddr() - part.minaddr()) + 1
+    part = _region_image(region, images)
+    return (part.maxaddr() - part.minaddr()) + 1
 
 
-def _fill_header(region_list, current_region):
+def _fill_header(region_list, current_region, images=None):
     """Fill an application header region
 
     This is done it three steps:
      * Fill the whole region with zeros
      * Fill const, timestamp and size entries with their data
      * Fill the digests using this header as the header region
+
+    Every region that the header refers to is loaded once, into *images*,
+    and its digests are computed over its contents a chunk at a time.
     """
+    if images is None:
+        images = {}
+        try:
+            return _fill_header(region_list, current_region, images)
+        finally:
+            for image in images.values():
+                image.close()
     region_dict = {r.name: r for r in region_list}
-    header = IntelHex()
-    header.puts(current_region.start, b'\x00' * current_region.size)
-    start = current_region.start
+    header = bytearray(current_region.size)
+    view = memoryview(header)
+    start = 0
     for member in current_region.filename:
         _, type, subtype, data = member
         member_size = Config.header_member_size(member)
@@ -386,80 +420,96 @@ def _fill_header(region_list, current_region):
                 "8le": ">B", "16le": "<H", "32le": "<L", "64le": "<Q",
                 "8be": "<B", "16be": ">H", "32be": ">L", "64be": ">Q"
             }[subtype]
-            header.puts(start, struct.pack(fmt, integer(data, 0)))
+            value = struct.pack(fmt, integer(data, 0))
         elif type == "timestamp":
             fmt = {"32le": "<L", "64le": "<Q",
                    "32be": ">L", "64be": ">Q"}[subtype]
-            header.puts(start, struct.pack(fmt, time()))
+            value = struct.pack(fmt, int(time()))
         elif type == "size":
             fmt = {"32le": "<L", "64le": "<Q",
                    "32be": ">L", "64be": ">Q"}[subtype]
-            size = sum(_real_region_size(region_dict[r]) for r in data)
-            header.puts(start, struct.pack(fmt, size))
+            size = sum(_real_region_size(region_dict[r], images) for r in data)
+            value = struct.pack(fmt, size)
         elif type  == "digest":
             if data == "header":
-                ih = header[:start]
+                chunks = [view[:start].tobytes()]
             else:
-                ih = intelhex_offset(region_dict[data].filename, offset=region_dict[data].start)
+                chunks = _region_image(region_dict[data], images).chunks()
             if subtype.startswith("CRCITT32"):
-                fmt = {"CRCITT32be": ">l", "CRCITT32le": "<l"}[subtype]
-                header.puts(start, struct.pack(fmt, zlib.crc32(ih.tobinarray())))
+                fmt = {"CRCITT32be": ">L", "CRCITT32le": "<L"}[subtype]
+                crc = 0
+                for chunk in chunks:
+                    crc = zlib.crc32(chunk, crc)
+                value = struct.pack(fmt, crc & 0xFFFFFFFF)
             elif subtype.startswith("SHA"):
                 if subtype == "SHA256":
                     hash = hashlib.sha256()
                 elif subtype == "SHA512":
                     hash = hashlib.sha512()
-                hash.update(ih.tobinarray())
-                header.puts(start, hash.digest())
-        start += Config.header_member_size(member)
-    return header
+                for chunk in chunks:
+                    hash.update(chunk)
+                value = hash.digest()
+        else:
+            value = b""
+        header[start:start + len(value)] = value
+        start += member_size
+    image = FlashImage()
+    image.add(current_region.start, bytes(header))
+    return image
 
 def merge_region_list(region_list, destination, notify, padding=b'\xFF'):
     """Merge the region_list into a single image
 
+    The regions are kept as contiguous buffers, with large binaries memory
+    mapped, and the image is written out a piece at a time.
+
     Positional Arguments:
     region_list - list of regions, which should contain filenames
     destination - file name to write all regions to
     padding - bytes to fill gapps with
     """
-    merged = IntelHex()
+    merged = FlashImage()
+    images = {}
     _, format = splitext(destination)
 
     notify.info("Merging Regions")
 
-    for region in region_list:
-        if region.active and not region.filename:
-            raise ToolException("Active region has no contents: No file found.")
-        if isinstance(region.filename, list):
-            header_basename, _ = splitext(destination)
-            header_filename = header_basename + "_header.hex"
-            _fill_header(region_list, region).tofile(header_filename, format='hex')
-            region = region._replace(filename=header_filename)
-        if region.filename:
-            notify.info("  Filling region %s with %s" % (region.name, region.filename))
-            part = intelhex_offset(region.filename, offset=region.start)
-            part.start_addr = None
-            part_size = (part.maxaddr() - part.minaddr()) + 1
-            if part_size > region.size:
-                raise ToolException("Contents of region %s does not fit"
-                                    % region.name)
-            merged.merge(part)
-            pad_size = region.size - part_size
-            if pad_size > 0 and region != region_list[-1]:
-                notify.info("  Padding region %s with 0x%x bytes" %
-                            (region.name, pad_size))
-                if format is ".hex":
-                    """The offset will be in the hex file generated when we're done,
-                    so we can skip padding here"""
-                else:
-                    merged.puts(merged.maxaddr() + 1, padding * pad_size)
-
-    if not exists(dirname(destination)):
-        makedirs(dirname(destination))
-    notify.info("Space used after regions merged: 0x%x" %
-                (merged.maxaddr() - merged.minaddr() + 1))
-    with open(destination, "wb+") as output:
-        merged.tofile(output, format=format.strip("."))
+    try:
+        for region in region_list:
+            if region.active and not region.filename:
+                raise ToolException("Active region has no contents: No file found.")
+            if isinstance(region.filename, list):
+                header_basename, _ = splitext(destination)
+                header_filename = header_basename + "_header.hex"
+                images[region.name] = _fill_header(region_list, region, images)
+                with open(header_filename, "wb") as header_file:
+                    images[region.name].tofile(header_file, format='hex')
+                region = region._replace(filename=header_filename)
+            if region.filename:
+                notify.info("  Filling region %s with %s" % (region.name, region.filename))
+                part = _region_image(region, images)
+                if not len(part):
+                    continue
+                part_size = (part.maxaddr() - part.minaddr()) + 1
+                if part_size > region.size:
+                    raise ToolException("Contents of region %s does not fit"
+                                        % region.name)
+                merged.merge(part)
+                pad_size = region.size - part_size
+                if pad_size > 0 and region != region_list[-1]:
+                    notify.info("  Padding region %s with 0x%x bytes" %
+                                (region.name, pad_size))
+                    merged.fill(merged.maxaddr() + 1, pad_size, padding)
+
+        if not exists(dirname(destination)):
+            makedirs(dirname(destination))
+        notify.info("Space used after regions merged: 0x%x" %
+                    (merged.maxaddr() - merged.minaddr() + 1))
+        with open(destination, "wb+") as output:
+            merged.tofile(output, format=format.strip("."))
+    finally:
+        for image in images.values():
+            image.close()
 
 def scan_resources(src_paths, toolchain, dependencies_paths=None,
                    inc_dirs=None, base_path=None, collect_ignores=False):
@@ -493,12 +543,13 @@ def scan_resources(src_paths, toolchain, dependencies_paths=None,
         else:
             resources.inc_dirs.append(inc_dirs)
 
-    # Load resources into the config system which might expand/modify resources
-    # based on config data
-    resources = toolchain.config.load_resources(resources)
+    with toolchain.timer.phase("config"):
+        # Load resources into the config system which might expand/modify
+        # resources based on config data
+        resources = toolchain.config.load_resources(resources)
 
-    # Set the toolchain's configuration data
-    toolchain.set_config_data(toolchain.config.get_config_data())
+        # Set the toolchain's configuration data
+        toolchain.set_config_data(toolchain.config.get_config_data())
 
     return resources
 
@@ -507,7 +558,8 @@ def build_project(src_paths, build_path, target, toolchain_name,
                   notify=None, name=None, macros=None, inc_dirs=None, jobs=1,
                   report=None, properties=None, project_id=None,
                   project_description=None, config=None,
-                  app_config=None, build_profile=None, stats_depth=None, ignore=None):
+                  app_config=None, build_profile=None, stats_depth=None, ignore=None,
+                  job_server=None):
     """ Build a project. A project may be a test or a user program.
 
     Positional arguments:
@@ -535,6 +587,8 @@ def build_project(src_paths, build_path, target, toolchain_name,
     build_profile - a dict of flags that will be passed to the compiler
     stats_depth - depth level for memap to display file/dirs
     ignore - list of paths to add to mbedignore
+    job_server - a JobServer limiting the compiles running at once across
+                 builds
     """
 
     # Convert src_path to a list if needed
@@ -552,7 +606,8 @@ def build_project(src_paths, build_path, target, toolchain_name,
     toolchain = prepare_toolchain(
         src_paths, build_path, target, toolchain_name, macros=macros,
         clean=clean, jobs=jobs, notify=notify, config=config,
-        app_config=app_config, build_profile=build_profile, ignore=ignore)
+        app_config=app_config, build_profile=build_profile, ignore=ignore,
+        job_server=job_server)
 
     # The first path will give the name to the library
     name = (name or toolchain.config.name or
@@ -594,31 +649,43 @@ def build_project(src_paths, build_path, target, toolchain_name,
                            for r in region_list]
             res = "%s.%s" % (join(build_path, name),
                              getattr(toolchain.target, "OUTPUT_EXT", "bin"))
-            merge_region_list(region_list, res, notify)
+            with toolchain.timer.phase("merge"):
+                merge_region_list(region_list, res, notify)
         else:
             res, _ = toolchain.link_program(resources, build_path, name)
 
         memap_instance = getattr(toolchain, 'memap_instance', None)
         memap_table = ''
         if memap_instance:
-            # Write output to stdout in text (pretty table) format
-            memap_table = memap_instance.generate_output('table', stats_depth)
-            notify.info(memap_table)
+            with toolchain.timer.phase("memap"):
+                # Write output to stdout in text (pretty table) format
+                memap_table = memap_instance.generate_output('table',
+                                                             stats_depth)
+                notify.info(memap_table)
 
-            # Write output to file in JSON format
-            map_out = join(build_path, name + "_map.json")
-            memap_instance.generate_output('json', stats_depth, map_out)
+                # Write output to file in JSON format
+                map_out = join(build_path, name + "_map.json")
+                memap_instance.generate_output('json', stats_depth, map_out)
 
-            # Write output to file in CSV format for the CI
-            map_csv = join(build_path, name + "_map.csv")
-            memap_instance.generate_output('csv-ci', stats_depth, map_csv)
+                # Write output to file in CSV format for the CI
+                map_csv = join(build_path, name + "_map.csv")
+                memap_instance.generate_output('csv-ci', stats_depth,
+                                               map_csv)
 
         resources.detect_duplicates(toolchain)
 
+        # Write the timing of the build in the Trace Event Format, which
+        # chrome://tracing displays
+        timing = toolchain.timer.summary()
+        notify.timing(timing)
+        toolchain.timer.write_chrome_trace(
+            join(build_path, name + "_trace.json"), name)
+
         if report != None:
             end = time()
             cur_result["elapsed_time"] = end - start
             cur_result["result"] = "OK"
+            cur_result["timing"] = timing
             cur_result["memory_usage"] = (memap_instance.mem_report
                                           if memap_instance is not None else None)
             cur_result["bin"] = res
@@ -639,6 +706,7 @@ def build_project(src_paths, build_path, target, toolchain_name,
                 cur_result["result"] = "FAIL"
 
             cur_result["elapsed_time"] = end - start
+            cur_result["timing"] = toolchain.timer.summary()
 
             add_result_to_report(report, cur_result)
         # Let Exception propagate
@@ -649,7 +717,7 @@ def build_library(src_paths, build_path, target, toolchain_name,
                   archive=True, notify=None, macros=None, inc_dirs=None, jobs=1,
                   report=None, properties=None, project_id=None,
                   remove_config_header_file=False, app_config=None,
-                  build_profile=None, ignore=None):
+                  build_profile=None, ignore=None, job_server=None):
     """ Build a library
 
     Positional arguments:
@@ -675,6 +743,8 @@ def build_library(src_paths, build_path, target, toolchain_name,
     app_config - location of a chosen mbed_app.json file
     build_profile - a dict of flags that will be passed to the compiler
     ignore - list of paths to add to mbedignore
+    job_server - a JobServer limiting the compiles running at once across
+                 builds
     """
 
     # Convert src_path to a list if needed
@@ -698,7 +768,7 @@ def build_library(src_paths, build_path, target, toolchain_name,
     toolchain = prepare_toolchain(
         src_paths, build_path, target, toolchain_name, macros=macros,
         clean=clean, jobs=jobs, notify=notify, app_config=app_config,
-        build_profile=build_profile, ignore=ignore)
+        build_profile=build_profile, ignore=ignore, job_server=job_server)
 
     # The first path will give the name to the library
     if name is None:
@@ -765,11 +835,14 @@ def build_library(src_paths, build_path, target, toolchain_name,
             if config_header_path:
                 remove(config_header_path)
 
+        timing = toolchain.timer.summary()
+        notify.timing(timing)
+
         if report != None:
             end = time()
             cur_result["elapsed_time"] = end - start
             cur_result["result"] = "OK"
-
+            cur_result["timing"] = timing
 
             add_result_to_report(report, cur_result)
         return True
@@ -784,6 +857,7 @@ def build_library(src_paths, build_path, target, toolchain_name,
                 cur_result["result"] = "NOT_SUPPORTED"
 
             cur_result["elapsed_time"] = end - start
+            cur_result["timing"] = toolchain.timer.summary()
 
             add_result_to_report(report, cur_result)
 
@@ -800,7 +874,7 @@ def mbed2_obj_path(target_name, toolchain_name):
 
 def build_lib(lib_id, target, toolchain_name, clean=False, macros=None,
               notify=None, jobs=1, report=None, properties=None,
-              build_profile=None, ignore=None):
+              build_profile=None, ignore=None, job_server=None):
     """ Legacy method for building mbed libraries
 
     Positional arguments:
@@ -817,6 +891,8 @@ def build_lib(lib_id, target, toolchain_name, clean=False, macros=None,
     properties - UUUUHHHHH beats me
     build_profile - a dict of flags that will be passed to the compiler
     ignore - list of paths to add to mbedignore
+    job_server - a JobServer limiting the compiles running at once across
+                 builds
     """
     lib = Library(lib_id)
     if not lib.is_supported(target, toolchain_name):
@@ -881,7 +957,7 @@ def build_lib(lib_id, target, toolchain_name, clean=False, macros=None,
         toolchain = prepare_toolchain(
             src_paths, tmp_path, target, toolchain_name, macros=macros,
             notify=notify, build_profile=build_profile, jobs=jobs, clean=clean,
-            ignore=ignore)
+            ignore=ignore, job_server=job_server)
 
         notify.info("Building library %s (%s, %s)" %
                        (name.upper(), target.name, toolchain_name))
@@ -914,9 +990,10 @@ def build_lib(lib_id, target, toolchain_name, clean=False, macros=None,
             dependencies_include_dir.extend(inc_dirs)
 
         # Add other discovered configuration data to the configuration object
-        for res in resources:
-            config.load_resources(res)
-        toolchain.set_config_data(toolchain.config.get_config_data())
+        with toolchain.timer.phase("config"):
+            for res in resources:
+                config.load_resources(res)
+            toolchain.set_config_data(toolchain.config.get_config_data())
 
 
         # Copy Headers
@@ -938,6 +1015,7 @@ def build_lib(lib_id, target, toolchain_name, clean=False, macros=None,
             end = time()
             cur_result["elapsed_time"] = end - start
             cur_result["result"] = "OK"
+            cur_result["timing"] = toolchain.timer.summary()
 
             add_result_to_report(report, cur_result)
         return True
@@ -957,7 +1035,7 @@ def build_lib(lib_id, target, toolchain_name, clean=False, macros=None,
 # library
 def build_mbed_libs(target, toolchain_name, clean=False, macros=None,
                     notify=None, jobs=1, report=None, properties=None,
-                    build_profile=None, ignore=None):
+                    build_profile=None, ignore=None, job_server=None):
     """ Function returns True is library was built and false if building was
     skipped
 
@@ -974,6 +1052,8 @@ def build_mbed_libs(target, toolchain_name, clean=False, macros=None,
     properties - UUUUHHHHH beats me
     build_profile - a dict of flags that will be passed to the compiler
     ignore - list of paths to add to mbedignore
+    job_server - a JobServer limiting the compiles running at once across
+                 builds
     """
 
     if report != None:
@@ -1017,7 +1097,8 @@ def build_mbed_libs(target, toolchain_name, clean=False, macros=None,
 
         toolchain = prepare_toolchain(
             [""], tmp_path, target, toolchain_name, macros=macros, notify=notify,
-            build_profile=build_profile, jobs=jobs, clean=clean, ignore=ignore)
+            build_profile=build_profile, jobs=jobs, clean=clean, ignore=ignore,
+            job_server=job_server)
 
         # Take into account the library configuration (MBED_CONFIG_FILE)
         config = toolchain.config
@@ -1093,6 +1174,7 @@ def build_mbed_libs(target, toolchain_name, clean=False, macros=None,
             end = time()
             cur_result["elapsed_time"] = end - start
             cur_result["result"] = "OK"
+            cur_result["timing"] = toolchain.timer.summary()
 
             add_result_to_report(report, cur_result)
 
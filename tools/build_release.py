@@ -36,6 +36,7 @@ from tools.test_api import SingleTestRunner
 from tools.test_api import singletest_in_cli_mode
 from tools.paths import TEST_DIR, MBED_LIBRARIES
 from tools.tests import TEST_MAP
+from tools.build_scheduler import Build, run_builds
 
 OFFICIAL_MBED_LIBRARY_BUILD = get_mbed_official_release('2')
 
@@ -145,6 +146,9 @@ if __name__ == '__main__':
         # Runs test suite in CLI mode
         test_summary, shuffle_seed, test_summary_ext, test_suite_properties_ext, new_build_report, new_build_properties = single_test.execute()
     else:
+        # The library builds of all targets and toolchains run at once, with
+        # one job server limiting the compilers of all of them
+        builds = []
         for target_name, toolchain_list in OFFICIAL_MBED_LIBRARY_BUILD:
             if platforms is not None and not target_name in platforms:
                 print("Excluding %s from release" % target_name)
@@ -169,17 +173,17 @@ if __name__ == '__main__':
 
                 profile = extract_profile(parser, options, toolchain)
 
-                try:
-                    built_mbed_lib = build_mbed_libs(TARGET_MAP[target_name],
-                                                     toolchain,
-                                                     verbose=options.verbose,
-                                                     jobs=options.jobs,
-                                                     report=build_report,
-                                                     properties=build_properties,
-                                                     build_profile=profile)
-
-                except Exception, e:
-                    print str(e)
+                builds.append(Build(id, build_mbed_libs,
+                                    (TARGET_MAP[target_name], toolchain),
+                                    dict(jobs=options.jobs,
+                                         build_profile=profile)))
+
+        def build_done(id, result):
+            if result.status == "FAIL":
+                print str(result.reason)
+
+        run_builds(builds, jobs=options.jobs, report=build_report,
+                   properties=build_properties, notify=build_done)
 
     # copy targets.json file as part of the release
     copy(join(dirname(abspath(__file__)), '..', 'targets', 'targets.json'), MBED_LIBRARIES)
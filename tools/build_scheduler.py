@@ -0,0 +1,284 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Run the builds of many targets and toolchains at once
+"""
+from __future__ import print_function, division, absolute_import
+
+import pickle
+import traceback
+from time import time
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
+
+from .build_api import prep_report
+from .settings import SCHEDULED_BUILD_TIMEOUT
+from .toolchains import TOOLCHAIN_PATHS
+from .toolchains.job_server import JobServer, current_job_server
+
+
+class Build(object):
+    """A build within a graph of builds
+
+    Positional arguments:
+    key - a hashable name for the build, such as a (target, toolchain, id)
+          tuple
+    function - the module level function that does the build, such as
+               build_mbed_libs
+    args - the positional arguments of function
+
+    Keyword arguments:
+    kwargs - the keyword arguments of function
+    depends - the keys of the builds that have to succeed before this build
+              may start
+    """
+    def __init__(self, key, function, args=(), kwargs=None, depends=()):
+        self.key = key
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.depends = list(depends)
+
+
+class BuildResult(object):
+    """The outcome of a Build
+
+    Attributes:
+    status - "OK" when the build returned, "FAIL" when it raised an exception
+             and "SKIP" when it did not run because a build it depends on
+             did not succeed
+    value - the value returned by the build function
+    reason - the exception raised by the build function
+    traceback - the formatted traceback of that exception
+    """
+    def __init__(self, status, value=None, reason=None, traceback=None):
+        self.status = status
+        self.value = value
+        self.reason = reason
+        self.traceback = traceback
+
+
+def merge_report(report, other):
+    """Add the results of a build report to another build report
+
+    Positional arguments:
+    report - the report to extend
+    other - the report with the results to add
+    """
+    for target_name, toolchains in other.items():
+        for toolchain_name, ids in toolchains.items():
+            for id_name, results in ids.items():
+                prep_report(report, target_name, toolchain_name, id_name)
+                report[target_name][toolchain_name][id_name].extend(results)
+
+
+def merge_properties(properties, other):
+    """Add the properties of builds to other build properties
+
+    Positional arguments:
+    properties - the properties to extend
+    other - the properties to add
+    """
+    for target_name, toolchains in other.items():
+        for toolchain_name, props in toolchains.items():
+            properties.setdefault(target_name, {})\
+                      .setdefault(toolchain_name, {}).update(props)
+
+
+def build_worker(function, args, kwargs, toolchain_paths):
+    """Run a build function within a worker process, together with the job
+    server shared with this worker process, returning a dictionary with the
+    keys 'value', 'reason', 'traceback', 'report' and 'properties'. The
+    report and properties are those filled by this build alone.
+    """
+    # Use parent TOOLCHAIN_PATHS variable
+    TOOLCHAIN_PATHS.update(toolchain_paths)
+    kwargs.setdefault('job_server', current_job_server())
+
+    ret = {
+        'value': None,
+        'reason': None,
+        'traceback': None,
+        'report': kwargs.get('report'),
+        'properties': kwargs.get('properties')
+    }
+    try:
+        ret['value'] = function(*args, **kwargs)
+        # The value has to be sent back to the parent process
+        pickle.dumps(ret['value'])
+    except BaseException as exc:
+        ret['value'] = None
+        ret['traceback'] = traceback.format_exc()
+        try:
+            pickle.dumps(exc)
+            ret['reason'] = exc
+        except Exception:
+            # The exception has to be sent back to the parent process
+            ret['reason'] = Exception(str(exc))
+    return ret
+
+
+def run_builds(builds, jobs=0, job_server=None, processes=None, report=None,
+               properties=None, notify=None,
+               timeout=SCHEDULED_BUILD_TIMEOUT):
+    """Run a graph of builds, with the independent builds running at once
+
+    Every build runs in a worker process of a pool whose workers share a job
+    server, so the compiles of all builds are scheduled together under a
+    single limit of *jobs* compilers. While a build scans its sources,
+    links or archives, which it does without a job server token, the other
+    builds keep the compilers busy.
+
+    Positional arguments:
+    builds - a list of Build objects; every build that a build depends on
+             has to be in the list
+
+    Keyword arguments:
+    jobs - the number of compilers to run at once, 0 for the number of CPUs
+    job_server - a JobServer to use instead of creating one for *jobs*
+    processes - the number of builds to run at once; the number of
+                compilers by default
+    report - the build report to add the results of the builds to
+    properties - the build properties to add the properties of the builds to
+    notify - a callable called with the key and BuildResult of every build
+             as it finishes or is skipped
+
+    timeout - the seconds that a build may run for, counted from when a
+              worker process is free to start it, or None for no limit
+
+    A build whose arguments or result could not be pickled fails. So does a
+    build that runs for longer than the timeout, which is also the fate of a
+    build whose worker process exited, as its result never arrives.
+
+    Return: a dictionary mapping the key of every build to its BuildResult
+    """
+    by_key = dict((build.key, build) for build in builds)
+    dependents = dict((build.key, []) for build in builds)
+    waiting = {}
+    for build in builds:
+        for key in set(build.depends):
+            if key not in by_key:
+                raise KeyError("Build %s depends on unknown build %s"
+                               % (build.key, key))
+            dependents[key].append(build.key)
+        waiting[build.key] = len(set(build.depends))
+
+    results = {}
+
+    def finish(key, result):
+        results[key] = result
+        if notify:
+            notify(key, result)
+        if result.status != "OK":
+            for dependent in dependents[key]:
+                if dependent not in results:
+                    finish(dependent, BuildResult("SKIP"))
+
+    if job_server is None:
+        job_server = JobServer(jobs)
+    if processes is None:
+        processes = job_server.jobs
+    processes = max(1, min(processes, len(builds)))
+    done = Queue()
+    pool = job_server.pool(processes)
+    pending = {}
+    # The pending builds in the order that the pool starts them, and the
+    # time that each of the first *processes* of them got a worker
+    order = []
+    started = {}
+    lost = False
+
+    def submit(build):
+        kwargs = dict(build.kwargs)
+        if report is not None:
+            kwargs['report'] = {}
+        if properties is not None:
+            kwargs['properties'] = {}
+        order.append(build.key)
+        pending[build.key] = pool.apply_async(
+            build_worker, (build.function, build.args, kwargs,
+                           dict(TOOLCHAIN_PATHS)),
+            callback=lambda ret, key=build.key: done.put((key, ret)))
+
+    def failed(key, reason, trace):
+        del pending[key]
+        order.remove(key)
+        finish(key, BuildResult("FAIL", reason=reason, traceback=trace))
+
+    def build_done(key, ret):
+        del pending[key]
+        order.remove(key)
+        if ret['report'] and report is not None:
+            merge_report(report, ret['report'])
+        if ret['properties'] and properties is not None:
+            merge_properties(properties, ret['properties'])
+        if ret['traceback'] is None:
+            finish(key, BuildResult("OK", value=ret['value']))
+            for dependent in dependents[key]:
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0 and dependent not in results:
+                    submit(by_key[dependent])
+        else:
+            finish(key, BuildResult("FAIL", reason=ret['reason'],
+                                    traceback=ret['traceback']))
+
+    try:
+        for build in builds:
+            if waiting[build.key] == 0:
+                submit(build)
+        while pending:
+            now = time()
+            for key in order[:processes]:
+                started.setdefault(key, now)
+            try:
+                key, ret = done.get(timeout=1)
+            except Empty:
+                # The callback is only called for the builds that returned
+                now = time()
+                for key in list(order):
+                    result = pending[key]
+                    if result.ready() and not result.successful():
+                        try:
+                            result.get()
+                        except Exception as exc:
+                            failed(key, exc, traceback.format_exc())
+                    elif (timeout and key in started and
+                          now - started[key] > timeout):
+                        lost = True
+                        reason = Exception("Build %s did not finish in %s "
+                                           "seconds" % (key, timeout))
+                        failed(key, reason, str(reason))
+                continue
+            if key in pending:
+                build_done(key, ret)
+        if lost:
+            # The pool would wait for the lost builds forever
+            pool.terminate()
+        else:
+            pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    # Builds left over are part of a dependency cycle
+    for build in builds:
+        if build.key not in results:
+            finish(build.key, BuildResult("SKIP"))
+    return results
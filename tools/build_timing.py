@@ -0,0 +1,175 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Timing of the phases of a build
+"""
+from __future__ import print_function, division, absolute_import
+
+import json
+from collections import defaultdict, OrderedDict
+from contextlib import contextmanager
+from time import time
+
+# The phases of a build, in the order that they are reported
+PHASES = ["scan", "config", "compile", "archive", "link", "elf2bin", "memap",
+          "merge"]
+
+
+class BuildTimer(object):
+    """Records how long the phases of a build take, the compile of every
+    source file and counters such as the hits of the build caches
+
+    Phases may nest; the time of a phase does not include the time of the
+    phases nested within it, so that the times of all phases add up to the
+    time of the build. Phases are only recorded by the thread that runs the
+    build, while compiles may be reported from any thread.
+    """
+
+    def __init__(self):
+        # (name, start, end) tuples of the phases, in the order they ended
+        self.phases = []
+        # Time of every phase, without the phases nested within it
+        self.phase_times = defaultdict(float)
+        # (source, queued, start, end, worker) tuples of the compiles
+        self.compiles = []
+        self.counters = defaultdict(int)
+        # The time spent in the phases nested within the running phases
+        self._nested = []
+
+    @contextmanager
+    def phase(self, name):
+        """Time the phase *name* for the duration of a with statement"""
+        start = time()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            end = time()
+            nested = self._nested.pop()
+            self.phase_times[name] += end - start - nested
+            if self._nested:
+                self._nested[-1] += end - start
+            self.phases.append((name, start, end))
+
+    def count(self, name, number=1):
+        """Add *number* to the counter *name*"""
+        self.counters[name] += number
+
+    def add_compile(self, source, queued, start, end, worker):
+        """Record the compile of a source file
+
+        Positional arguments:
+        source - the source file
+        queued - the time that the compile was queued, or None
+        start - the time that the compile started
+        end - the time that the compile ended
+        worker - identifies the process or thread that ran the compile
+        """
+        self.compiles.append((source, queued, start, end, worker))
+
+    def summary(self, slowest=10):
+        """Summarise the timing as a dictionary fit for a build report
+
+        The keys are "phases", mapping every phase that ran to its time in
+        seconds, "compile", with the number of "files" compiled, the sum of
+        the time they spent in the queue, "queue_wait", and compiling, "run",
+        along with a list of the *slowest* compiles as (source, seconds)
+        lists, and "counters", a copy of the counters.
+        """
+        phases = OrderedDict(
+            (name, round(self.phase_times[name], 6))
+            for name in PHASES + sorted(set(self.phase_times) - set(PHASES))
+            if name in self.phase_times)
+        runs = sorted(((end - start, source) for source, _, start, end, _
+                       in self.compiles), reverse=True)
+        return {
+            "phases": phases,
+            "compile": {
+                "files": len(self.compiles),
+                "queue_wait": round(sum(start - queued for _, queued, start, _, _
+                                        in self.compiles
+                                        if queued is not None), 6),
+                "run": round(sum(run for run, _ in runs), 6),
+                "slowest": [[source, round(run, 6)]
+                            for run, source in runs[:slowest]],
+            },
+            "counters": dict(self.counters),
+        }
+
+    def chrome_trace(self, name="build"):
+        """Get the timing in the Trace Event Format that is shown by
+        chrome://tracing and similar viewers
+
+        The phases are shown on the thread of the build and every compile on
+        the thread of the worker that ran it.
+        """
+        starts = ([start for _, start, _ in self.phases] +
+                  [start for _, _, start, _, _ in self.compiles])
+        origin = min(starts) if starts else time()
+        usec = lambda moment: int(round((moment - origin) * 1e6))
+        events = [{"name": "thread_name", "ph": "M", "pid": 0, "tid": 0,
+                   "args": {"name": name}}]
+        for phase, start, end in self.phases:
+            events.append({"name": phase, "cat": "phase", "ph": "X", "pid": 0,
+                           "tid": 0, "ts": usec(start),
+                           "dur": usec(end) - usec(start)})
+        workers = {}
+        for source, queued, start, end, worker in self.compiles:
+            if worker not in workers:
+                workers[worker] = len(workers) + 1
+                events.append({"name": "thread_name", "ph": "M", "pid": 0,
+                               "tid": workers[worker],
+                               "args": {"name": "compile %d" %
+                                        workers[worker]}})
+            args = {"source": source}
+            if queued is not None:
+                args["queue_wait_us"] = usec(start) - usec(queued)
+            events.append({"name": source, "cat": "compile", "ph": "X",
+                           "pid": 0, "tid": workers[worker],
+                           "ts": usec(start), "dur": usec(end) - usec(start),
+                           "args": args})
+        if self.counters:
+            end = max([end for _, _, end in self.phases] +
+                      [end for _, _, _, end, _ in self.compiles] + [origin])
+            events.append({"name": "counters", "ph": "C", "pid": 0, "tid": 0,
+                           "ts": usec(end), "args": dict(self.counters)})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, filename, name="build"):
+        """Write the timing to *filename* in the Trace Event Format"""
+        with open(filename, "w") as trace_file:
+            json.dump(self.chrome_trace(name), trace_file)
+
+
+def format_timing(timing):
+    """Format a summary of BuildTimer as lines of text
+
+    Positional arguments:
+    timing - a dictionary as returned by BuildTimer.summary
+    """
+    lines = ["Build timing:"]
+    for name, seconds in timing["phases"].items():
+        lines.append("  %-10s %9.3fs" % (name, seconds))
+    compile_timing = timing["compile"]
+    if compile_timing["files"]:
+        lines.append("  %d files compiled in %.3fs, %.3fs waiting in the queue"
+                     % (compile_timing["files"], compile_timing["run"],
+                        compile_timing["queue_wait"]))
+        for source, seconds in compile_timing["slowest"]:
+            lines.append("    %9.3fs %s" % (seconds, source))
+    for name, number in sorted(timing["counters"].items()):
+        lines.append("  %-20s %d" % (name, number))
+    return "\n".join(lines)
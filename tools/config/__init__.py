@@ -17,6 +17,8 @@ limitations under the License.
 from __future__ import print_function, division, absolute_import
 
 from copy import deepcopy
+from hashlib import sha1
+from tempfile import mkstemp
 from six import moves
 import json
 import six
@@ -30,8 +32,9 @@ from jinja2 import FileSystemLoader, StrictUndefined
 from jinja2.environment import Environment
 from jsonschema import Draft4Validator, RefResolver
 
+from ..settings import SKIP_VALIDATED_CONFIGS, VALIDATED_CONFIGS_FILE
 from ..utils import (json_file_to_dict, intelhex_offset, integer,
-                     NotSupportedException)
+                     NotSupportedException, mkdir)
 from ..arm_pack_manager import Cache
 from ..targets import (CUMULATIVE_ATTRIBUTES, TARGET_MAP, generate_py_target,
                        get_resolution_order, Target)
@@ -47,6 +50,83 @@ BOOTLOADER_OVERRIDES = set(["target.bootloader_img", "target.restrict_size",
                             "target.mbed_app_start", "target.mbed_app_size"])
 
 
+# Schemas referenced by the other schemas through "$ref"
+SCHEMA_DEFINITIONS = ["definitions.json"]
+
+_SCHEMA_VALIDATORS = {}
+
+def _schema_validator(schema_name):
+    """Get a (validator, digest) tuple for a schema within this directory.
+    The validator is built at first use and shared by all Config instances;
+    the digest identifies the content of the schema and its definitions.
+
+    Positional arguments:
+    schema_name - the file name of the schema, such as "schema_lib.json"
+    """
+    if schema_name not in _SCHEMA_VALIDATORS:
+        schema_root = dirname(abspath(__file__))
+        schema_path = join(schema_root, schema_name)
+        digest = sha1()
+        for fname in [schema_name] + SCHEMA_DEFINITIONS:
+            with open(join(schema_root, fname), "rb") as schema_file:
+                digest.update(schema_file.read() + b"\0")
+        with open(schema_path, "r") as schema_file:
+            schema = json.load(schema_file)
+
+        url = moves.urllib.request.pathname2url(schema_path)
+        uri = moves.urllib_parse.urljoin("file://", url)
+
+        resolver = RefResolver(uri, schema)
+        _SCHEMA_VALIDATORS[schema_name] = (
+            Draft4Validator(schema, resolver=resolver), digest.digest())
+    return _SCHEMA_VALIDATORS[schema_name]
+
+
+class ValidatedConfigs(object):
+    """The content hashes of the configuration files that passed validation,
+    kept in a file between builds"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.hashes = None
+        self.added = set()
+
+    def _load(self):
+        try:
+            with open(self.filename, "r") as hash_file:
+                return set(hash_file.read().split())
+        except (IOError, OSError):
+            return set()
+
+    def __contains__(self, key):
+        if self.hashes is None:
+            self.hashes = self._load()
+        return key in self.hashes
+
+    def add(self, key):
+        if key not in self:
+            self.hashes.add(key)
+            self.added.add(key)
+
+    def save(self):
+        """Write the hashes to disk, along with those that other builds
+        recorded in the meantime"""
+        if not self.added:
+            return
+        hashes = self._load() | self.hashes
+        try:
+            mkdir(dirname(self.filename))
+            handle, temp_path = mkstemp(dir=dirname(self.filename))
+            with os.fdopen(handle, "w") as hash_file:
+                hash_file.write("\n".join(sorted(hashes)))
+            os.rename(temp_path, self.filename)
+            self.added = set()
+        except (IOError, OSError):
+            pass
+
+_VALIDATED_CONFIGS = ValidatedConfigs(VALIDATED_CONFIGS_FILE)
+
+
 # Base class for all configuration exceptions
 class ConfigException(Exception):
     """Config system only exception. Makes it easier to distinguish config
@@ -396,6 +476,36 @@ class Config(object):
                 path, ".".join(p for p in error.absolute_path),
                 error.message.replace('u\'','\''))
 
+    def validate_config_file(self, data, path, schema_name):
+        """Validate the content of a configuration file against a schema,
+        raising a ConfigException describing any errors
+
+        Positional arguments:
+        data - the parsed content of the configuration file
+        path - the location of the configuration file
+        schema_name - the file name of the schema, such as "schema_lib.json"
+
+        NOTE: When SKIP_VALIDATED_CONFIGS is set, a file is not validated
+        again while neither its content nor the schema change.
+        """
+        validator, schema_digest = _schema_validator(schema_name)
+        key = None
+        if SKIP_VALIDATED_CONFIGS:
+            try:
+                with open(path, "rb") as config_file:
+                    key = sha1(schema_digest + config_file.read()).hexdigest()
+            except (IOError, OSError):
+                pass
+            if key is not None and key in _VALIDATED_CONFIGS:
+                return
+
+        errors = sorted(validator.iter_errors(data))
+        if errors:
+            raise ConfigException("; ".join(
+                self.format_validation_error(x, path) for x in errors))
+        if key is not None:
+            _VALIDATED_CONFIGS.add(key)
+
     def __init__(self, tgt, top_level_dirs=None, app_config=None):
         """Construct a mbed configuration
 
@@ -429,22 +539,10 @@ class Config(object):
 
         if self.app_config_location is not None:
             # Validate the format of the JSON file based on schema_app.json
-            schema_root = os.path.dirname(os.path.abspath(__file__))
-            schema_path = os.path.join(schema_root, "schema_app.json")
-            schema      = json_file_to_dict(schema_path)
-
-            url = moves.urllib.request.pathname2url(schema_path)
-            uri = moves.urllib_parse.urljoin("file://", url)
-
-            resolver = RefResolver(uri, schema)
-            validator = Draft4Validator(schema, resolver=resolver)
-
-            errors = sorted(validator.iter_errors(self.app_config_data))
-
-            if errors:
-                raise ConfigException("; ".join(
-                    self.format_validation_error(x, self.app_config_location)
-                    for x in errors))
+            self.validate_config_file(self.app_config_data,
+                                      self.app_config_location,
+                                      "schema_app.json")
+            _VALIDATED_CONFIGS.save()
 
         # Update the list of targets with the ones defined in the application
         # config, if applicable
@@ -467,6 +565,8 @@ class Config(object):
 
         self.cumulative_overrides = {key: ConfigCumulativeOverride(key)
                                      for key in CUMULATIVE_ATTRIBUTES}
+        # The result of get_config_data, until a library is added
+        self._config_data = None
 
         self._process_config_and_overrides(self.app_config_data, {}, "app",
                                            "application")
@@ -494,22 +594,7 @@ class Config(object):
                 raise ConfigException(str(exc))
 
             # Validate the format of the JSON file based on the schema_lib.json
-            schema_root = os.path.dirname(os.path.abspath(__file__))
-            schema_path = os.path.join(schema_root, "schema_lib.json")
-            schema_file = json_file_to_dict(schema_path)
-
-            url = moves.urllib.request.pathname2url(schema_path)
-            uri = moves.urllib_parse.urljoin("file://", url)
-
-            resolver = RefResolver(uri, schema_file)
-            validator = Draft4Validator(schema_file, resolver=resolver)
-
-            errors = sorted(validator.iter_errors(cfg))
-
-            if errors:
-                raise ConfigException("; ".join(
-                    self.format_validation_error(x, config_file)
-                    for x in errors))
+            self.validate_config_file(cfg, config_file, "schema_lib.json")
 
             cfg["__config_path"] = full_path
 
@@ -521,6 +606,8 @@ class Config(object):
                     % (cfg["name"], full_path,
                        self.lib_config_data[cfg["name"]]["__config_path"]))
             self.lib_config_data[cfg["name"]] = cfg
+            self._config_data = None
+        _VALIDATED_CONFIGS.save()
 
     @property
     def has_regions(self):
@@ -898,12 +985,21 @@ class Config(object):
         macros - the list of macros defined with "macros" in libraries and in
                  the application (as ConfigMacro instances)
 
+        The configuration is resolved once and reused until add_config_files
+        adds a library, as the target and application data, and with them
+        the target overrides, don't change after construction. The dicts
+        returned are copies, but the ConfigParam and ConfigMacro instances
+        are shared between calls.
+
         Arguments: None
         """
-        all_params = self.get_target_config_data()
-        lib_params, macros = self.get_lib_config_data(all_params)
-        self.get_app_config_data(lib_params, macros)
-        return lib_params, macros
+        if self._config_data is None:
+            all_params = self.get_target_config_data()
+            lib_params, macros = self.get_lib_config_data(all_params)
+            self.get_app_config_data(lib_params, macros)
+            self._config_data = (lib_params, macros, self.config_errors)
+        params, macros, self.config_errors = self._config_data
+        return dict(params), dict(macros)
 
     @staticmethod
     def _check_required_parameters(params):
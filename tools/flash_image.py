@@ -0,0 +1,232 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Memory images held as contiguous buffers
+"""
+from __future__ import print_function, division, absolute_import
+
+import mmap
+from binascii import hexlify
+from bisect import bisect_right
+from os.path import splitext, getsize
+
+from intelhex import IntelHex
+
+from .utils import ToolException
+
+# Binary files of at least this many bytes are memory mapped instead of read
+MMAP_THRESHOLD = 256 * 1024
+
+# The largest piece of an image that is copied at once when writing it
+CHUNK_SIZE = 1024 * 1024
+
+
+class _Fill(object):
+    """A run of a single repeated byte, which is never allocated in full"""
+    __slots__ = ['byte', 'size']
+
+    def __init__(self, byte, size):
+        self.byte = byte
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, key):
+        start, stop, _ = key.indices(self.size)
+        return self.byte * max(stop - start, 0)
+
+
+class FlashImage(object):
+    """A memory image made of non-overlapping segments of contiguous data
+
+    Unlike IntelHex, which keeps a dictionary entry for every byte, the
+    data of a segment is kept as a single bytes object, a memory map of a
+    binary file or a run of padding bytes. Images are written one piece at
+    a time, so that the whole image is never copied in memory.
+    """
+
+    def __init__(self):
+        # Sorted start addresses of the segments, and the segments as
+        # (start, data) tuples in the same order
+        self._starts = []
+        self._segments = []
+        self._maps = []
+
+    @classmethod
+    def from_file(cls, filename, offset):
+        """Load a hex or bin file, placing a bin file at *offset*. Large
+        bin files are memory mapped; call close() when done with the image.
+        """
+        image = cls()
+        _, ext = splitext(filename)
+        if ext == ".bin":
+            if getsize(filename) >= MMAP_THRESHOLD:
+                with open(filename, "rb") as bin_file:
+                    data = mmap.mmap(bin_file.fileno(), 0,
+                                     access=mmap.ACCESS_READ)
+                image._maps.append(data)
+            else:
+                with open(filename, "rb") as bin_file:
+                    data = bin_file.read()
+            if len(data):
+                image.add(offset, data)
+        elif ext == ".hex":
+            ihex = IntelHex(filename)
+            image.add_intelhex(ihex)
+        else:
+            raise ToolException("File %s does not have a known binary file "
+                                "type" % filename)
+        return image
+
+    def close(self):
+        """Release the memory maps of the image"""
+        for data in self._maps:
+            data.close()
+        self._maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def add(self, start, data):
+        """Add the bytes *data* at the address *start*. Raise a
+        ToolException when they overlap data already in the image."""
+        if not len(data):
+            return
+        end = start + len(data)
+        index = bisect_right(self._starts, start)
+        if index > 0:
+            prev_start, prev_data = self._segments[index - 1]
+            if prev_start + len(prev_data) > start:
+                raise ToolException("Data overlapped at address 0x%X" % start)
+        if index < len(self._starts) and self._starts[index] < end:
+            raise ToolException("Data overlapped at address 0x%X"
+                                % self._starts[index])
+        self._starts.insert(index, start)
+        self._segments.insert(index, (start, data))
+
+    def fill(self, start, size, byte):
+        """Add *size* copies of the single byte string *byte* at *start*"""
+        self.add(start, _Fill(byte, size))
+
+    def add_intelhex(self, ihex):
+        """Add the data of an IntelHex object"""
+        for start, end in ihex.segments():
+            self.add(start, ihex.tobinstr(start=start, end=end - 1))
+
+    def merge(self, other):
+        """Add the segments of another image. The other image keeps its
+        memory maps; it must not be closed while this image is in use."""
+        for start, data in other._segments:
+            self.add(start, data)
+
+    def minaddr(self):
+        return self._starts[0] if self._starts else None
+
+    def maxaddr(self):
+        if not self._segments:
+            return None
+        start, data = self._segments[-1]
+        return start + len(data) - 1
+
+    def __len__(self):
+        """The number of bytes of data in the image"""
+        return sum(len(data) for _, data in self._segments)
+
+    def pieces(self):
+        """Generate the data of the image in order of address as (address,
+        bytes) tuples of at most CHUNK_SIZE bytes"""
+        for start, data in self._segments:
+            if isinstance(data, bytes) and len(data) <= CHUNK_SIZE:
+                yield start, data
+                continue
+            for offset in range(0, len(data), CHUNK_SIZE):
+                yield start + offset, data[offset:offset + CHUNK_SIZE]
+
+    def chunks(self, padding=b'\xFF'):
+        """Generate the bytes of the image from its lowest to its highest
+        address, with the gaps between segments filled with *padding*"""
+        address = self.minaddr()
+        for start, data in self.pieces():
+            if start > address:
+                gap = start - address
+                for offset in range(0, gap, CHUNK_SIZE):
+                    yield padding * min(CHUNK_SIZE, gap - offset)
+            yield data
+            address = start + len(data)
+
+    def tobinstr(self):
+        """Get the whole image as bytes, as written by write_bin"""
+        return b"".join(self.chunks())
+
+    def write_bin(self, output, padding=b'\xFF'):
+        """Write the image from its lowest to its highest address to a binary
+        file object, filling the gaps between segments with *padding*"""
+        for chunk in self.chunks(padding):
+            output.write(chunk)
+
+    def write_hex(self, output, byte_count=16):
+        """Write the image to a binary file object in the Intel HEX format.
+        The records are the same as those that IntelHex writes for the same
+        data."""
+        need_offset_record = (self.maxaddr() or 0) > 0xFFFF
+        high_ofs = [None]
+        record = bytearray()
+        record_start = [None]
+
+        def write_record(address, rectype, data):
+            line = bytearray([len(data), (address >> 8) & 0xFF, address & 0xFF,
+                              rectype]) + data
+            line.append((-sum(line)) & 0xFF)
+            output.write(b":" + hexlify(bytes(line)).upper() + b"\n")
+
+        def flush():
+            start = record_start[0]
+            if need_offset_record and start >> 16 != high_ofs[0]:
+                high_ofs[0] = start >> 16
+                write_record(0, 4, bytearray([high_ofs[0] >> 8,
+                                              high_ofs[0] & 0xFF]))
+            write_record(start & 0xFFFF, 0, record)
+            del record[:]
+
+        for start, data in self.pieces():
+            data = memoryview(bytes(data))
+            if record and record_start[0] + len(record) != start:
+                flush()
+            position = 0
+            while position < len(data):
+                if not record:
+                    record_start[0] = start + position
+                address = record_start[0]
+                length = min(byte_count, 0x10000 - (address & 0xFFFF))
+                take = min(length - len(record), len(data) - position)
+                record.extend(data[position:position + take])
+                position += take
+                if len(record) == length:
+                    flush()
+        if record:
+            flush()
+        output.write(b":00000001FF\n")
+
+    def tofile(self, output, format):
+        """Write the image to a binary file object as "bin" or "hex" """
+        if format == "hex":
+            self.write_hex(output)
+        else:
+            self.write_bin(output)
@@ -0,0 +1,121 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import print_function, division, absolute_import
+
+from time import time
+
+
+class BufferedSerial(object):
+    """ Reads a serial port a block at a time, into a buffer of received data
+
+        Every read of the port takes whatever the port has received, so lines
+        and tokens are found in the buffer instead of by reading the port one
+        byte at a time. A read of the port waits for at most the timeout of
+        the port, as set by set_timeout.
+    """
+
+    def __init__(self, serial):
+        self.serial = serial
+        self.buffer = bytearray()
+        # Throughput counters
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.reads = 0
+        self.writes = 0
+        self.start = time()
+
+    def in_waiting(self):
+        """ Number of bytes received by the port and not yet read
+        """
+        try:
+            return self.serial.in_waiting
+        except AttributeError:
+            # pyserial before 3.0
+            return self.serial.inWaiting()
+
+    def fill(self, count=1):
+        """ Read everything the port has received into the buffer, waiting
+            for at least *count* bytes for as long as the port timeout.
+            Returns the number of bytes read
+        """
+        data = self.serial.read(max(count, self.in_waiting()))
+        self.reads += 1
+        self.bytes_read += len(data)
+        self.buffer.extend(data)
+        return len(data)
+
+    def _take(self, count):
+        data = bytes(self.buffer[:count])
+        del self.buffer[:count]
+        return data
+
+    def read(self, count=1):
+        """ Read *count* bytes, or fewer if the port timeout passes first
+        """
+        if len(self.buffer) < count:
+            self.fill(count - len(self.buffer))
+        return self._take(count)
+
+    def read_until(self, token, timeout=5):
+        """ Read up to and including the first *token* received within
+            *timeout* seconds. Returns None if the token was not received, in
+            which case the data received stays in the buffer
+        """
+        start = time()
+        searched = 0
+        while True:
+            index = self.buffer.find(token, searched)
+            if index >= 0:
+                return self._take(index + len(token))
+            searched = max(0, len(self.buffer) - len(token) + 1)
+            if (time() - start) >= timeout:
+                return None
+            self.fill()
+
+    def readline(self, timeout=5):
+        """ Read a line, or whatever was received within *timeout* seconds if
+            no whole line was received
+        """
+        line = self.read_until(b'\n', timeout)
+        if line is None:
+            line = self._take(len(self.buffer))
+        return line
+
+    def write(self, data):
+        self.writes += 1
+        self.bytes_written += len(data)
+        return self.serial.write(data)
+
+    def flush(self):
+        """ Drop the data received and not yet read, and the data not yet sent
+        """
+        del self.buffer[:]
+        self.serial.flushInput()
+        self.serial.flushOutput()
+
+    def stats(self):
+        """ Throughput counters as a dictionary
+        """
+        seconds = time() - self.start
+        return {
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'reads': self.reads,
+            'writes': self.writes,
+            'seconds': seconds,
+            'read_rate': self.bytes_read / seconds if seconds else 0.0,
+        }
@@ -30,6 +30,7 @@ from time import sleep, time
 from optparse import OptionParser
 
 import host_tests_plugins
+from buffered_serial import BufferedSerial
 
 # This is a little tricky. We need to add upper directory to path so
 # we can find packages we want from the same level as other files do
@@ -113,6 +114,7 @@ class Mbed:
         self.program_cycle_s = float(self.options.program_cycle_s)
 
         self.serial = None
+        self.serial_io = None
         self.serial_baud = 9600
         self.serial_timeout = 1
 
@@ -157,6 +159,7 @@ class Mbed:
         if self.serial:
             self.serial.close()
             self.serial = None
+            self.serial_io = None
 
         # We will pool for serial to be re-mounted if it was unmounted after device reset
         result = self.pool_for_serial_init(serial_baud, serial_timeout) # Blocking
@@ -177,6 +180,7 @@ class Mbed:
             sleep(loop_delay if i else init_delay)
             try:
                 self.serial = Serial(self.port, baudrate=serial_baud, timeout=serial_timeout)
+                self.serial_io = BufferedSerial(self.serial)
             except Exception as e:
                 result = False
                 last_error = "MBED: %s"% str(e)
@@ -205,7 +209,7 @@ class Mbed:
         result = None
         if self.serial:
             try:
-                result = self.serial.read(count)
+                result = self.serial_io.read(count)
             except:
                 result = None
         return result
@@ -214,27 +218,40 @@ class Mbed:
         """ Wraps self.mbed.serial object read method to read one line from serial port
         """
         result = ''
-        start = time()
-        while (time() - start) < timeout:
-            if self.serial:
-                try:
-                    c = self.serial.read(1)
-                    result += c
-                except Exception as e:
-                    print "MBED: %s"% str(e)
-                    result = None
-                    break
-                if c == '\n':
-                    break
+        if self.serial:
+            try:
+                result = self.serial_io.readline(timeout)
+            except Exception as e:
+                print "MBED: %s"% str(e)
+                result = None
+        else:
+            sleep(timeout)
+        return result
+
+    def serial_read_until(self, token, timeout=5):
+        """ Reads from serial port up to and including the expected token.
+            Returns None if the token is not received within the timeout
+        """
+        result = None
+        if self.serial:
+            try:
+                result = self.serial_io.read_until(token, timeout)
+            except Exception as e:
+                print "MBED: %s"% str(e)
         return result
 
+    def serial_stats(self):
+        """ Throughput counters of the serial port, see BufferedSerial.stats()
+        """
+        return self.serial_io.stats() if self.serial_io else None
+
     def serial_write(self, write_buffer):
         """ Wraps self.mbed.serial object write method
         """
         result = None
         if self.serial:
             try:
-                result = self.serial.write(write_buffer)
+                result = self.serial_io.write(write_buffer)
             except:
                result = None
         return result
@@ -292,8 +309,7 @@ class Mbed:
         """
         result = False
         if self.serial:
-            self.serial.flushInput()
-            self.serial.flushOutput()
+            self.serial_io.flush()
             result = True
         return result
 
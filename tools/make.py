@@ -21,6 +21,7 @@ TEST BUILD & RUN
 from __future__ import print_function
 from builtins import str
 import sys
+import atexit
 import json
 from time import sleep
 from shutil import copy
@@ -46,6 +47,7 @@ from tools.options import get_default_options_parser
 from tools.options import extract_profile
 from tools.options import extract_mcus
 from tools.notifier.term import TerminalNotifier
+from tools.notifier.ndjson import NDJSONNotifier
 from tools.build_api import build_project
 from tools.build_api import mcu_toolchain_matrix
 from tools.build_api import mcu_toolchain_list
@@ -180,6 +182,12 @@ if __name__ == '__main__':
                         default=None,
                         help="Dump build_data to this file")
 
+    parser.add_argument("--json-log",
+                        dest="json_log",
+                        default=None,
+                        help="Stream the build notifications to this file as "
+                        "newline delimited JSON")
+
     # Specify a different linker script
     parser.add_argument("-l", "--linker", dest="linker_script",
                       type=argparse_filestring_type,
@@ -235,6 +243,9 @@ if __name__ == '__main__':
 
 
     notify = TerminalNotifier(options.verbose, options.silent, options.color)
+    if options.json_log:
+        notify = NDJSONNotifier(options.json_log, notify)
+        atexit.register(notify.close)
 
     if not TOOLCHAIN_CLASSES[toolchain].check_executable():
         search_path = TOOLCHAIN_PATHS[toolchain] or "No path set"
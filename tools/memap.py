@@ -11,7 +11,6 @@ import re
 import csv
 import json
 from argparse import ArgumentParser
-from copy import deepcopy
 from prettytable import PrettyTable
 
 from .utils import (argparse_filestring_type, argparse_lowercase_hyphen_type,
@@ -30,10 +29,26 @@ class _Parser(object):
 
     def __init__(self):
         self.modules = dict()
+        # Maps the last path component of modules within a directory to the
+        # paths of those modules, in the order that they were added
+        self.module_paths = dict()
+
+    def _index_module(self, module_path):
+        if sep in module_path:
+            self.module_paths.setdefault(
+                module_path.rsplit(sep, 1)[1], []).append(module_path)
+
+    def _unindex_module(self, module_path):
+        if sep in module_path:
+            self.module_paths[module_path.rsplit(sep, 1)[1]].remove(
+                module_path)
 
     def module_add(self, object_name, size, section):
         """ Adds a module or section to the list
 
+        An object that is not a known module is added to the first module
+        with the same file name within a directory, if any.
+
         Positional arguments:
         object_name - name of the entry to add
         size - the size of the module being added
@@ -47,22 +62,26 @@ class _Parser(object):
             self.modules[object_name][section] += size
             return
 
-        obj_split = sep + basename(object_name)
-        for module_path, contents in self.modules.items():
-            if module_path.endswith(obj_split) or module_path == object_name:
-                contents.setdefault(section, 0)
-                contents[section] += size
-                return
+        module_paths = self.module_paths.get(basename(object_name))
+        if module_paths:
+            contents = self.modules[module_paths[0]]
+            contents.setdefault(section, 0)
+            contents[section] += size
+            return
 
         new_module = {section: size}
         self.modules[object_name] = new_module
+        self._index_module(object_name)
 
     def module_replace(self, old_object, new_object):
         """ Replaces an object name with a new one
         """
         if old_object in self.modules:
+            if new_object not in self.modules:
+                self._index_module(new_object)
             self.modules[new_object] = self.modules[old_object]
             del self.modules[old_object]
+            self._unindex_module(old_object)
 
     @abstractmethod
     def parse_mapfile(self, mapfile):
@@ -444,6 +463,23 @@ class _IarParser(_Parser):
         return self.modules
 
 
+class _ModuleDir(object):
+    """A node of the module tree of a MemapParser
+
+    Attributes:
+    sizes - the total size per section of all modules at or below the node
+    module - the size per section of the module with the path of the node,
+             or None when there is no such module
+    children - maps the next path components to the child nodes
+    """
+    __slots__ = ['sizes', 'module', 'children']
+
+    def __init__(self):
+        self.sizes = {}
+        self.module = None
+        self.children = {}
+
+
 class MemapParser(object):
     """An object that represents parsed results, parses the memory map files,
     and writes out different file types of memory results
@@ -464,6 +500,14 @@ class MemapParser(object):
         # short version with specific depth
         self.short_modules = dict()
 
+        # Per directory totals of the modules, and the modules they were
+        # computed from. See module_tree()
+        self._tree = None
+        self._tree_modules = None
+
+        # Computed reports by depth. See compute_report()
+        self._reports = {}
+
 
         # Memory report (sections + summary)
         self.mem_report = []
@@ -490,20 +534,51 @@ class MemapParser(object):
         mbed-os/test.o
         mbed-os/drivers
 
+        The sizes are shared with the module tree and the modules, and must
+        not be modified.
         """
         if depth == 0 or depth == None:
-            self.short_modules = deepcopy(self.modules)
+            self.short_modules = self.modules
         else:
             self.short_modules = dict()
-            for module_name, v in self.modules.items():
+            self._collect_depth(self.module_tree(), [], depth)
+
+    def _collect_depth(self, node, path, depth):
+        for name, child in node.children.items():
+            child_path = path + [name]
+            if len(child_path) == depth or not child.children:
+                self.short_modules[join(*child_path)] = child.sizes
+            else:
+                if child.module is not None:
+                    self.short_modules[join(*child_path)] = child.module
+                self._collect_depth(child, child_path, depth)
+
+    def module_tree(self):
+        """Get the tree of per directory totals of the modules
+
+        The tree is built once for the current modules, and shared by the
+        reports at every depth.
+        """
+        if self._tree is None or self._tree_modules is not self.modules:
+            root = _ModuleDir()
+            for module_name, sizes in self.modules.items():
                 split_name = module_name.split(sep)
                 if split_name[0] == '':
                     split_name = split_name[1:]
-                new_name = join(*split_name[:depth])
-                self.short_modules.setdefault(new_name, {})
-                for section_idx, value in v.items():
-                    self.short_modules[new_name].setdefault(section_idx, 0)
-                    self.short_modules[new_name][section_idx] += self.modules[module_name][section_idx]
+                node = root
+                for name in split_name:
+                    node = node.children.setdefault(name, _ModuleDir())
+                    for section, size in sizes.items():
+                        node.sizes[section] = node.sizes.get(section, 0) + size
+                if node.module is None:
+                    node.module = dict(sizes)
+                else:
+                    for section, size in sizes.items():
+                        node.module[section] = node.module.get(section, 0) + size
+            self._tree = root
+            self._tree_modules = self.modules
+            self._reports = {}
+        return self._tree
 
     export_formats = ["json", "csv-ci", "table"]
 
@@ -519,8 +594,7 @@ class MemapParser(object):
 
         Returns: generated string for the 'table' format, otherwise None
         """
-        self.reduce_depth(depth)
-        self.compute_report()
+        self.compute_report(depth)
         try:
             if file_output:
                 file_desc = open(file_output, 'w')
@@ -546,7 +620,7 @@ class MemapParser(object):
         Positional arguments:
         file_desc - the file to write out the final report to
         """
-        file_desc.write(json.dumps(self.mem_report, indent=4))
+        json.dump(self.mem_report, file_desc, indent=4)
         file_desc.write('\n')
         return None
 
@@ -564,7 +638,7 @@ class MemapParser(object):
         for i in sorted(self.short_modules):
             for k in self.print_sections:
                 module_section.append((i + k))
-                sizes += [self.short_modules[i][k]]
+                sizes += [self.short_modules[i].get(k, 0)]
 
         module_section.append('static_ram')
         sizes.append(self.mem_summary['static_ram'])
@@ -597,7 +671,7 @@ class MemapParser(object):
             row = [i]
 
             for k in self.print_sections:
-                row.append(self.short_modules[i][k])
+                row.append(self.short_modules[i].get(k, 0))
 
             table.add_row(row)
 
@@ -619,16 +693,28 @@ class MemapParser(object):
 
     toolchains = ["ARM", "ARM_STD", "ARM_MICRO", "GCC_ARM", "GCC_CR", "IAR"]
 
-    def compute_report(self):
+    def compute_report(self, depth=None):
         """ Generates summary of memory usage for main areas
+
+        The report for each depth is only computed once.
+
+        Keyword arguments:
+        depth - directory depth on report
         """
+        self.module_tree()
+        if depth in self._reports:
+            (self.short_modules, self.subtotal, self.mem_summary,
+             self.mem_report) = self._reports[depth]
+            return
+
+        self.reduce_depth(depth)
+        self.subtotal = dict()
         for k in self.sections:
             self.subtotal[k] = 0
 
         for i in self.short_modules:
             for k in self.sections:
-                self.short_modules[i].setdefault(k, 0)
-                self.subtotal[k] += self.short_modules[i][k]
+                self.subtotal[k] += self.short_modules[i].get(k, 0)
 
         self.mem_summary = {
             'static_ram': (self.subtotal['.data'] + self.subtotal['.bss']),
@@ -640,13 +726,16 @@ class MemapParser(object):
             self.mem_report.append({
                 "module":i,
                 "size":{
-                    k: self.short_modules[i][k] for k in self.print_sections
+                    k: self.short_modules[i].get(k, 0)
+                    for k in self.print_sections
                 }
             })
 
         self.mem_report.append({
             'summary': self.mem_summary
         })
+        self._reports[depth] = (self.short_modules, self.subtotal,
+                                self.mem_summary, self.mem_report)
 
     def parse(self, mapfile, toolchain):
         """ Parse and decode map file depending on the toolchain
@@ -666,6 +755,7 @@ class MemapParser(object):
         try:
             with open(mapfile, 'r') as file_input:
                 self.modules = parser.parse_mapfile(file_input)
+            self.module_tree()
             return True
 
         except IOError as error:
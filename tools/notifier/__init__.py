@@ -16,6 +16,37 @@
 from __future__ import print_function, division, absolute_import
 
 from abc import ABCMeta, abstractmethod
+from collections import deque
+
+# The number of messages that notifiers keep for the output of build reports
+MAX_OUTPUT_MESSAGES = 10000
+
+
+class OutputBuffer(object):
+    """
+    Keeps the last messages that a notifier reported, for build reports, so
+    that the memory used by a notifier is bounded however long the build.
+    Messages may span many lines; they are bounded by number, not by size.
+    """
+
+    def __init__(self, max_messages=MAX_OUTPUT_MESSAGES):
+        self.messages = deque(maxlen=max_messages)
+        self.dropped = 0
+
+    def append(self, message):
+        if len(self.messages) == self.messages.maxlen:
+            self.dropped += 1
+        self.messages.append(message)
+
+    def getvalue(self):
+        """
+        Get the messages kept as a string, one message per line, starting
+        with a note of the number of messages dropped, if any.
+        """
+        lines = list(self.messages)
+        if self.dropped:
+            lines.insert(0, "[%d earlier messages not kept]" % self.dropped)
+        return "".join(line + "\n" for line in lines)
 
 
 class Notifier(object):
@@ -46,6 +77,8 @@ class Notifier(object):
       var        | Provides a key, in the 'key' key, and a value, in the 'value'
                  | key, for use in a UI. At the time of writing it's used to
                  | communicate the binary location to the online IDE.
+      timing     | The time taken by the phases of a build, in the 'timing'
+                 | key, as returned by BuildTimer.summary.
     """
 
     __metaclass__ = ABCMeta
@@ -104,3 +137,9 @@ class Notifier(object):
         Update a UI with a key, value pair
         """
         self.notify({'type': 'var', 'key': key, 'val': value})
+
+    def timing(self, timing):
+        """
+        Report the time taken by the phases of a build
+        """
+        self.notify({'type': 'timing', 'timing': timing})
@@ -0,0 +1,52 @@
+# mbed SDK
+# Copyright (c) 2018 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function, division, absolute_import
+
+from . import Notifier
+
+# The queue of the parent process, as inherited by this worker process
+_QUEUE = None
+
+
+def set_notification_queue(queue):
+    """Set the queue that ForwardNotifiers in this process send to. Use it
+    as the initializer of a pool, as queues may only be inherited.
+    """
+    global _QUEUE
+    _QUEUE = queue
+
+
+class ForwardNotifier(Notifier):
+    """
+    Sends the notifications of a worker process to its parent process as
+    they happen, over the queue set by set_notification_queue.
+
+    Every message on the queue is a (key, event, result) tuple: the key
+    identifies the build that sent it, the event is the notification, and
+    the last message of a build, sent by done(), has no event but the result
+    of the build. A ForwardNotifier pickles as its key alone, so it may be
+    passed to the workers of a pool.
+    """
+
+    def __init__(self, key):
+        self.key = key
+
+    def notify(self, event):
+        _QUEUE.put((self.key, event, None))
+
+    def done(self, result):
+        """Send the result of the build, after all of its notifications"""
+        _QUEUE.put((self.key, None, result))
@@ -0,0 +1,83 @@
+# mbed SDK
+# Copyright (c) 2018 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function, division, absolute_import
+
+import json
+
+from . import Notifier, OutputBuffer, MAX_OUTPUT_MESSAGES
+
+# The size of the buffer of the files that NDJSONNotifier opens
+BUFFER_SIZE = 64 * 1024
+
+
+class NDJSONNotifier(Notifier):
+    """
+    Streams notifications to a file or pipe as newline delimited JSON, one
+    event per line, so that a front end may follow a build as it runs.
+
+    Keyword arguments:
+    notifier - another notifier, such as a TerminalNotifier, that is sent
+               every notification after it is written
+    max_output - the number of events kept for get_output
+    """
+
+    def __init__(self, stream, notifier=None, max_output=MAX_OUTPUT_MESSAGES):
+        if isinstance(stream, str):
+            self.stream = open(stream, "wb", BUFFER_SIZE)
+            self._owns_stream = True
+        else:
+            self.stream = stream
+            self._owns_stream = False
+        self.notifier = notifier
+        self.output = OutputBuffer(max_output)
+        self._encoder = json.JSONEncoder(separators=(",", ":"), default=str)
+
+    def notify(self, event):
+        # Encode the event before the other notifier, which may change it
+        line = self._encoder.encode(event)
+        self.stream.write(line.encode("utf-8") + b"\n")
+        if self.notifier:
+            self.notifier.notify(event)
+        else:
+            self.output.append(line)
+
+    def get_output(self):
+        """
+        Get the output of the other notifier, or else the last events as
+        lines of JSON
+        """
+        if self.notifier:
+            return self.notifier.get_output()
+        return self.output.getvalue()
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        """
+        Flush the events written, closing the stream if it was opened by this
+        notifier
+        """
+        if self._owns_stream:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
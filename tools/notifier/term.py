@@ -20,7 +20,8 @@ import sys
 from os import getcwd
 from os.path import basename
 
-from . import Notifier
+from . import Notifier, OutputBuffer, MAX_OUTPUT_MESSAGES
+from ..build_timing import format_timing
 from ..settings import (PRINT_COMPILER_OUTPUT_AS_LINK,
                         CLI_COLOR_MAP, COLOR)
 
@@ -29,10 +30,11 @@ class TerminalNotifier(Notifier):
     Writes notifications to a terminal based on silent, verbose and color flags.
     """
 
-    def __init__(self, verbose=False, silent=False, color=False):
+    def __init__(self, verbose=False, silent=False, color=False,
+                 max_output=MAX_OUTPUT_MESSAGES):
         self.verbose = verbose
         self.silent = silent
-        self.output = ""
+        self.output = OutputBuffer(max_output)
         self.color = color or COLOR
         if self.color:
             from colorama import init, Fore, Back, Style
@@ -61,7 +63,7 @@ class TerminalNotifier(Notifier):
             }
 
     def get_output(self):
-        return self.output
+        return self.output.getvalue()
 
     def notify(self, event):
         if self.verbose:
@@ -74,7 +76,7 @@ class TerminalNotifier(Notifier):
                     self.print_in_color(event, msg)
                 else:
                     print(msg)
-            self.output += msg + "\n"
+            self.output.append(msg)
 
     def print_notify(self, event):
         """ Command line notification
@@ -111,6 +113,8 @@ class TerminalNotifier(Notifier):
             return event['message']
         elif event['type'] == 'debug':
             return "[DEBUG] {message}".format(**event)
+        elif event['type'] == 'timing':
+            return format_timing(event['timing'])
         elif event['type'] in ('progress', 'cc'):
             return self.print_notify(event)
 
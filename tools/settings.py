@@ -66,6 +66,25 @@ CLI_COLOR_MAP = {
     "Error"  : "red"
 }
 
+# Time limits, in seconds, for compiling a single source file and for
+# compiling all of the sources of a library or project. None means no limit
+COMPILE_TIMEOUT = 300
+BUILD_TIMEOUT = None
+
+# Time limit, in seconds, for each of the builds that build.py and
+# build_release.py run at once. None means no limit
+SCHEDULED_BUILD_TIMEOUT = 3600
+
+# Skip validating the configuration files that were validated before, as
+# recorded by their content hash in VALIDATED_CONFIGS_FILE
+SKIP_VALIDATED_CONFIGS = False
+VALIDATED_CONFIGS_FILE = join(BUILD_DIR, ".validated_configs")
+
+# Directory of a cache of compiled objects that is shared between builds,
+# and the size in bytes that it may grow to. None disables the cache
+OBJECT_CACHE_DIR = None
+OBJECT_CACHE_SIZE = 5 * 1024 * 1024 * 1024
+
 ##############################################################################
 # User Settings (file)
 ##############################################################################
@@ -91,12 +110,26 @@ for _n in _ENV_PATHS:
             print("WARNING: MBED_%s set as environment variable but doesn't"
                   " exist" % _n)
 
-_ENV_VARS = ['PRINT_COMPILER_OUTPUT_AS_LINK', 'COLOR']
+_ENV_VARS = ['PRINT_COMPILER_OUTPUT_AS_LINK', 'COLOR', 'OBJECT_CACHE_DIR',
+             'VALIDATED_CONFIGS_FILE']
 for _n in _ENV_VARS:
     value = getenv('MBED_%s' % _n)
     if value:
         globals()[_n] = value
 
+_ENV_TIMEOUTS = ['COMPILE_TIMEOUT', 'BUILD_TIMEOUT', 'SCHEDULED_BUILD_TIMEOUT']
+for _n in _ENV_TIMEOUTS:
+    value = getenv('MBED_%s' % _n)
+    if value:
+        globals()[_n] = float(value) if float(value) > 0 else None
+
+if getenv('MBED_OBJECT_CACHE_SIZE'):
+    OBJECT_CACHE_SIZE = int(getenv('MBED_OBJECT_CACHE_SIZE'))
+
+if getenv('MBED_SKIP_VALIDATED_CONFIGS'):
+    SKIP_VALIDATED_CONFIGS = (getenv('MBED_SKIP_VALIDATED_CONFIGS').lower()
+                              in ('1', 'true', 'yes', 'on'))
+
 
 ##############################################################################
 # Test System Settings
@@ -145,6 +145,8 @@ if __name__ == '__main__':
         # If auto_detect attribute is present, we assume other auto-detection
         # parameters like 'toolchains_filter' are also set.
         print "MBEDLS: Detecting connected mbed-enabled devices... "
+        if opts.mut_pool:
+            print "MBEDLS: --mut-pool is not used with auto-detected MUTs"
 
         MUTs = get_autodetected_MUTS_list()
 
@@ -256,7 +258,8 @@ if __name__ == '__main__':
                                    _opts_waterfall_test=opts.waterfall_test,
                                    _opts_consolidate_waterfall_test=opts.consolidate_waterfall_test,
                                    _opts_extend_test_timeout=opts.extend_test_timeout,
-                                   _opts_auto_detect=opts.auto_detect)
+                                   _opts_auto_detect=opts.auto_detect,
+                                   _opts_mut_pool=opts.mut_pool)
 
     # Runs test suite in CLI mode
     if (singletest_in_cli_mode(single_test)):
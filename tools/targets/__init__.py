@@ -22,9 +22,15 @@ import struct
 import shutil
 import inspect
 import sys
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 from copy import copy
 from inspect import getmro
-from collections import namedtuple, Mapping
+from collections import namedtuple, Mapping, Sequence
+from hashlib import sha1
+from tempfile import mkstemp
 from tools.targets.LPC import patch
 from tools.paths import TOOLS_BOOTLOADERS
 from tools.utils import json_file_to_dict
@@ -96,15 +102,123 @@ def get_resolution_order(json_data, target_name, order, level=0):
     return order
 
 
-def target(name, json_data):
-    """Construct a target object"""
-    resolution_order = get_resolution_order(json_data, name, [])
+def _cumulative_attribute(name, json_data, resolution_order, attrname):
+    """Compute the value of a cumulative attribute of a target by following
+    the "_add" and "_remove" fields of the targets it inherits from
+    """
+    tdata = json_data
+    # For a cumulative attribute, figure out when it was defined the
+    # last time (in attribute resolution order) then follow the "_add"
+    # and "_remove" data fields
+    for idx, tgt in enumerate(resolution_order):
+        # the attribute was defined at this level in the resolution
+        # order
+        if attrname in tdata[tgt[0]]:
+            def_idx = idx
+            break
+    else:
+        raise AttributeError("Attribute '%s' not found in target '%s'"
+                             % (attrname, name))
+    # Get the starting value of the attribute
+    starting_value = (tdata[resolution_order[def_idx][0]][attrname]
+                      or [])[:]
+    # Traverse the resolution list in high inheritance to low
+    # inheritance level, left to right order to figure out all the
+    # other classes that change the definition by adding or removing
+    # elements
+    for idx in range(resolution_order[def_idx][1] - 1, -1, -1):
+        same_level_targets = [tar[0] for tar in resolution_order
+                              if tar[1] == idx]
+        for tar in same_level_targets:
+            data = tdata[tar]
+            # Do we have anything to add ?
+            if (attrname + "_add") in data:
+                starting_value.extend(data[attrname + "_add"])
+            # Do we have anything to remove ?
+            if (attrname + "_remove") in data:
+                # Macros can be defined either without a value (MACRO)
+                # or with a value (MACRO=10). When removing, we specify
+                # only the name of the macro, without the value. So we
+                # need to create a mapping between the macro name and
+                # its value. This will work for extra_labels and other
+                # type of arrays as well, since they fall into the
+                # "macros without a value" category (simple definitions
+                # without a value).
+                name_def_map = {}
+                for crtv in starting_value:
+                    if crtv.find('=') != -1:
+                        temp = crtv.split('=')
+                        if len(temp) != 2:
+                            raise ValueError(
+                                "Invalid macro definition '%s'" % crtv)
+                        name_def_map[temp[0]] = crtv
+                    else:
+                        name_def_map[crtv] = crtv
+                for element in data[attrname + "_remove"]:
+                    if element not in name_def_map:
+                        raise ValueError(
+                            ("Unable to remove '%s' in '%s.%s' since "
+                             % (element, name, attrname)) +
+                            "it doesn't exist")
+                    starting_value.remove(name_def_map[element])
+    return starting_value
+
+
+def flatten_target(name, json_data, resolution_order):
+    """Compute all of the attributes of a target at once
+
+    Positional arguments:
+    name - the name of the target
+    json_data - the descriptions of the target and of all of its parents
+    resolution_order - the resolution order of the target, as returned by
+                       get_resolution_order
+
+    Returns a tuple of a dictionary of the attributes of the target, where
+    the value of every attribute is taken from the first target in
+    resolution order that defines it and the "_add" and "_remove" fields are
+    applied to the cumulative attributes, and a dictionary of the exceptions
+    raised when computing the cumulative attributes that can not be computed
+    """
+    attributes = {}
+    for tgt, _ in reversed(resolution_order):
+        attributes.update(json_data[tgt])
+    errors = {}
+    for attrname in CUMULATIVE_ATTRIBUTES:
+        if attrname in attributes:
+            try:
+                attributes[attrname] = _cumulative_attribute(
+                    name, json_data, resolution_order, attrname)
+            except Exception as exc:
+                del attributes[attrname]
+                errors[attrname] = exc
+    return attributes, errors
+
+
+def target(name, json_data, flattened=None):
+    """Construct a target object
+
+    Positional arguments:
+    name - the name of the target
+    json_data - the descriptions of all targets
+
+    Keyword arguments:
+    flattened - the (resolution order, attributes, errors) of the target, as
+                stored in the target table, when they are known already
+    """
+    if flattened is None:
+        resolution_order = get_resolution_order(json_data, name, [])
+        attributes, errors = flatten_target(name, json_data,
+                                            resolution_order)
+    else:
+        resolution_order, attributes, errors = flattened
     resolution_order_names = [tgt for tgt, _ in resolution_order]
-    return Target(name=name,
-                  json_data={key: value for key, value in json_data.items()
-                             if key in resolution_order_names},
-                  resolution_order=resolution_order,
-                  resolution_order_names=resolution_order_names)
+    tgt = Target(name=name,
+                 json_data={key: json_data[key]
+                            for key in resolution_order_names},
+                 resolution_order=resolution_order,
+                 resolution_order_names=resolution_order_names)
+    tgt._set_attributes(attributes, errors)
+    return tgt
 
 def generate_py_target(new_targets, name):
     """Add one or more new target(s) represented as a Python dictionary
@@ -134,22 +248,91 @@ class Target(namedtuple("Target", "name json_data resolution_order resolution_or
     # Extra custom targets files
     __extra_target_json_files = []
 
+    # The file holding the target table between runs
+    __target_table_file = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '.targets_cache')
+
+    # Changes whenever the layout of the target table changes
+    TARGET_TABLE_VERSION = 1
+
     @staticmethod
-    @cached
-    def get_json_target_data():
-        """Load the description of JSON target data"""
+    def __build_target_table():
+        """Parse the JSON target descriptions and flatten every target"""
         targets = json_file_to_dict(Target.__targets_json_location or
                                     Target.__targets_json_location_default)
-
+        conflicts = []
         for extra_target in Target.__extra_target_json_files:
             for k, v in json_file_to_dict(extra_target).items():
                 if k in targets:
-                    print('WARNING: Custom target "%s" cannot replace existing '
-                          'target.' % k)
+                    conflicts.append(k)
                 else:
                     targets[k] = v
 
-        return targets
+        resolved = {}
+        for name in targets:
+            try:
+                resolution_order = get_resolution_order(targets, name, [])
+            except KeyError:
+                # The target inherits from a target that does not exist;
+                # the error is raised when the target is constructed
+                continue
+            resolved[name] = ((resolution_order,) +
+                              flatten_target(name, targets, resolution_order))
+        return {"targets": targets, "conflicts": conflicts,
+                "resolved": resolved}
+
+    @staticmethod
+    @cached
+    def get_target_table():
+        """Get the table of all targets, flattened
+
+        The table is a dictionary with the keys "targets", the JSON
+        descriptions of all targets, "conflicts", the custom targets that
+        attempt to replace an existing target, and "resolved", which maps the
+        name of a target to a (resolution order, attributes, errors) tuple as
+        taken by target(). The table is kept on disk between runs, along with
+        a hash of the JSON files that it was built from.
+        """
+        digest = sha1(str(Target.TARGET_TABLE_VERSION).encode("ascii"))
+        try:
+            for fname in ([Target.__targets_json_location or
+                           Target.__targets_json_location_default] +
+                          Target.__extra_target_json_files):
+                with open(fname, "rb") as json_file:
+                    digest.update(b"\0" + json_file.read())
+        except IOError:
+            # Let the JSON parser report the problem
+            return Target.__build_target_table()
+        key = digest.hexdigest()
+
+        try:
+            with open(Target.__target_table_file, "rb") as table_file:
+                cached_key, table = pickle.load(table_file)
+            if cached_key == key:
+                return table
+        except Exception:
+            pass
+
+        table = Target.__build_target_table()
+        table_dir = os.path.dirname(Target.__target_table_file)
+        try:
+            handle, temp_path = mkstemp(dir=table_dir)
+            with os.fdopen(handle, "wb") as table_file:
+                pickle.dump((key, table), table_file, protocol=2)
+            os.rename(temp_path, Target.__target_table_file)
+        except (IOError, OSError):
+            pass
+        return table
+
+    @staticmethod
+    @cached
+    def get_json_target_data():
+        """Load the description of JSON target data"""
+        table = Target.get_target_table()
+        for k in table["conflicts"]:
+            print('WARNING: Custom target "%s" cannot replace existing '
+                  'target.' % k)
+        return table["targets"]
 
     @staticmethod
     def add_extra_targets(source_dir):
@@ -190,99 +373,33 @@ class Target(namedtuple("Target", "name json_data resolution_order resolution_or
                 out[key] = val
         return out
 
-    def __getattr_cumulative(self, attrname):
-        """Look for the attribute in the class and its parents, as defined by
-        the resolution order
-        """
-        tdata = self.json_data
-        # For a cumulative attribute, figure out when it was defined the
-        # last time (in attribute resolution order) then follow the "_add"
-        # and "_remove" data fields
-        for idx, tgt in enumerate(self.resolution_order):
-            # the attribute was defined at this level in the resolution
-            # order
-            if attrname in tdata[tgt[0]]:
-                def_idx = idx
-                break
-        else:
-            raise AttributeError("Attribute '%s' not found in target '%s'"
-                                 % (attrname, self.name))
-        # Get the starting value of the attribute
-        starting_value = (tdata[self.resolution_order[def_idx][0]][attrname]
-                          or [])[:]
-        # Traverse the resolution list in high inheritance to low
-        # inheritance level, left to right order to figure out all the
-        # other classes that change the definition by adding or removing
-        # elements
-        for idx in range(self.resolution_order[def_idx][1] - 1, -1, -1):
-            same_level_targets = [tar[0] for tar in self.resolution_order
-                                  if tar[1] == idx]
-            for tar in same_level_targets:
-                data = tdata[tar]
-                # Do we have anything to add ?
-                if (attrname + "_add") in data:
-                    starting_value.extend(data[attrname + "_add"])
-                # Do we have anything to remove ?
-                if (attrname + "_remove") in data:
-                    # Macros can be defined either without a value (MACRO)
-                    # or with a value (MACRO=10). When removing, we specify
-                    # only the name of the macro, without the value. So we
-                    # need to create a mapping between the macro name and
-                    # its value. This will work for extra_labels and other
-                    # type of arrays as well, since they fall into the
-                    # "macros without a value" category (simple definitions
-                    # without a value).
-                    name_def_map = {}
-                    for crtv in starting_value:
-                        if crtv.find('=') != -1:
-                            temp = crtv.split('=')
-                            if len(temp) != 2:
-                                raise ValueError(
-                                    "Invalid macro definition '%s'" % crtv)
-                            name_def_map[temp[0]] = crtv
-                        else:
-                            name_def_map[crtv] = crtv
-                    for element in data[attrname + "_remove"]:
-                        if element not in name_def_map:
-                            raise ValueError(
-                                ("Unable to remove '%s' in '%s.%s' since "
-                                 % (element, self.name, attrname)) +
-                                "it doesn't exist")
-                        starting_value.remove(name_def_map[element])
-        return starting_value
-
-    def __getattr_helper(self, attrname):
-        """Compute the value of a given target attribute"""
-        if attrname in CUMULATIVE_ATTRIBUTES:
-            return self.__getattr_cumulative(attrname)
-        else:
-            tdata = self.json_data
-            starting_value = None
-            for tgt in self.resolution_order:
-                data = tdata[tgt[0]]
-                try:
-                    return data[attrname]
-                except KeyError:
-                    pass
-            else: # Attribute not found
-                raise AttributeError(
-                    "Attribute '%s' not found in target '%s'"
-                    % (attrname, self.name))
+    def _set_attributes(self, attributes, errors):
+        """Store the attributes computed by flatten_target in the instance
+        attributes (in __dict__), so that they are returned directly"""
+        self.__dict__.update(attributes)
+        # The lists of cumulative attributes are owned by each instance
+        for attrname in CUMULATIVE_ATTRIBUTES:
+            if attrname in attributes:
+                self.__dict__[attrname] = list(attributes[attrname])
+        self.__dict__["_attribute_errors"] = errors
 
     def __getattr__(self, attrname):
-        """ Return the value of an attribute. This function only computes the
-        attribute's value once, then adds it to the instance attributes (in
-        __dict__), so the next time it is returned directly
+        """ Called for the attributes that are not found in the instance
+        attributes, which are those that the target does not have and the
+        cumulative attributes that could not be computed
         """
-        result = self.__getattr_helper(attrname)
-        self.__dict__[attrname] = result
-        return result
+        errors = self.__dict__.get("_attribute_errors", {})
+        if attrname in errors:
+            raise errors[attrname]
+        raise AttributeError("Attribute '%s' not found in target '%s'"
+                             % (attrname, self.name))
 
     @staticmethod
     @cached
     def get_target(target_name):
         """ Return the target instance starting from the target name """
-        return target(target_name, Target.get_json_target_data())
+        return target(target_name, Target.get_json_target_data(),
+                      Target.get_target_table()["resolved"].get(target_name))
 
 
     @property
@@ -291,8 +408,8 @@ class Target(namedtuple("Target", "name json_data resolution_order resolution_or
         upon is_disk_virtual
         """
         try:
-            return self.__getattr__("program_cycle_s")
-        except AttributeError:
+            return self.__dict__["program_cycle_s"]
+        except KeyError:
             return 4 if self.is_disk_virtual else 1.5
 
     @property
@@ -538,19 +655,56 @@ class RTL8195ACode:
         rtl8195a_elf2bin(t_self, elf, binf)
 ################################################################################
 
-# Instantiate all public targets
+class _TargetMap(Mapping):
+    """Maps the name of every public target to its instance. A target is
+    only constructed when it is first looked up."""
+    def __init__(self, names):
+        self._names = names
+        self._public = set(names)
+
+    def _update(self):
+        self._public = set(self._names)
+
+    def __getitem__(self, name):
+        if name not in self._public:
+            raise KeyError(name)
+        return Target.get_target(name)
+
+    def __contains__(self, name):
+        return name in self._public
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+
+class _TargetList(Sequence):
+    """The instances of all public targets, in the order of their
+    definition. A target is only constructed when it is first used."""
+    def __init__(self, names):
+        self._names = names
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Target.get_target(name) for name in self._names[index]]
+        return Target.get_target(self._names[index])
+
+    def __len__(self):
+        return len(self._names)
+
+
+# Find all public targets
 def update_target_data():
-    TARGETS[:] = [Target.get_target(tgt) for tgt, obj
-                  in Target.get_json_target_data().items()
-                  if obj.get("public", True)]
-    # Map each target name to its unique instance
-    TARGET_MAP.clear()
-    TARGET_MAP.update(dict([(tgt.name, tgt) for tgt in TARGETS]))
-    TARGET_NAMES[:] = TARGET_MAP.keys()
-
-TARGETS = []
-TARGET_MAP = dict()
+    TARGET_NAMES[:] = [tgt for tgt, obj
+                       in Target.get_json_target_data().items()
+                       if obj.get("public", True)]
+    TARGET_MAP._update()
+
 TARGET_NAMES = []
+TARGETS = _TargetList(TARGET_NAMES)
+TARGET_MAP = _TargetMap(TARGET_NAMES)
 
 update_target_data()
 
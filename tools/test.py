@@ -28,7 +28,7 @@ ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, ROOT)
 
 from tools.config import ConfigException, Config
-from tools.test_api import test_path_to_name, find_tests, get_test_config, print_tests, build_tests, test_spec_from_test_builds
+from tools.test_api import test_path_to_name, find_tests, find_all_tests, get_test_config, print_tests, build_tests, test_spec_from_test_builds
 from tools.test_configs import get_default_config
 from tools.options import get_default_options_parser, extract_profile, extract_mcus
 from tools.build_api import build_project, build_library
@@ -41,6 +41,7 @@ from tools.test_exporters import ReportExporter, ResultExporterType
 from tools.utils import argparse_filestring_type, argparse_lowercase_type, argparse_many
 from tools.utils import argparse_dir_not_parent
 from tools.toolchains import mbedToolchain, TOOLCHAIN_PATHS, TOOLCHAIN_CLASSES
+from tools.toolchains.job_server import JobServer
 from tools.settings import CLI_COLOR_MAP
 
 if __name__ == '__main__':
@@ -158,9 +159,9 @@ if __name__ == '__main__':
 
 
         # Find all tests in the relevant paths
-        for path in all_paths:
-            all_tests.update(find_tests(path, mcu, toolchain,
-                                        app_config=config))
+        all_tests = find_all_tests(all_paths, [(mcu, toolchain)],
+                                   app_config=config,
+                                   jobs=options.jobs)[(mcu, toolchain)]
 
         # Filter tests by name if specified
         if options.names:
@@ -202,6 +203,8 @@ if __name__ == '__main__':
             try:
                 # Build sources
                 notify = TerminalNotifier(options.verbose)
+                # One job server limits the compilers of all builds
+                job_server = JobServer(options.jobs)
                 build_library(base_source_paths, options.build_dir, mcu,
                               toolchain, jobs=options.jobs,
                               clean=options.clean, report=build_report,
@@ -210,7 +213,8 @@ if __name__ == '__main__':
                               notify=notify, archive=False,
                               app_config=config,
                               build_profile=profile,
-                              ignore=options.ignore)
+                              ignore=options.ignore,
+                              job_server=job_server)
 
                 library_build_success = True
             except ToolException as e:
@@ -244,7 +248,8 @@ if __name__ == '__main__':
                     app_config=config,
                     build_profile=profile,
                     stats_depth=options.stats_depth,
-                    ignore=options.ignore)
+                    ignore=options.ignore,
+                    job_server=job_server)
 
                 # If a path to a test spec is provided, write it to a file
                 if options.test_spec:
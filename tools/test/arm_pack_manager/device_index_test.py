@@ -0,0 +1,69 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+from os import utime
+
+from mock import patch
+
+from tools.arm_pack_manager import DeviceIndex, Cache, shared_device_index
+
+DEVICES = {
+    "DEV_A": {"core": "Cortex-M4", "sectors": [[0, 8192]],
+              "memory": {"IROM1": {"start": "0x0", "size": "0x8000"}}},
+    "DEV_B": {"core": "Cortex-M0", "sectors": None, "debug": "SVD/b.svd"},
+    "DEV_{,}": {"vendor": "Some \"quoted\" {text}:1"},
+    "version": "0.1.0",
+}
+
+
+def write_index(tmpdir, devices):
+    index = tmpdir.join("index.json")
+    index.write(json.dumps(devices, indent=1))
+    return str(index), str(tmpdir.join("offsets"))
+
+
+def test_device_index(tmpdir):
+    """Test that the devices of the view are those of the index file"""
+    filename, offsets = write_index(tmpdir, DEVICES)
+    index = DeviceIndex(filename, offsets)
+    assert sorted(index) == sorted(DEVICES)
+    assert "DEV_C" not in index
+    for name, device in DEVICES.items():
+        assert index[name] == device
+    assert dict(index) == DEVICES
+    index.close()
+
+
+def test_device_index_offsets(tmpdir):
+    """Test that the device offsets are only found again when the index file
+    is modified"""
+    filename, offsets = write_index(tmpdir, DEVICES)
+    DeviceIndex(filename, offsets)["DEV_A"]
+    with patch.object(DeviceIndex, "_find_offsets") as find_offsets:
+        assert DeviceIndex(filename, offsets)["DEV_A"] == DEVICES["DEV_A"]
+        assert not find_offsets.called
+
+    devices = dict(DEVICES, DEV_C={"core": "Cortex-M7"})
+    write_index(tmpdir, devices)
+    utime(filename, (1, 1))
+    assert DeviceIndex(filename, offsets)["DEV_C"] == devices["DEV_C"]
+
+
+def test_shared_device_index():
+    """Test that every Cache shares the index of index.json"""
+    assert Cache(True, True).index is shared_device_index()
+    assert Cache(False, False).index is shared_device_index()
@@ -0,0 +1,110 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+import os
+from os.path import join
+from threading import Lock
+from time import time, sleep
+
+from tools.build_api import prep_report, create_result, add_result_to_report
+from tools.build_scheduler import Build, run_builds
+from tools.utils import ToolException
+
+
+def fake_build(log_dir, target, toolchain, fail=False, report=None,
+               properties=None, job_server=None):
+    """Record when the build ran, and its result in the report"""
+    start = time()
+    sleep(0.2)
+    with open(join(log_dir, "%s-%s" % (target, toolchain)), "w") as log:
+        json.dump([start, time(), job_server.jobs], log)
+    if report is not None:
+        prep_report(report, target, toolchain, "MBED")
+        add_result_to_report(report, create_result(target, toolchain, "MBED",
+                                                    "mbed SDK"))
+    if properties is not None:
+        properties.setdefault(target, {})[toolchain] = {"target": target}
+    if fail:
+        raise ToolException("%s failed" % target)
+    return True
+
+
+def test_run_builds(tmpdir):
+    """Test that independent builds run at once, and that a build starts
+    only after the builds it depends on succeed"""
+    log_dir = str(tmpdir)
+    builds = [
+        Build("A", fake_build, (log_dir, "A", "GCC_ARM")),
+        Build("B", fake_build, (log_dir, "B", "GCC_ARM")),
+        Build("C", fake_build, (log_dir, "A", "ARM"), depends=["A"]),
+        Build("D", fake_build, (log_dir, "D", "GCC_ARM"), {"fail": True}),
+        Build("E", fake_build, (log_dir, "E", "GCC_ARM"), depends=["D", "A"]),
+    ]
+    report, properties, finished = {}, {}, []
+    results = run_builds(builds, jobs=3, report=report,
+                         properties=properties,
+                         notify=lambda key, _: finished.append(key))
+
+    assert sorted(finished) == ["A", "B", "C", "D", "E"]
+    assert [results[k].status for k in "ABCDE"] == \
+        ["OK", "OK", "OK", "FAIL", "SKIP"]
+    assert isinstance(results["D"].reason, ToolException)
+    assert "D failed" in results["D"].traceback
+    assert results["A"].value is True
+
+    logs = {}
+    for name in ["A-GCC_ARM", "B-GCC_ARM", "A-ARM", "D-GCC_ARM"]:
+        with open(join(log_dir, name)) as log:
+            logs[name] = json.load(log)
+    assert not tmpdir.join("E-GCC_ARM").check()
+    assert logs["A-GCC_ARM"][0] < logs["B-GCC_ARM"][1]
+    assert logs["B-GCC_ARM"][0] < logs["A-GCC_ARM"][1]
+    assert logs["A-ARM"][0] >= logs["A-GCC_ARM"][1]
+    # All builds share a single job server
+    assert set(log[2] for log in logs.values()) == set([3])
+
+    assert sorted(report) == ["A", "B", "D"]
+    assert sorted(report["A"]) == ["ARM", "GCC_ARM"]
+    assert len(report["D"]["GCC_ARM"]["MBED"]) == 1
+    assert properties["A"] == {"ARM": {"target": "A"},
+                               "GCC_ARM": {"target": "A"}}
+
+
+def exit_build(properties=None, job_server=None):
+    """Exit the worker process, losing the result of the build"""
+    os._exit(1)
+
+
+def unpicklable_build(properties=None, job_server=None):
+    """Return properties that cannot be sent back to the parent process"""
+    properties["A"] = {"GCC_ARM": {"lock": Lock()}}
+    return True
+
+
+def test_run_builds_lost(tmpdir):
+    """Test that builds whose results are lost fail instead of blocking the
+    run, while the builds queued behind them still run"""
+    builds = [
+        Build("A", exit_build),
+        Build("B", unpicklable_build),
+        Build("C", exit_build, depends=["B"]),
+        Build("D", fake_build, (str(tmpdir), "D", "GCC_ARM")),
+    ]
+    results = run_builds(builds, jobs=1, properties={}, timeout=2)
+    assert [results[k].status for k in "ABCD"] == \
+        ["FAIL", "FAIL", "SKIP", "OK"]
+    assert "did not finish in 2 seconds" in str(results["A"].reason)
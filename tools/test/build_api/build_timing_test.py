@@ -0,0 +1,69 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+from mock import patch
+
+from tools.build_timing import BuildTimer, format_timing
+
+
+def test_nested_phases():
+    """Test that the time of a phase excludes the phases nested within it"""
+    timer = BuildTimer()
+    with patch("tools.build_timing.time",
+               side_effect=[0.0, 1.0, 3.0, 4.0, 10.0, 12.0]):
+        with timer.phase("config"):
+            with timer.phase("scan"):
+                pass
+        with timer.phase("link"):
+            pass
+    timing = timer.summary()
+    assert list(timing["phases"].items()) == [
+        ("scan", 2.0), ("config", 2.0), ("link", 2.0)]
+    assert [name for name, _, _ in timer.phases] == ["scan", "config", "link"]
+
+
+def test_summary_and_trace(tmpdir):
+    """Test that compiles and counters are summarised and traced"""
+    timer = BuildTimer()
+    with timer.phase("compile"):
+        timer.add_compile("a.c", 10.0, 10.5, 12.5, "1:1")
+        timer.add_compile("b.c", 10.0, 10.0, 11.0, "2:1")
+        timer.add_compile("c.c", None, 11.0, 11.25, "2:1")
+    timer.count("stat_cache_hits", 3)
+    timer.count("stat_cache_hits")
+
+    timing = timer.summary(slowest=2)
+    assert timing["compile"] == {"files": 3, "queue_wait": 0.5, "run": 3.25,
+                                 "slowest": [["a.c", 2.0], ["b.c", 1.0]]}
+    assert timing["counters"] == {"stat_cache_hits": 4}
+    assert "stat_cache_hits" in format_timing(timing)
+    json.dumps(timing)
+
+    trace_file = str(tmpdir.join("trace.json"))
+    timer.write_chrome_trace(trace_file, "app")
+    with open(trace_file) as trace:
+        events = json.load(trace)["traceEvents"]
+    compiles = dict((e["name"], e) for e in events if e.get("cat") == "compile")
+    assert compiles["a.c"]["tid"] != compiles["b.c"]["tid"]
+    assert compiles["b.c"]["tid"] == compiles["c.c"]["tid"]
+    assert compiles["a.c"]["ts"] == 500000
+    assert compiles["a.c"]["dur"] == 2000000
+    assert compiles["a.c"]["args"]["queue_wait_us"] == 500000
+    assert "queue_wait_us" not in compiles["c.c"]["args"]
+    assert [e["name"] for e in events if e.get("cat") == "phase"] == ["compile"]
+    assert [e["args"] for e in events if e["ph"] == "C"] == \
+        [{"stat_cache_hits": 4}]
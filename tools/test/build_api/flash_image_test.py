@@ -0,0 +1,135 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import struct
+import zlib
+import hashlib
+from io import BytesIO, StringIO
+from collections import namedtuple
+
+import pytest
+from intelhex import IntelHex
+from mock import MagicMock, patch
+
+from tools.build_api import merge_region_list, _fill_header
+from tools.flash_image import FlashImage
+from tools.utils import ToolException
+
+Region = namedtuple("Region", "name start size active filename")
+
+
+def _intelhex_output(ihex, format):
+    if format == "hex":
+        output = StringIO()
+        ihex.write_hex_file(output)
+        return output.getvalue().encode("ascii")
+    output = BytesIO()
+    ihex.tofile(output, format="bin")
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("format", ["bin", "hex"])
+def test_write_matches_intelhex(format):
+    """Test that an image is written just as IntelHex writes it, across
+    holes, padding and 64K pages"""
+    pieces = [(0x0FFF8, os.urandom(0x30)),
+              (0x10100, os.urandom(5)),
+              (0x10105, os.urandom(0x21)),
+              (0x2FFF0, os.urandom(0x10))]
+    image, ihex = FlashImage(), IntelHex()
+    for start, data in pieces:
+        image.add(start, data)
+        ihex.puts(start, data)
+    image.fill(0x30000, 0x123, b'\xFF')
+    ihex.puts(0x30000, b'\xFF' * 0x123)
+
+    output = BytesIO()
+    image.tofile(output, format)
+    assert output.getvalue() == _intelhex_output(ihex, format)
+
+    with pytest.raises(ToolException):
+        image.add(0x10120, b'\x00' * 0x10)
+
+
+def test_large_bin_mapped(tmpdir):
+    """Test that a large binary is memory mapped and merged in place"""
+    data = os.urandom(0x1000)
+    filename = str(tmpdir.join("boot.bin"))
+    with open(filename, "wb") as bin_file:
+        bin_file.write(data)
+    with patch("tools.flash_image.MMAP_THRESHOLD", 0x800):
+        image = FlashImage.from_file(filename, 0x8000)
+    assert image._maps
+    assert (image.minaddr(), image.maxaddr()) == (0x8000, 0x8FFF)
+    assert image.tobinstr() == data
+    image.close()
+
+
+@pytest.mark.parametrize("format", ["bin", "hex"])
+def test_merge_region_list(tmpdir, format):
+    """Test that regions are merged and padded as with IntelHex"""
+    boot = os.urandom(0x100)
+    app = os.urandom(0x80)
+    boot_file = str(tmpdir.join("boot.bin"))
+    with open(boot_file, "wb") as bin_file:
+        bin_file.write(boot)
+    app_hex = IntelHex()
+    app_hex.puts(0x10400, app)
+    app_file = str(tmpdir.join("app.hex"))
+    app_hex.tofile(app_file, format="hex")
+    regions = [Region("bootloader", 0x10000, 0x400, True, boot_file),
+               Region("application", 0x10400, 0x800, True, app_file)]
+    destination = str(tmpdir.join("out", "merged." + format))
+
+    merge_region_list(regions, destination, MagicMock())
+
+    expected = IntelHex()
+    expected.puts(0x10000, boot + b'\xFF' * 0x300 + app)
+    with open(destination, "rb") as merged:
+        assert merged.read() == _intelhex_output(expected, format)
+
+    regions[0] = regions[0]._replace(size=0x80)
+    with pytest.raises(ToolException):
+        merge_region_list(regions, destination, MagicMock())
+
+
+def test_fill_header(tmpdir):
+    """Test that the header digests cover the region contents, with the
+    holes of a hex file filled, and the header before the digest"""
+    app_hex = IntelHex()
+    app_hex.puts(0x10100, b"\x01\x02\x03")
+    app_hex.puts(0x10110, b"\x04")
+    app_file = str(tmpdir.join("app.hex"))
+    app_hex.tofile(app_file, format="hex")
+    app_data = app_hex.tobinstr()
+    members = [("magic", "const", "32le", "0x5a51b3d4"),
+               ("size", "size", "32le", ["application"]),
+               ("crc", "digest", "CRCITT32le", "application"),
+               ("sha", "digest", "SHA256", "application"),
+               ("header_crc", "digest", "CRCITT32be", "header")]
+    regions = [Region("header", 0x10000, 0x100, True, members),
+               Region("application", 0x10100, 0x800, True, app_file)]
+
+    header = _fill_header(regions, regions[0]).tobinstr()
+
+    assert len(header) == 0x100
+    assert header[:8] == struct.pack("<LL", 0x5a51b3d4, len(app_data))
+    assert header[8:12] == struct.pack("<L", zlib.crc32(app_data) & 0xFFFFFFFF)
+    assert header[12:44] == hashlib.sha256(app_data).digest()
+    assert header[44:48] == struct.pack(
+        ">L", zlib.crc32(header[:44]) & 0xFFFFFFFF)
+    assert header[48:] == b"\x00" * (0x100 - 48)
@@ -25,7 +25,7 @@ from hypothesis.strategies import sampled_from
 from os.path import join, isfile, dirname, abspath
 from tools.build_api import get_config
 from tools.targets import set_targets_json_location, Target, TARGET_NAMES
-from tools.config import ConfigException, Config
+from tools.config import ConfigException, Config, ValidatedConfigs
 
 def compare_config(cfg, expected):
     """Compare the output of config against a dictionary of known good results
@@ -196,3 +196,84 @@ def test_basic_regions(target, overrides):
                 assert r.size >= 0
     except ConfigException:
         pass
+
+
+def test_config_data_memoized(tmpdir):
+    """
+    Test that the configuration is resolved again only when a library is
+    added
+    """
+    set_targets_json_location()
+    lib_config = tmpdir.join("mbed_lib.json")
+    lib_config.write(json.dumps({
+        "name": "lib",
+        "config": {"value": 1},
+        "target_overrides": {"*": {"value": 2}}
+    }))
+    config = Config("K64F")
+    with patch.object(Config, "get_target_config_data",
+                      wraps=config.get_target_config_data) as resolve:
+        params, macros = config.get_config_data()
+        assert config.get_features() == config.get_features()
+        assert config.get_config_data() == (params, macros)
+        assert resolve.call_count == 1
+
+        config.add_config_files([str(lib_config)])
+        params, _ = config.get_config_data()
+        assert params["lib.value"].value == 2
+        config.add_config_files([str(lib_config)])
+        config.get_config_data()
+        assert resolve.call_count == 2
+
+
+def test_validated_configs_skipped(tmpdir):
+    """
+    Test that a configuration file is validated every time by default, and
+    with SKIP_VALIDATED_CONFIGS again only when its content changes
+    """
+    set_targets_json_location()
+    lib_config = tmpdir.join("mbed_lib.json")
+    lib_config.write(json.dumps({"name": "lib", "config": {"value": 1}}))
+    validated = ValidatedConfigs(str(tmpdir.join("validated")))
+    with patch("tools.config._VALIDATED_CONFIGS", validated),\
+         patch("tools.config.Draft4Validator.iter_errors",
+               autospec=True, return_value=[]) as iter_errors:
+        # Every file is validated unless skipping is enabled
+        Config("K64F").add_config_files([str(lib_config)])
+        Config("K64F").add_config_files([str(lib_config)])
+        assert iter_errors.call_count == 2
+        assert not tmpdir.join("validated").check()
+        iter_errors.reset_mock()
+
+        with patch("tools.config.SKIP_VALIDATED_CONFIGS", True):
+            Config("K64F").add_config_files([str(lib_config)])
+            assert iter_errors.call_count == 1
+            Config("K64F").add_config_files([str(lib_config)])
+            assert iter_errors.call_count == 1
+
+            # Another build reads the hashes from disk
+            with patch("tools.config._VALIDATED_CONFIGS",
+                       ValidatedConfigs(validated.filename)):
+                Config("K64F").add_config_files([str(lib_config)])
+                assert iter_errors.call_count == 1
+
+            lib_config.write(json.dumps({"name": "lib",
+                                         "config": {"value": 2}}))
+            Config("K64F").add_config_files([str(lib_config)])
+            assert iter_errors.call_count == 2
+
+
+def test_invalid_config_not_recorded(tmpdir):
+    """
+    Test that a configuration file that fails validation is validated again
+    """
+    set_targets_json_location()
+    lib_config = tmpdir.join("mbed_lib.json")
+    lib_config.write(json.dumps({"config": {"value": 1}}))
+    validated = ValidatedConfigs(str(tmpdir.join("validated")))
+    with patch("tools.config._VALIDATED_CONFIGS", validated),\
+         patch("tools.config.SKIP_VALIDATED_CONFIGS", True):
+        for _ in range(2):
+            with pytest.raises(ConfigException):
+                Config("K64F").add_config_files([str(lib_config)])
+    assert not tmpdir.join("validated").check()
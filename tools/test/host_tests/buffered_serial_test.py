@@ -0,0 +1,70 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+
+import pytest
+
+from tools.host_tests.buffered_serial import BufferedSerial
+
+serial = pytest.importorskip("serial")
+
+
+@pytest.fixture
+def loopback():
+    """A serial port on a pty, with the file descriptor of the device end"""
+    if not hasattr(os, "openpty"):
+        pytest.skip("ptys are not available")
+    device, port = os.openpty()
+    port_name = os.ttyname(port)
+    mbed = serial.Serial(port_name, baudrate=115200, timeout=0.2)
+    yield BufferedSerial(mbed), device
+    mbed.close()
+    os.close(port)
+    os.close(device)
+
+
+def test_readline(loopback):
+    """Test that lines are read from the blocks received, and that a line
+    not ended in time is returned as it is"""
+    port, device = loopback
+    os.write(device, b"{{start}}\nhello\nwor")
+    assert port.readline() == b"{{start}}\n"
+    assert port.readline() == b"hello\n"
+    assert port.readline(timeout=0.3) == b"wor"
+    assert port.reads < 10
+    assert port.bytes_read == 19
+
+
+def test_read_until_and_write(loopback):
+    """Test waiting for a token, reads of a count and writes"""
+    port, device = loopback
+    os.write(device, b"noise {{end}} 0123456789")
+    assert port.read_until(b"{{success}}", timeout=0.3) is None
+    assert port.read_until(b"{{end}}") == b"noise {{end}}"
+    assert port.read(3) == b" 01"
+    assert port.read(20) == b"23456789"
+
+    assert port.write(b"echo\n") == 5
+    assert os.read(device, 64) == b"echo\n"
+    stats = port.stats()
+    assert stats["bytes_written"] == 5 and stats["writes"] == 1
+    assert stats["bytes_read"] == 24
+
+    os.write(device, b"stale")
+    port.fill()
+    port.flush()
+    assert port.read(1) == b""
@@ -0,0 +1,128 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Map file parsing on map files that are scaled up from the fixtures.
+
+Run this file to benchmark the parsers on maps of up to 100k lines:
+
+    python tools/test/memap/benchmark_test.py
+"""
+from __future__ import print_function, division
+import re
+import sys
+from io import StringIO
+from os import sep
+from os.path import join, dirname, abspath, basename
+from time import time
+
+import pytest
+
+sys.path.insert(0, abspath(join(dirname(__file__), "..", "..", "..")))
+
+from tools.memap import _GccParser, _ArmccParser, _IarParser
+
+PARSERS = {
+    "gcc.map": _GccParser,
+    "arm.map": _ArmccParser,
+    "iar.map": _IarParser,
+}
+
+COMMON_PATH = "/common/path/"
+IAR_OBJECT = re.compile(r'(\w+)\.o( \[\d+\])')
+OBJECT_PATH = re.compile(r'%s(\S+)\.o' % COMMON_PATH)
+
+
+def scale_map(name, lines):
+    """Scale up a map file fixture to about *lines* lines
+
+    Every object of the fixture is copied as many times as needed; the
+    copies are named as if they were compiled from different sources in a
+    different directory.
+    """
+    with open(join(dirname(__file__), name)) as map_file:
+        fixture = map_file.read().splitlines(True)
+    rename_path = lambda line, copy: OBJECT_PATH.sub(
+        r"%sgen%d/\1_%d.o" % (COMMON_PATH, copy, copy), line)
+    if name == "iar.map":
+        # The IAR map names objects by their file name alone, and lists the
+        # objects with their path on the linker command line
+        objects = [l for l in fixture if IAR_OBJECT.search(l) or
+                   (l.startswith("#") and OBJECT_PATH.search(l))]
+        rename = lambda line, copy: rename_path(
+            IAR_OBJECT.sub(r"\1_%d.o\2" % copy, line), copy)
+    else:
+        objects = [l for l in fixture if OBJECT_PATH.search(l)]
+        rename = rename_path
+    copies = max(0, (lines - len(fixture)) // len(objects))
+    scaled = []
+    for line in fixture:
+        scaled.append(line)
+        if line in objects:
+            scaled.extend(rename(line, copy) for copy in range(copies))
+    return u"".join(scaled)
+
+
+def parse(name, text, parser_class=None):
+    parser = (parser_class or PARSERS[name])()
+    return parser.parse_mapfile(StringIO(text))
+
+
+def linear_module_add(self, object_name, size, section):
+    """The original module_add, that searches all modules for a match"""
+    if not object_name or not size or not section:
+        return
+
+    if object_name in self.modules:
+        self.modules[object_name].setdefault(section, 0)
+        self.modules[object_name][section] += size
+        return
+
+    obj_split = sep + basename(object_name)
+    for module_path, contents in self.modules.items():
+        if module_path.endswith(obj_split) or module_path == object_name:
+            contents.setdefault(section, 0)
+            contents[section] += size
+            return
+
+    self.modules[object_name] = {section: size}
+
+
+@pytest.mark.parametrize("name", sorted(PARSERS))
+def test_scaled_map(name):
+    """Test that modules are matched as by a search of all modules"""
+    text = scale_map(name, 2000)
+    linear = type("Linear", (PARSERS[name],),
+                  {"module_add": linear_module_add})
+    modules = parse(name, text)
+    assert len(modules) > 100
+    assert modules == parse(name, text, linear)
+
+
+def benchmark(sizes=(1000, 10000, 100000)):
+    print("%-8s %8s %10s %14s" % ("map", "lines", "seconds", "us per line"))
+    for name in sorted(PARSERS):
+        for size in sizes:
+            text = scale_map(name, size)
+            lines = text.count(u"\n")
+            start = time()
+            parse(name, text)
+            elapsed = time() - start
+            print("%-8s %8d %10.3f %14.2f" % (name, lines, elapsed,
+                                              elapsed / lines * 1e6))
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -23,6 +23,7 @@ import pytest
 import tools.memap
 from tools.memap import MemapParser
 from copy import deepcopy
+from mock import patch
 
 """
 Tests for test_api.py
@@ -216,3 +217,31 @@ def test_generate_output_csv_ci(memap_parser, tmpdir, depth, sep):
     file_name = str(tmpdir.join('output.csv').realpath())
     generate_test_helper(memap_parser, 'csv-ci', depth, sep, file_name)
     assert isfile(file_name), "Failed to create csv-ci file"
+
+
+def test_report_per_depth(memap_parser, tmpdir):
+    """
+    Test that the report of each depth is computed once, from the module tree
+
+    :param memap_parser: Mocked parser
+    :param tmpdir: a unique location to place output files
+    """
+    tools.memap.sep = "/"
+    reduce_depth = memap_parser.reduce_depth
+    with patch.object(memap_parser, 'reduce_depth',
+                      side_effect=reduce_depth) as mock_reduce:
+        memap_parser.generate_output('table', 2)
+        memap_parser.generate_output(
+            'json', 2, str(tmpdir.join('output.json')))
+        memap_parser.generate_output(
+            'csv-ci', 2, str(tmpdir.join('output.csv')))
+        assert mock_reduce.call_count == 1
+
+    assert sorted(memap_parser.short_modules) == [
+        "[lib]/libc.a", "main.o", "mbed-os/targets", "test.o"]
+    assert memap_parser.mem_summary == {'static_ram': 24, 'total_flash': 27}
+
+    memap_parser.generate_output('table', 1)
+    assert sorted(memap_parser.short_modules) == [
+        "[lib]", "main.o", "mbed-os", "test.o"]
+    assert memap_parser.short_modules["[lib]"][".text"] == 4
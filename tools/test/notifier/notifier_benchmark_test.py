@@ -0,0 +1,97 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Notifier throughput on the notifications of a verbose build.
+
+Run this file to benchmark the notifiers on up to 42k notifications:
+
+    python tools/test/notifier/notifier_benchmark_test.py
+"""
+from __future__ import print_function, division
+import os
+import sys
+from os.path import join, dirname, abspath
+from time import time
+
+sys.path.insert(0, abspath(join(dirname(__file__), "..", "..", "..")))
+
+from tools.notifier.ndjson import NDJSONNotifier
+from tools.notifier.term import TerminalNotifier
+
+
+class ConcatNotifier(TerminalNotifier):
+    """The original TerminalNotifier, that adds every message to a string"""
+
+    def __init__(self, *args, **kwargs):
+        super(ConcatNotifier, self).__init__(*args, **kwargs)
+        self.output = ""
+
+    def get_output(self):
+        return self.output
+
+    def notify(self, event):
+        if self.verbose:
+            msg = self.print_notify_verbose(event)
+        else:
+            msg = self.print_notify(event)
+        if msg:
+            self.output += msg + "\n"
+
+
+def build_notifications(notify, count):
+    """Send the notifications of a verbose build of *count* sources"""
+    for number in range(count):
+        source = "./mbed-os/drivers/source_%d.cpp" % number
+        notify.cc_verbose("arm-none-eabi-g++ -c -Os -Wall %s -o %s.o"
+                          % (source, source))
+        notify.progress("compile", source, 100.0 * number / count)
+        if number % 10 == 0:
+            notify.cc_info({'severity': 'warning', 'file': source,
+                            'line': number, 'col': 5,
+                            'message': "unused variable 'x_%d'" % number})
+
+
+def test_same_output():
+    """Test that the output is that of the original notifier"""
+    concat = ConcatNotifier(verbose=True, silent=True)
+    terminal = TerminalNotifier(verbose=True, silent=True)
+    build_notifications(concat, 500)
+    build_notifications(terminal, 500)
+    assert concat.get_output() == terminal.get_output()
+
+
+def benchmark(sizes=(1000, 5000, 10000, 20000)):
+    print("%-10s %8s %10s %14s" % ("notifier", "events", "seconds",
+                                   "events per s"))
+    for size in sizes:
+        with open(os.devnull, "wb") as devnull:
+            notifiers = [
+                ("concat", ConcatNotifier(verbose=True, silent=True)),
+                ("terminal", TerminalNotifier(verbose=True, silent=True)),
+                ("ndjson", NDJSONNotifier(devnull)),
+            ]
+            for name, notify in notifiers:
+                events = size * 2 + size // 10
+                start = time()
+                build_notifications(notify, size)
+                notify.get_output()
+                elapsed = time() - start
+                print("%-10s %8d %10.3f %14.0f" % (name, events, elapsed,
+                                                   events / elapsed))
+
+
+if __name__ == "__main__":
+    benchmark()
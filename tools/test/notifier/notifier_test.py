@@ -0,0 +1,60 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+from io import BytesIO
+
+from tools.notifier.ndjson import NDJSONNotifier
+from tools.notifier.term import TerminalNotifier
+
+
+def test_output_bounded():
+    """Test that only the last messages are kept for the output"""
+    notify = TerminalNotifier(silent=True, max_output=3)
+    for number in range(5):
+        notify.info("message %d" % number)
+    assert notify.get_output() == ("[2 earlier messages not kept]\n"
+                                   "message 2\nmessage 3\nmessage 4\n")
+
+
+def test_ndjson_stream(tmpdir):
+    """Test that every event is written as a line of JSON, as it was before
+    the terminal notifier formatted it"""
+    stream = BytesIO()
+    terminal = TerminalNotifier(silent=True)
+    notify = NDJSONNotifier(stream, terminal)
+    notify.progress("compile", "./dir/main.c", 50.0)
+    notify.cc_info({'severity': 'warning', 'file': './dir/main.c', 'line': 3,
+                    'col': 1, 'message': 'unused'})
+    notify.var("binary", tmpdir)
+    notify.close()
+
+    events = [json.loads(line) for line in
+              stream.getvalue().decode("utf-8").splitlines()]
+    assert events[0] == {'type': 'progress', 'action': 'compile',
+                         'file': './dir/main.c', 'percent': 50.0}
+    assert events[1]['severity'] == 'warning'
+    assert events[2] == {'type': 'var', 'key': 'binary', 'val': str(tmpdir)}
+    assert notify.get_output() == terminal.get_output()
+    assert "[Warning] main.c@3,1: unused" in notify.get_output()
+
+    log = str(tmpdir.join("log.json"))
+    with NDJSONNotifier(log, max_output=1) as notify:
+        notify.info("first")
+        notify.info("second")
+        assert notify.get_output().endswith('"message":"second"}\n')
+    with open(log) as log_file:
+        assert len(log_file.readlines()) == 2
@@ -22,8 +22,10 @@ import tempfile
 from os.path import join, abspath, dirname
 from contextlib import contextmanager
 import pytest
+from mock import patch
 
-from tools.targets import TARGETS, TARGET_MAP, Target, update_target_data
+from tools.targets import TARGETS, TARGET_MAP, TARGET_NAMES, Target, \
+    CACHES, update_target_data
 from tools.arm_pack_manager import Cache
 
 
@@ -131,3 +133,50 @@ def test_modify_existing_target():
             # The existing target should not be modified by custom targets
             assert TARGET_MAP["Test_Target"].default_toolchain != 'GCC_ARM'
             assert TARGET_MAP["Test_Target"].bootloader_supported != True
+
+def test_target_table():
+    """Flatten the targets once, then use the stored target table until the
+    JSON files change"""
+    targets_json = """
+    {
+        "Target": {
+            "core": null,
+            "macros": ["A", "B=1"],
+            "public": false
+        },
+        "Base": {
+            "inherits": ["Target"],
+            "macros_add": ["C"],
+            "public": false
+        },
+        "Test_Target": {
+            "inherits": ["Base"],
+            "macros_remove": ["B"],
+            "core": "Cortex-M4"
+        },
+        "Bad_Target": {
+            "inherits": ["Target"],
+            "macros_remove": ["D"]
+        }
+    }"""
+    try:
+        with temp_target_file(targets_json,
+                              json_filename="targets.json") as targets_dir:
+            Target.set_targets_json_location(
+                os.path.join(targets_dir, "targets.json"))
+            update_target_data()
+            assert TARGET_NAMES == ["Test_Target", "Bad_Target"]
+            assert "Base" not in TARGET_MAP
+            assert TARGET_MAP["Test_Target"].macros == ["A", "C"]
+            assert TARGET_MAP["Test_Target"].core == "Cortex-M4"
+            with pytest.raises(ValueError):
+                TARGET_MAP["Bad_Target"].macros
+            assert [t.name for t in TARGETS] == TARGET_NAMES
+
+            with patch("tools.targets.flatten_target") as flatten:
+                CACHES.clear()
+                update_target_data()
+                assert TARGET_MAP["Test_Target"].macros == ["A", "C"]
+                assert not flatten.called
+    finally:
+        update_target_data()
@@ -0,0 +1,135 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Reading of the output of host tests that print many lines.
+
+Run this file to benchmark the reader on up to 100k lines of output:
+
+    python tools/test/test_api/host_output_benchmark_test.py
+"""
+from __future__ import print_function, division
+import re
+import sys
+from os.path import join, dirname, abspath
+from subprocess import Popen, PIPE
+from threading import Thread
+from time import time
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
+
+sys.path.insert(0, abspath(join(dirname(__file__), "..", "..", "..")))
+
+from tools.test_api import ProcessObserver, read_host_test_output
+
+HOST_TEST = """
+import sys
+sys.stdout.write("HOST: Property 'timeout' = '20'\\n")
+for number in range(int(sys.argv[1])):
+    sys.stdout.write("[%d] netsocket: sent 1024 bytes, \\xe9cho ok\\r\\n" % number)
+sys.stdout.write("{success}\\n{end}\\ntrailing output\\n")
+sys.stdout.flush()
+"""
+
+
+def host_test(lines, **kwargs):
+    return Popen([sys.executable, "-c", HOST_TEST, str(lines)], stdout=PIPE,
+                 **kwargs)
+
+
+class CharObserver(Thread):
+    """The original ProcessObserver, that reads a character at a time"""
+
+    def __init__(self, proc):
+        Thread.__init__(self)
+        self.proc = proc
+        self.queue = Queue()
+        self.daemon = True
+        self.start()
+
+    def run(self):
+        while True:
+            c = self.proc.stdout.read(1)
+            self.queue.put(c)
+            if not c:
+                break
+
+
+def read_chars(obs, duration):
+    """The original reading of host test output, a character at a time"""
+    line = ''
+    output = []
+    start_time = time()
+    while (time() - start_time) < (2 * duration):
+        try:
+            c = obs.queue.get(block=True, timeout=0.5)
+        except Empty:
+            c = None
+        if c:
+            if ord(c) not in range(128):
+                c = ' '
+            output.append(c)
+            if c in ['\n', '\r']:
+                if re.search("HOST: Property '%s'" % 'timeout', line):
+                    re.search(r"HOST: Property '%s' = '([\w\d _]+)'" %
+                              'timeout', line)
+                if 'mbed assertation failed: ' in line:
+                    output.append('{{mbed_assert}}')
+                    break
+                if '{end}' in line:
+                    break
+                line = ''
+            else:
+                line += c
+    return output
+
+
+def test_read_host_test_output():
+    """Test that output is read up to the end of the test, with the timeout
+    set by the host test"""
+    obs = ProcessObserver(host_test(2000))
+    output, _, duration = read_host_test_output(obs, 10)
+    obs.stop()
+    text = "".join(output)
+    assert duration == 20
+    assert text.count("\r\n") == 2000
+    assert "\xe9" not in text and " cho ok" in text
+    assert text.endswith("{success}\n{end}\ntrailing output\n")
+
+
+def benchmark(sizes=(1000, 10000, 100000)):
+    print("%-8s %8s %10s %14s" % ("reader", "lines", "seconds",
+                                  "lines per s"))
+    for size in sizes:
+        start = time()
+        proc = host_test(size, universal_newlines=True)
+        read_chars(CharObserver(proc), 600)
+        proc.wait()
+        elapsed = time() - start
+        print("%-8s %8d %10.3f %14.0f" % ("char", size, elapsed,
+                                          size / elapsed))
+        start = time()
+        obs = ProcessObserver(host_test(size))
+        read_host_test_output(obs, 600)
+        obs.stop()
+        elapsed = time() - start
+        print("%-8s %8d %10.3f %14.0f" % ("chunked", size, elapsed,
+                                          size / elapsed))
+
+
+if __name__ == "__main__":
+    benchmark()
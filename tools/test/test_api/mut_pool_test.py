@@ -0,0 +1,155 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import shutil
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+from time import sleep
+
+import pytest
+from mock import patch
+
+from tools.targets import set_targets_json_location
+from tools.test_api import SingleTestRunner, MutPool
+
+
+@pytest.fixture
+def muts(tmpdir):
+    """Simulated K64F MUTs, with a directory as the disk and a pty as the
+    serial port. The disk of MUT 3 is missing, so it fails to flash."""
+    if not hasattr(os, "openpty"):
+        pytest.skip("ptys are not available")
+    muts, fds = {}, []
+    for mut_id in ["1", "2", "3"]:
+        disk = tmpdir.join("disk%s" % mut_id)
+        if mut_id != "3":
+            disk.ensure(dir=True)
+        device, port = os.openpty()
+        fds.extend([device, port])
+        muts[mut_id] = {"mcu": "K64F", "disk": str(disk),
+                        "port": os.ttyname(port), "peripherals": ["TMP102"]}
+    muts["4"] = {"mcu": "NUCLEO_F401RE", "disk": str(tmpdir),
+                 "port": os.ttyname(fds[1])}
+    yield muts
+    for fd in fds:
+        os.close(fd)
+
+
+def test_lease(muts):
+    """Test that MUTs are leased by MCU and peripherals, once at a time"""
+    pool = MutPool(muts)
+    assert pool.count("K64F") == 3
+    assert pool.count("K64F", ["TMP102", "SD"]) == 0
+    assert pool.lease("K64F", ["SD"]) is None
+    assert pool.lease("K64F", exclude=["1", "2", "3"]) is None
+    first = pool.lease("K64F", ["TMP102"])
+    second = pool.lease("K64F", exclude=["2"])
+    assert first[0] == "1" and second[0] == "3"
+    pool.release("1")
+    assert pool.lease("K64F")[0] == "1"
+    pool.quarantine("3")
+    assert pool.count("K64F") == 2
+    assert pool.lease("K64F", exclude=["1", "2"]) is None
+
+
+class FakeDbLogger(object):
+    """A database logger with a connection that may be used by one thread
+    at a time"""
+
+    def __init__(self):
+        self.connected = False
+        self.entries = []
+
+    def reconnect(self):
+        assert not self.connected
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    def insert_test_entry(self, build_id, target, toolchain, test_type,
+                          test_id, result, *_):
+        sleep(0.05)
+        assert self.connected
+        self.entries.append((test_id, result))
+
+    def disconnect(self):
+        self.connected = False
+
+
+def test_handle_pooled(muts, tmpdir):
+    """Test that tests run at once on the MUTs of their MCU, and that a test
+    is retried on another MUT after the MUT it ran on failed to flash, which
+    is not leased again"""
+    set_targets_json_location()
+    image = tmpdir.join("image.bin")
+    image.write("image")
+    lock = Lock()
+    running, ran = set(), []
+
+    def run_host_test(name, image_path, disk, port, duration, **_):
+        with lock:
+            assert port not in running
+            running.add(port)
+            ran.append(port)
+        try:
+            if not os.path.isdir(disk):
+                return "IOERR_COPY", "{ioerr_copy}", 0, duration
+            sleep(0.2)
+            shutil.copy(image_path, disk)
+            return "OK", "{success}", 0.1, duration
+        finally:
+            with lock:
+                running.remove(port)
+
+    runner = SingleTestRunner(_muts=muts, _opts_mut_pool=True)
+    runner.db_logger = FakeDbLogger()
+    test_ids = ["MBED_A1", "MBED_A3", "BENCHMARK_1", "MBED_A4"]
+    with patch.object(runner, "run_host_test", side_effect=run_host_test):
+        threads = ThreadPool(runner.mut_pool.count("K64F"))
+        results = threads.map(
+            lambda test_id: runner.handle_pooled(
+                runner.shape_test_request("K64F", str(image), test_id),
+                "K64F", "GCC_ARM"),
+            test_ids)
+        threads.close()
+        threads.join()
+
+    assert [result[0][0][0] for result in results] == ["OK"] * len(test_ids)
+    assert [result[0][0][3] for result in results] == test_ids
+    # Every test ran once on a MUT that flashed, and one test at most ran on
+    # MUT 3 before it was quarantined
+    assert ran.count(muts["3"]["port"]) == len(ran) - len(test_ids)
+    assert len(ran) <= len(test_ids) + 1
+    assert runner.mut_pool.quarantined <= set(["3"])
+    assert runner.mut_pool.free == set(muts) - runner.mut_pool.quarantined
+    for mut_id in ["1", "2"]:
+        assert os.listdir(muts[mut_id]["disk"]) == ["image.bin"]
+    # Every run was written to the database
+    db_results = [result for _, result in runner.db_logger.entries]
+    assert sorted(test_id for test_id, result in runner.db_logger.entries
+                  if result == "OK") == sorted(test_ids)
+    assert db_results.count("IOERR_COPY") == len(ran) - len(test_ids)
+    assert runner.handle_pooled(
+        runner.shape_test_request("LPC1768", str(image), "MBED_A1"),
+        "LPC1768", "GCC_ARM") == []
+
+
+def test_mut_pool_auto_detect(muts):
+    """Test that the MUT pool is not used with auto detected MUTs"""
+    assert SingleTestRunner(_muts=muts, _opts_mut_pool=True,
+                            _opts_auto_detect=True).mut_pool is None
@@ -16,9 +16,13 @@ limitations under the License.
 """
 
 import pytest
+from os.path import join
+from threading import Lock
 from mock import patch
 from tools.targets import set_targets_json_location
-from tools.test_api import find_tests, build_tests
+from tools.test_api import find_tests, find_all_tests, build_tests
+from tools.build_api import prep_report, create_result, add_result_to_report
+from tools.notifier.mock import MockNotifier
 
 """
 Tests for test_api.py
@@ -95,3 +99,119 @@ def test_find_tests_app_config(build_path, target, toolchain_name, app_config):
                 "build_tests was called with an incorrect app_config"
         mock_get_config.called_with(src_paths, target,
                                     toolchain_name, app_conifg=app_config)
+
+
+def test_find_tests_common(tmpdir):
+    """
+    Test that find_tests finds the test cases of every TESTS folder, along
+    with the COMMON folders of their group and of their TESTS folder
+
+    :param tmpdir: a directory to create the test cases in
+    """
+    set_targets_json_location()
+    files = [
+        "main.cpp",
+        "TESTS/group/case/main.cpp",
+        "TESTS/group/COMMON/group_common.h",
+        "TESTS/COMMON/common.h",
+        "TESTS/other/case/main.cpp",
+        "TESTS/host_tests/host_test.py",
+        "lib/TESTS/lib_group/lib_case/main.cpp",
+        "lib/TESTS/lib_group/COMMON/lib_common.h",
+    ]
+    for name in files:
+        tmpdir.join(name).write("", ensure=True)
+    base_dir = str(tmpdir)
+    tests = join(base_dir, "TESTS")
+    lib_tests = join(base_dir, "lib", "TESTS")
+    expected = {
+        "tests-group-case": [join(tests, "group", "case"),
+                             join(tests, "group", "COMMON"),
+                             join(tests, "COMMON")],
+        "tests-other-case": [join(tests, "other", "case"),
+                             join(tests, "COMMON")],
+        "lib-tests-lib_group-lib_case": [join(lib_tests, "lib_group", "lib_case"),
+                                         join(lib_tests, "lib_group", "COMMON")],
+    }
+
+    assert find_tests(base_dir, "K64F", "GCC_ARM") == expected
+    all_tests = find_all_tests([base_dir], [("K64F", "GCC_ARM"),
+                                            ("K64F", "ARM")], jobs=2)
+    assert all_tests == {("K64F", "GCC_ARM"): expected,
+                         ("K64F", "ARM"): expected}
+
+
+def fake_build_project(src_paths, build_path, target, toolchain_name,
+                       notify=None, report=None, properties=None,
+                       project_id=None, **_):
+    """Notify and report the build of a test, as build_project does"""
+    notify.info("Building %s" % project_id)
+    id_name = project_id.upper()
+    prep_report(report, target, toolchain_name, id_name)
+    add_result_to_report(report, create_result(target, toolchain_name,
+                                               id_name, project_id))
+    properties[target] = {toolchain_name: {"project": project_id}}
+    return join(build_path, "test.bin")
+
+
+def test_build_tests_notifications():
+    """
+    Test that the notifications of the test builds reach the notifier of
+    build_tests, and that the reports of the builds are merged into its
+    report, with the output of every build
+    """
+    tests = {'test1': 'test1_path', 'test2': 'test2_path'}
+    notify = MockNotifier()
+    report = {"K64F": {"GCC_ARM": {"MBED-BUILD": [{0: {}}]}}}
+    properties = {}
+    set_targets_json_location()
+    with patch('tools.test_api.build_project',
+               side_effect=fake_build_project),\
+         patch('tools.test_api.get_config') as mock_get_config:
+        mock_get_config.return_value = ({}, "", "")
+        result, test_builds = build_tests(
+            tests, ['.'], "build_path", "K64F", "GCC_ARM", notify=notify,
+            jobs=2, report=report, properties=properties)
+
+    assert result
+    assert sorted(event['message'] for event in notify.messages) == \
+        ["Building test1", "Building test2"]
+    entries = report["K64F"]["GCC_ARM"]
+    assert sorted(entries) == ["MBED-BUILD", "TEST1", "TEST2"]
+    assert entries["TEST1"][0][0]["output"] == "Building test1\n"
+    assert properties["K64F"]["GCC_ARM"]["project"] in tests
+    assert sorted(test_builds["K64F-GCC_ARM"]["tests"]) == ["test1", "test2"]
+
+
+def unpicklable_build_project(src_paths, build_path, target, toolchain_name,
+                              properties=None, project_id=None, **kwargs):
+    """Build a test, with properties that cannot be sent back from the worker
+    process for test2"""
+    if project_id == "test2":
+        properties["lock"] = Lock()
+    return fake_build_project(src_paths, build_path, target, toolchain_name,
+                              properties=properties, project_id=project_id,
+                              **kwargs)
+
+
+def test_build_tests_lost_result():
+    """
+    Test that a test build whose result cannot be sent back fails the build
+    of the tests, with the reason
+    """
+    tests = {'test1': 'test1_path', 'test2': 'test2_path'}
+    notify = MockNotifier()
+    set_targets_json_location()
+    with patch('tools.test_api.build_project',
+               side_effect=unpicklable_build_project),\
+         patch('tools.test_api.get_config') as mock_get_config:
+        mock_get_config.return_value = ({}, "", "")
+        result, test_builds = build_tests(
+            tests, ['.'], "build_path", "K64F", "GCC_ARM", notify=notify,
+            jobs=2, report={}, properties={}, continue_on_build_fail=True)
+
+    assert not result
+    assert sorted(test_builds["K64F-GCC_ARM"]["tests"]) == ["test1"]
+    errors = [event['message'] for event in notify.messages
+              if event['type'] == 'tool_error']
+    assert len(errors) == 1 and errors[0].startswith("Build of test2 failed")
@@ -1,6 +1,11 @@
 """Tests for the toolchain sub-system"""
 import sys
 import os
+import time
+import shutil
+import threading
+import tempfile
+import pickle
 from string import printable
 from copy import deepcopy
 from mock import MagicMock, patch
@@ -12,9 +17,12 @@ ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..",
 sys.path.insert(0, ROOT)
 
 from tools.toolchains import TOOLCHAIN_CLASSES, LEGACY_TOOLCHAIN_NAMES,\
-    Resources, TOOLCHAIN_PATHS, mbedToolchain
+    Resources, TOOLCHAIN_PATHS, mbedToolchain, feature_scans, add_feature_scans
+from tools.toolchains.job_server import JobServer
+from tools.toolchains.object_cache import ObjectCache
 from tools.targets import TARGET_MAP
 from tools.notifier.mock import MockNotifier
+from tools.utils import mkdir, replace_file, ToolException
 
 ALPHABET = [char for char in printable if char not in [u'.', u'/']]
 
@@ -192,3 +200,392 @@ def test_path_specified_gcc(gcc_loc, exists_at_loc, exists_in_path):
                 assert TOOLCHAIN_PATHS['GCC_ARM'] == gcc_loc
             elif exists_in_path:
                 assert TOOLCHAIN_PATHS['GCC_ARM'] == ''
+
+
+RESOURCE_FIELDS = ['inc_dirs', 'headers', 's_sources', 'c_sources',
+                   'cpp_sources', 'lib_dirs', 'objects', 'libraries',
+                   'repo_dirs', 'hex_files', 'bin_files', 'json_files',
+                   'ignored_dirs', 'linker_script', 'file_basepath']
+
+def _scan_resources(path, build_dir=None):
+    toolchain = TOOLCHAIN_CLASSES["GCC_ARM"](TARGET_MAP["K64F"],
+                                             notify=MockNotifier(),
+                                             build_dir=build_dir)
+    return toolchain.scan_resources(path, collect_ignores=True)
+
+def _scan_snapshot(build_dir, path):
+    res = _scan_resources(path, build_dir)
+    snapshot = {field: getattr(res, field) for field in RESOURCE_FIELDS}
+    snapshot['features'] = sorted(res.features)
+    return snapshot
+
+def _age_dirs(path):
+    past = time.time() - 100
+    for root, _, _ in os.walk(path):
+        os.utime(root, (past, past))
+
+def test_scan_cache():
+    """Test that a scan replayed from the scan cache is identical to a fresh
+    scan, before and after the tree changes"""
+    src = tempfile.mkdtemp()
+    build = tempfile.mkdtemp()
+    try:
+        for name in ["main.cpp", "TARGET_K64F/k64f.c", "TARGET_K64F/k64f.h",
+                     "TARGET_NRF51/nrf.c", "FEATURE_BLE/ble.cpp",
+                     "lib/a/a.c", "lib/b/b.c", "lib/b/b.h", "lib/b/b.ld",
+                     "TOOLCHAIN_GCC_ARM/startup.S"]:
+            mkdir(os.path.join(src, os.path.dirname(name)))
+            open(os.path.join(src, name), "w").close()
+        with open(os.path.join(src, "lib", ".mbedignore"), "w") as f:
+            f.write("a/*\n")
+        _age_dirs(src)
+
+        fresh = _scan_snapshot(None, src)
+        assert _scan_snapshot(build, src) == fresh
+        with patch.object(mbedToolchain, '_list_dir',
+                          side_effect=AssertionError("directory listed")):
+            assert _scan_snapshot(build, src) == fresh
+
+        with open(os.path.join(src, "lib", ".mbedignore"), "w") as f:
+            f.write("b/*\n")
+        open(os.path.join(src, "lib", "a", "a2.c"), "w").close()
+        _age_dirs(src)
+        fresh = _scan_snapshot(None, src)
+        assert _scan_snapshot(build, src) == fresh
+        assert os.path.join(src, "lib", "a", "a2.c") in fresh['c_sources']
+    finally:
+        shutil.rmtree(src)
+        shutil.rmtree(build)
+
+
+def test_scan_read_ahead_order():
+    """Test that a scan does not depend on the order in which the
+    directories that are read ahead are read"""
+    src = tempfile.mkdtemp()
+    try:
+        for name in ["main.cpp", "a/a.c", "a/x/x.c", "a/y/y.h", "b/b.c",
+                     "b/z/z.cpp", "c/c.ld", "d/.mbedignore", "d/e/e.c"]:
+            mkdir(os.path.join(src, os.path.dirname(name)))
+            open(os.path.join(src, name), "w").close()
+        with open(os.path.join(src, "d", ".mbedignore"), "w") as f:
+            f.write("e/*\n")
+        fresh = _scan_snapshot(None, src)
+
+        list_dir = mbedToolchain._list_dir
+        def slow_list_dir(path):
+            # Finish the reads of earlier directories last
+            time.sleep(0.05 if path.endswith(("a", "x")) else 0)
+            return list_dir(path)
+        with patch.object(mbedToolchain, '_list_dir',
+                          side_effect=slow_list_dir):
+            assert _scan_snapshot(None, src) == fresh
+        assert os.path.join(src, "a", "x", "x.c") in fresh['c_sources']
+        assert os.path.join(src, "d", "e", "e.c") not in fresh['c_sources']
+    finally:
+        shutil.rmtree(src)
+
+
+def test_feature_scans_shared():
+    """Test that FEATURE_ scans are picklable, and reused by another process
+    without scanning the feature again"""
+    src = tempfile.mkdtemp()
+    try:
+        for name in ["main.cpp", "FEATURE_A/a.c", "FEATURE_A/skip/s.c",
+                     "FEATURE_A/FEATURE_B/b.c"]:
+            mkdir(os.path.join(src, os.path.dirname(name)))
+            open(os.path.join(src, name), "w").close()
+        with open(os.path.join(src, "FEATURE_A", ".mbedignore"), "w") as f:
+            f.write("skip/*\n")
+
+        def feature_snapshot(scan):
+            res = scan.features["A"]
+            nested = res.features["B"]
+            return (res.c_sources, res.ignored_dirs, nested.c_sources,
+                    nested.ignored_dirs)
+
+        with patch.dict('tools.toolchains._FEATURE_SCANS', clear=True):
+            fresh = _scan_resources(src)
+            assert pickle.loads(pickle.dumps(fresh)).features.lazy
+            expected = feature_snapshot(fresh)
+            assert expected[0] == [os.path.join(src, "FEATURE_A", "a.c")]
+            shared = pickle.loads(pickle.dumps(feature_scans()))
+
+        with patch.dict('tools.toolchains._FEATURE_SCANS', clear=True):
+            add_feature_scans(shared)
+            reused = _scan_resources(src)
+            with patch.object(mbedToolchain, '_list_dir',
+                              side_effect=AssertionError("feature scanned")):
+                reused.features["A"]
+            assert feature_snapshot(reused) == expected
+    finally:
+        shutil.rmtree(src)
+
+
+def _fake_compile_worker(job):
+    """Stand-in for compile_worker that succeeds without running anything"""
+    return {'source': job['source'], 'object': job['object'],
+            'commands': job['commands'],
+            'results': [{'code': 0, 'output': b'', 'command': ['cc']}]}
+
+def _hanging_compile_worker(job):
+    """Stand-in for compile_worker that never finishes compiling main.c"""
+    if job['source'] == "main.c":
+        time.sleep(30)
+    return _fake_compile_worker(job)
+
+_running = {'now': 0, 'most': 0}
+_running_lock = threading.Lock()
+
+def _counting_compile_worker(job):
+    """Stand-in for compile_worker that records how many compiles run at
+    once"""
+    with _running_lock:
+        _running['now'] += 1
+        _running['most'] = max(_running['most'], _running['now'])
+    time.sleep(0.02)
+    with _running_lock:
+        _running['now'] -= 1
+    return _fake_compile_worker(job)
+
+def _queue_toolchain(queue, job_server=None):
+    toolchain = TOOLCHAIN_CLASSES["GCC_ARM"](TARGET_MAP["K64F"],
+                                             notify=MockNotifier())
+    toolchain.jobs = 2
+    toolchain.job_server = job_server
+    toolchain.compile_timeout = 1
+    toolchain.compiled = 0
+    toolchain.to_be_compiled = len(queue)
+    return toolchain
+
+def _compile_queue(worker, queue):
+    toolchain = _queue_toolchain(queue)
+    with patch('tools.toolchains.compile_worker', new=worker):
+        return toolchain.compile_queue(queue, [])
+
+def test_compile_queue():
+    """Test that compile_queue collects every object"""
+    queue = [{'source': "%d.c" % i, 'object': "%d.o" % i, 'commands': []}
+             for i in range(20)]
+    objects = _compile_queue(_fake_compile_worker, queue)
+    assert sorted(objects) == sorted(item['object'] for item in queue)
+
+def test_compile_queue_timeout():
+    """Test that compile_queue gives up on a compile that exceeds the
+    compile timeout"""
+    queue = [{'source': "%d.c" % i, 'object': "%d.o" % i, 'commands': []}
+             for i in range(4)] + [{'source': "main.c", 'object': "main.o",
+                                    'commands': []}]
+    start = time.time()
+    try:
+        _compile_queue(_hanging_compile_worker, queue)
+        assert False, "compile_queue did not time out"
+    except ToolException as exc:
+        assert "1 seconds" in str(exc)
+    assert time.time() - start < 10
+
+def test_compile_queue_job_server():
+    """Test that builds sharing a job server together run no more compiles
+    at once than the job server allows"""
+    job_server = JobServer(2)
+    queues = [[{'source': "%d_%d.c" % (build, i), 'object': "%d_%d.o" % (build, i),
+                'commands': []} for i in range(10)] for build in range(3)]
+    objects = {}
+    def build(queue):
+        toolchain = _queue_toolchain(queue, job_server)
+        objects[id(queue)] = toolchain.compile_queue(queue, [])
+    with patch('tools.toolchains.compile_worker', new=_counting_compile_worker):
+        threads = [threading.Thread(target=build, args=(queue,))
+                   for queue in queues]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    for queue in queues:
+        assert sorted(objects[id(queue)]) == sorted(item['object'] for item in queue)
+    assert 1 < _running['most'] <= 2
+
+def test_compile_queue_streamed():
+    """Test that compile_queue starts compiling before the queue is
+    completely generated"""
+    started = []
+    def worker(job):
+        started.append(time.time())
+        return _fake_compile_worker(job)
+    def generate():
+        for i in range(5):
+            time.sleep(0.05)
+            yield {'source': "%d.c" % i, 'object': "%d.o" % i,
+                   'commands': []}
+        generated.append(time.time())
+    generated = []
+    toolchain = _queue_toolchain(range(5), JobServer(2))
+    with patch('tools.toolchains.compile_worker', new=worker):
+        objects = toolchain.compile_queue(generate(), [])
+    assert sorted(objects) == ["%d.o" % i for i in range(5)]
+    assert len(started) == 5
+    assert min(started) < generated[0]
+
+def _python_job(work_dir, source_text, object_text):
+    """A compile queue item that 'compiles' with the Python interpreter"""
+    write = ("open('out.o', 'w').write(%r); open('out.d', 'w').write('deps')"
+             % object_text)
+    return {'source': "in.c", 'object': "out.o", 'work_dir': work_dir,
+            'chroot': None, 'dependencies': "out.d",
+            'commands': [[sys.executable, "-c", write]],
+            'preprocess': [sys.executable, "-c", "print(%r)" % source_text]}
+
+def test_object_cache():
+    """Test that the object cache returns the object compiled from the same
+    preprocessed source, and evicts the least recently used objects"""
+    work_dir = tempfile.mkdtemp()
+    try:
+        cache = ObjectCache(os.path.join(work_dir, "cache"), 1024 * 1024)
+        result = cache.compile(_python_job(work_dir, "int a;", "first"))
+        assert result['cached'] is False
+        assert result['results'][0]['code'] == 0
+
+        result = cache.compile(_python_job(work_dir, "int a;", "second"))
+        assert result['cached'] is True
+        with open(os.path.join(work_dir, "out.o")) as obj:
+            assert obj.read() == "first"
+        with open(os.path.join(work_dir, "out.d")) as deps:
+            assert deps.read() == "deps"
+
+        result = cache.compile(_python_job(work_dir, "int b;", "third"))
+        assert result['cached'] is False
+
+        # Keep room for one entry only, after "int a;" was used least recently
+        job = _python_job(work_dir, "int a;", "")
+        key = cache.key(job['preprocess'], b"int a;" + os.linesep.encode())
+        old = time.time() - 100
+        os.utime(cache.entry_path(key), (old, old))
+        cache.max_size = os.path.getsize(cache.entry_path(key)) + 50
+        cache.trim()
+        assert cache.compile(_python_job(work_dir, "int b;", "x"))['cached']
+        assert not cache.compile(_python_job(work_dir, "int a;", "x"))['cached']
+    finally:
+        shutil.rmtree(work_dir)
+
+def test_object_cache_between_builds():
+    """Test that the same source compiled by two builds, into two build
+    directories, shares its object, with dependencies within the build
+    directory that uses it"""
+    work_dir = tempfile.mkdtemp()
+    try:
+        cache = ObjectCache(os.path.join(work_dir, "cache"), 1024 * 1024)
+
+        def preprocess(command, work_dir=None):
+            # Like the compiler, name the forcibly included header
+            config = command[command.index("-include") + 1]
+            return ('# 1 "%s"\nint a;\n' % config).encode(), b"", 0
+
+        def compile(job):
+            with open(job['object'], "w") as obj:
+                obj.write(job['work_dir'])
+            config = job['commands'][0][
+                job['commands'][0].index("-include") + 1]
+            with open(job['dependencies'], "w") as deps:
+                deps.write("%s: main.c \\\n %s\n" % (job['object'], config))
+            return {'source': job['source'], 'object': job['object'],
+                    'commands': job['commands'],
+                    'results': [{'code': 0, 'output': "", 'command': None}]}
+
+        results = []
+        for index, build in enumerate(["first", "second"]):
+            build_dir = os.path.join(work_dir, build)
+            mkdir(build_dir)
+            toolchain = TOOLCHAIN_CLASSES["GCC_ARM"](
+                TARGET_MAP["K64F"], notify=MockNotifier(), build_dir=build_dir)
+            toolchain.object_cache = cache
+            toolchain.timestamp = index
+            symbols = toolchain.get_symbols()
+            toolchain.get_symbols = lambda *_: (symbols[::-1] if index
+                                                else symbols)
+            toolchain.config_file = os.path.join(build_dir, "mbed_config.h")
+            toolchain.config_processed = True
+            with open(toolchain.config_file, "w") as config:
+                config.write("#define A 1\n")
+            toolchain.inc_md5 = "md5"
+            toolchain.get_inc_file(["inc"])
+            obj = os.path.join(build_dir, "main.o")
+            item = {'source': "main.c", 'object': obj, 'work_dir': work_dir,
+                    'chroot': None,
+                    'commands': toolchain.compile_c("main.c", obj, ["inc"])}
+            toolchain.add_object_cache(item)
+            assert len(item['files']) == 2
+            with patch("tools.toolchains.object_cache.run_cmd", preprocess), \
+                 patch("tools.toolchains.object_cache.compile_worker",
+                       compile):
+                results.append(cache.compile(item))
+
+        assert [result['cached'] for result in results] == [False, True]
+        with open(os.path.join(work_dir, "second", "main.o")) as obj:
+            assert obj.read() == work_dir
+        with open(os.path.join(work_dir, "second", "main.d")) as deps:
+            assert deps.read().startswith(obj.name + ":")
+        deps = toolchain.get_dependencies(item['dependencies'])
+        assert deps == ["main.c", toolchain.config_file]
+
+        # A change of the configuration of the second build recompiles
+        later = time.time() + 10
+        os.utime(toolchain.config_file, (later, later))
+        assert toolchain.need_update(obj.name, deps)
+    finally:
+        shutil.rmtree(work_dir)
+
+def test_preprocess_command():
+    """Test that the preprocess command is the compile command without its
+    outputs"""
+    toolchain = TOOLCHAIN_CLASSES["GCC_ARM"](TARGET_MAP["K64F"],
+                                             notify=MockNotifier())
+    command = (toolchain.cc + ["-DA=1"] +
+               toolchain.get_dep_option("build/main.o") +
+               ["-o", "build/main.o", "main.c"])
+    preprocess = toolchain.preprocess_command(command, "build/main.o")
+    assert preprocess == toolchain.cc + ["-DA=1", "main.c", "-E"]
+
+def test_dependency_cache():
+    """Test that dependency files are only parsed again when they change"""
+    build_dir = tempfile.mkdtemp()
+    try:
+        dep_path = os.path.join(build_dir, "main.d")
+        with open(dep_path, "w") as dep_file:
+            dep_file.write("main.o: main.c \\\n inc/a.h\n")
+
+        def toolchain():
+            return TOOLCHAIN_CLASSES["GCC_ARM"](
+                TARGET_MAP["K64F"], notify=MockNotifier(), build_dir=build_dir)
+
+        first = toolchain()
+        assert first.get_dependencies(dep_path) == ["main.c", "inc/a.h"]
+        first.get_dep_cache().save()
+
+        second = toolchain()
+        with patch.object(second, 'parse_dependencies') as parse:
+            assert second.get_dependencies(dep_path) == ["main.c", "inc/a.h"]
+            assert not parse.called
+
+        with open(dep_path, "w") as dep_file:
+            dep_file.write("main.o: main.c \\\n inc/a.h \\\n inc/b.h\n")
+        assert second.get_dependencies(dep_path) == ["main.c", "inc/a.h",
+                                                     "inc/b.h"]
+        assert second.get_dependencies(
+            os.path.join(build_dir, "missing.d")) == []
+    finally:
+        shutil.rmtree(build_dir)
+
+def test_copy_files_shared(tmpdir):
+    """Test that copied files replace their destination whole, and that
+    directories created by another build at the same time are no error"""
+    source = tmpdir.join("src", "mbed.h")
+    source.write("new", ensure=True)
+    target = tmpdir.join("lib", "mbed.h")
+    target.write("old", ensure=True)
+    replace_file(str(source), str(target))
+    assert target.read() == "new"
+    assert sorted(os.listdir(str(tmpdir.join("lib")))) == ["mbed.h"]
+
+    # The directory appears after mkdir checked for it
+    with patch("tools.utils.exists", return_value=False):
+        mkdir(str(tmpdir.join("lib")))
+
@@ -0,0 +1,138 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Scans of synthetic trees with many .mbedignore files.
+
+Run this file to benchmark the scan of a tree with 500 .mbedignore files
+against a scan that matches every path with one regex of all patterns:
+
+    python tools/test/toolchains/mbedignore_test.py
+"""
+from __future__ import print_function, division
+import re
+import sys
+import fnmatch
+import shutil
+import tempfile
+from os.path import join, dirname, abspath, relpath, normcase
+from time import time
+
+sys.path.insert(0, abspath(join(dirname(__file__), "..", "..", "..")))
+
+from tools.toolchains import TOOLCHAIN_CLASSES
+from tools.toolchains.mbedignore import IgnoreTrie
+from tools.targets import TARGET_MAP
+from tools.notifier.mock import MockNotifier
+from tools.utils import mkdir
+
+
+def make_tree(root, count):
+    """Create a tree of *count* libraries that each have a .mbedignore"""
+    for index in range(count):
+        lib = join(root, "group%d" % (index // 25), "lib%d" % index)
+        for name in ["src.c", "include/lib.h", "test/test.c",
+                     "unused_%d.c" % index, "old.bak", "src/more.cpp"]:
+            path = join(lib, name)
+            mkdir(dirname(path))
+            open(path, "w").close()
+        with open(join(lib, ".mbedignore"), "w") as mbedignore:
+            mbedignore.write("test/*\n*.bak\nunused_%d.c\n" % index)
+    open(join(root, "main.cpp"), "w").close()
+
+
+def linear_add_ignore_patterns(self, root, base_path, patterns):
+    """The original add_ignore_patterns, that compiles all patterns into one
+    regex"""
+    real_base = relpath(root, base_path)
+    if real_base == ".":
+        self.ignore_patterns.extend(normcase(p) for p in patterns)
+    else:
+        self.ignore_patterns.extend(normcase(join(real_base, pat))
+                                    for pat in patterns)
+    if self.ignore_patterns:
+        self._ignore_regex = re.compile("|".join(
+            fnmatch.translate(p) for p in self.ignore_patterns))
+
+
+def linear_is_ignored(self, file_path):
+    """The original is_ignored"""
+    return getattr(self, "_ignore_regex", re.compile("$^")).match(
+        normcase(file_path))
+
+
+def scan(path, toolchain_class=None):
+    toolchain_class = toolchain_class or TOOLCHAIN_CLASSES["GCC_ARM"]
+    toolchain = toolchain_class(TARGET_MAP["K64F"], notify=MockNotifier())
+    return toolchain.scan_resources(path, collect_ignores=True)
+
+
+# Toolchains are identified by the name of their class
+LINEAR = type("GCC_ARM", (TOOLCHAIN_CLASSES["GCC_ARM"],),
+              {"add_ignore_patterns": linear_add_ignore_patterns,
+               "is_ignored": linear_is_ignored})
+
+
+def test_ignore_trie():
+    """Test that only the patterns of the directories along a path apply"""
+    trie = IgnoreTrie()
+    trie.add(".", ["*.bak"])
+    trie.add(join("a", "b"), [join("a", "b", "*")])
+    trie.add("c", [join("c", "x.c")])
+    assert trie.match("z.bak")
+    assert trie.match(join("a", "b", "c.c"))
+    assert trie.match(join("a", "b", ""))
+    assert not trie.match(join("a", "c.c"))
+    assert not trie.match(join("a", "bc", "c.c"))
+    assert trie.match(join("c", "x.c"))
+    assert not trie.match(join("c", "y.c"))
+    assert not trie.match(join("c", "d", "x.c"))
+
+
+def test_many_mbedignores():
+    """Test that a scan of a tree with many .mbedignore files is that of the
+    original matcher"""
+    root = tempfile.mkdtemp()
+    try:
+        make_tree(root, 60)
+        resources = scan(root)
+        linear = scan(root, LINEAR)
+        for field in ["inc_dirs", "headers", "c_sources", "cpp_sources",
+                      "ignored_dirs"]:
+            assert getattr(resources, field) == getattr(linear, field)
+        assert len(resources.c_sources) == 60
+        assert len(resources.cpp_sources) == 61
+    finally:
+        shutil.rmtree(root)
+
+
+def benchmark(sizes=(100, 500)):
+    print("%-10s %10s %10s" % ("ignores", "trie", "one regex"))
+    for size in sizes:
+        root = tempfile.mkdtemp()
+        try:
+            make_tree(root, size)
+            times = []
+            for toolchain_class in (None, LINEAR):
+                start = time()
+                scan(root, toolchain_class)
+                times.append(time() - start)
+            print("%-10d %10.3f %10.3f" % ((size,) + tuple(times)))
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    benchmark()
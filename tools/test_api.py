@@ -31,18 +31,25 @@ import datetime
 import threading
 import ctypes
 import functools
+import select
 from colorama import Fore, Back, Style
 from prettytable import PrettyTable
-from copy import copy, deepcopy
+from copy import copy
 
 from time import sleep, time
 try:
     from Queue import Queue, Empty
 except ImportError:
     from queue import Queue, Empty
+try:
+    import selectors
+except ImportError:
+    selectors = None
 from os.path import join, exists, basename, relpath
 from threading import Thread, Lock
+import multiprocessing
 from multiprocessing import Pool, cpu_count
+from multiprocessing.pool import ThreadPool
 from subprocess import Popen, PIPE
 
 # Imports related to mbed build api
@@ -71,12 +78,16 @@ from tools.libraries import LIBRARIES, LIBRARY_MAP
 from tools.options import extract_profile
 from tools.toolchains import TOOLCHAIN_PATHS
 from tools.toolchains import TOOLCHAINS
+from tools.toolchains import feature_scans, add_feature_scans
+from tools.toolchains.job_server import JobServer, current_job_server
 from tools.test_exporters import ReportExporter, ResultExporterType
 from tools.utils import argparse_filestring_type
 from tools.utils import argparse_uppercase_type
 from tools.utils import argparse_lowercase_type
 from tools.utils import argparse_many
-from tools.notifier.mock import MockNotifier
+from tools.notifier.term import TerminalNotifier
+from tools.notifier.forward import ForwardNotifier, set_notification_queue
+from tools.build_scheduler import merge_properties
 
 import tools.host_tests.host_tests_plugins as host_tests_plugins
 
@@ -88,6 +99,11 @@ except:
 
 
 class ProcessObserver(Thread):
+    """ Reads the output of a process in a thread, putting every chunk of the
+        output on a queue, as text, as soon as it is read
+    """
+    CHUNK_SIZE = 4096
+
     def __init__(self, proc):
         Thread.__init__(self)
         self.proc = proc
@@ -97,9 +113,26 @@ class ProcessObserver(Thread):
         self.start()
 
     def run(self):
+        fd = self.proc.stdout.fileno()
+        # Wait for output for a while at a time, so that stop() is noticed
+        if os.name == 'nt':
+            # Pipes may not be selected on Windows
+            ready = lambda: True
+        elif selectors:
+            selector = selectors.DefaultSelector()
+            selector.register(fd, selectors.EVENT_READ)
+            ready = lambda: selector.select(timeout=0.1)
+        else:
+            ready = lambda: select.select([fd], [], [], 0.1)[0]
         while self.active:
-            c = self.proc.stdout.read(1)
-            self.queue.put(c)
+            if not ready():
+                continue
+            data = os.read(fd, self.CHUNK_SIZE)
+            if not data:
+                break
+            if not isinstance(data, str):
+                data = data.decode('latin-1')
+            self.queue.put(data)
 
     def stop(self):
         self.active = False
@@ -109,6 +142,157 @@ class ProcessObserver(Thread):
             pass
 
 
+RE_LINE_END = re.compile(r"[\r\n]")
+RE_NON_ASCII = re.compile(r"[^\x00-\x7f]")
+RE_AUTO_TIMEOUT = re.compile(r"HOST: Property 'timeout' = '([\w\d _]+)'")
+
+
+def read_host_test_output(obs, duration, verbose=False):
+    """ Read the output of a host test from a ProcessObserver until the test
+        ends, the MUT asserts or the test times out after twice *duration*
+
+    Output is read a chunk at a time and checked a line at a time, as each
+    line ends. Returns a tuple of the output as a list of strings, the
+    duration of the test case from the reset of the MUT and the duration of
+    the test, which the host test may change.
+    """
+    def get_chunk_from_queue(obs):
+        """ Get a chunk of output from queue safe way
+        """
+        try:
+            return obs.queue.get(block=True, timeout=0.5)
+        except Empty:
+            return None
+
+    update_once_flag = {}   # Stores flags checking if some auto-parameter was already set
+    line = ''
+    rest = ''
+    output = []
+    start_time = time()
+    finished = False
+    while not finished and (time() - start_time) < (2 * duration):
+        chunk = get_chunk_from_queue(obs)
+        if not chunk:
+            continue
+        if verbose:
+            sys.stdout.write(chunk)
+        # Filter out non ASCII characters from serial port
+        chunk = RE_NON_ASCII.sub(' ', chunk)
+        position = 0
+        for line_end in RE_LINE_END.finditer(chunk):
+            line += chunk[position:line_end.start()]
+            output.append(chunk[position:line_end.end()])
+            position = line_end.end()
+
+            # Checking for auto-detection information from the test about MUT reset moment
+            if 'reset_target' not in update_once_flag and "HOST: Reset target..." in line:
+                # We will update this marker only once to prevent multiple time resets
+                update_once_flag['reset_target'] = True
+                start_time = time()
+
+            # Checking for auto-detection information from the test about timeout
+            if 'timeout' not in update_once_flag:
+                auto_timeout = RE_AUTO_TIMEOUT.search(line)
+                if auto_timeout is not None:
+                    # We will update this marker only once to prevent multiple time resets
+                    update_once_flag['timeout'] = True
+                    duration = int(auto_timeout.group(1))
+
+            # Detect mbed assert:
+            if 'mbed assertation failed: ' in line:
+                output.append('{{mbed_assert}}')
+                finished = True
+                break
+
+            # Check for test end
+            if '{end}' in line:
+                finished = True
+                break
+            line = ''
+        else:
+            line += chunk[position:]
+            output.append(chunk[position:])
+            continue
+        rest = chunk[position:]
+    end_time = time()
+    testcase_duration = end_time - start_time   # Test case duration from reset to {end}
+
+    # Keep the output that follows the end of the test in the same chunk, or
+    # else the next chunk
+    if not rest:
+        rest = get_chunk_from_queue(obs)
+        if rest:
+            if verbose:
+                sys.stdout.write(rest)
+            rest = RE_NON_ASCII.sub(' ', rest)
+    if rest:
+        output.append(rest)
+    return output, testcase_duration, duration
+
+
+class MutPool(object):
+    """ Leases the MUTs of a MUTs file to tests, so that tests run at once on
+        all the MUTs of the same MCU, with one test at a time per MUT
+    """
+    def __init__(self, muts):
+        self.muts = muts
+        self.free = set(muts)
+        # MUTs that failed to flash, and are not leased again
+        self.quarantined = set()
+        self.condition = threading.Condition()
+
+    @staticmethod
+    def matches(mut, mcu, peripherals=None):
+        """ Checks if a MUT is of the MCU and has the peripherals
+        """
+        if mut['mcu'] != mcu:
+            return False
+        if peripherals:
+            return set(peripherals).issubset(set(mut.get('peripherals', [])))
+        return True
+
+    def count(self, mcu, peripherals=None):
+        """ Number of MUTs of the MCU that have the peripherals
+        """
+        return len([mut_id for mut_id, mut in self.muts.items()
+                    if mut_id not in self.quarantined and
+                    self.matches(mut, mcu, peripherals)])
+
+    def lease(self, mcu, peripherals=None, exclude=()):
+        """ Waits for a free MUT of the MCU with the peripherals, and not one of
+            the MUT ids in *exclude*, and leases it. Returns its id and the MUT,
+            or None if no such MUT exists, or all of them are quarantined.
+        """
+        with self.condition:
+            while True:
+                candidates = set(mut_id for mut_id, mut in self.muts.items()
+                                 if mut_id not in exclude and
+                                 mut_id not in self.quarantined and
+                                 self.matches(mut, mcu, peripherals))
+                if not candidates:
+                    return None
+                if candidates & self.free:
+                    break
+                self.condition.wait()
+            mut_id = sorted(candidates & self.free)[0]
+            self.free.remove(mut_id)
+        return mut_id, self.muts[mut_id]
+
+    def release(self, mut_id):
+        """ Returns a leased MUT to the pool
+        """
+        with self.condition:
+            self.free.add(mut_id)
+            self.condition.notify_all()
+
+    def quarantine(self, mut_id):
+        """ Takes a leased MUT out of the pool, for good
+        """
+        with self.condition:
+            self.quarantined.add(mut_id)
+            self.condition.notify_all()
+
+
 class SingleTestExecutor(threading.Thread):
     """ Example: Single test class in separate thread usage
     """
@@ -154,6 +338,10 @@ class SingleTestRunner(object):
     TEST_RESULT_BUILD_FAILED = "BUILD_FAILED"
     TEST_RESULT_NOT_SUPPORTED = "NOT_SUPPORTED"
 
+    # Results of a MUT that failed to flash, after which a test is retried on
+    # another MUT of the MUT pool
+    MUT_RETRY_RESULTS = [TEST_RESULT_IOERR_COPY, TEST_RESULT_IOERR_DISK]
+
     GLOBAL_LOOPS_COUNT = 1  # How many times each test should be repeated
     TEST_LOOPS_LIST = []    # We redefine no.of loops per test_id
     TEST_LOOPS_DICT = {}    # TEST_LOOPS_LIST in dict format: { test_id : test_loop_count}
@@ -215,7 +403,8 @@ class SingleTestRunner(object):
                  _opts_consolidate_waterfall_test=None,
                  _opts_extend_test_timeout=None,
                  _opts_auto_detect=None,
-                 _opts_include_non_automated=False):
+                 _opts_include_non_automated=False,
+                 _opts_mut_pool=False):
         """ Let's try hard to init this object
         """
         from colorama import init
@@ -275,6 +464,12 @@ class SingleTestRunner(object):
         self.opts = _opts
         self.opts_auto_detect = _opts_auto_detect
         self.opts_include_non_automated = _opts_include_non_automated
+        # Auto detection looks the MUT of a test up again by its MCU, which
+        # would run the pooled tests of an MCU on the same MUT
+        self.opts_mut_pool = _opts_mut_pool and not _opts_auto_detect
+
+        # Tests are run on any free MUT of their MCU when the MUT pool is used
+        self.mut_pool = MutPool(self.muts) if self.opts_mut_pool else None
 
         self.build_report = _opts_build_report
         self.build_properties = _opts_build_properties
@@ -285,6 +480,8 @@ class SingleTestRunner(object):
         # Database related initializations
         self.db_logger = factory_db_logger(self.opts_db_url)
         self.db_logger_build_id = None # Build ID (database index of build_id table)
+        # The tests of the MUT pool run at once, and share the one connection
+        self.db_lock = threading.Lock()
         # Let's connect to database to set up credentials and confirm database is ready
         if self.db_logger:
             self.db_logger.connect_url(self.opts_db_url) # Save db access info inside db_logger object
@@ -416,26 +613,28 @@ class SingleTestRunner(object):
                 random.shuffle(test_map_keys, self.shuffle_random_func)
                 # Update database with shuffle seed f applicable
                 if self.db_logger:
+                    with self.db_lock:
+                        self.db_logger.reconnect();
+                        if self.db_logger.is_connected():
+                            self.db_logger.update_build_id_info(
+                                self.db_logger_build_id,
+                                _shuffle_seed=self.shuffle_random_func())
+                            self.db_logger.disconnect();
+
+            if self.db_logger:
+                with self.db_lock:
                     self.db_logger.reconnect();
                     if self.db_logger.is_connected():
+                        # Update MUTs and Test Specification in database
+                        self.db_logger.update_build_id_info(
+                            self.db_logger_build_id,
+                            _muts=self.muts, _test_spec=self.test_spec)
+                        # Update Extra information in database (some options passed to test suite)
                         self.db_logger.update_build_id_info(
                             self.db_logger_build_id,
-                            _shuffle_seed=self.shuffle_random_func())
+                            _extra=json.dumps(self.dump_options()))
                         self.db_logger.disconnect();
 
-            if self.db_logger:
-                self.db_logger.reconnect();
-                if self.db_logger.is_connected():
-                    # Update MUTs and Test Specification in database
-                    self.db_logger.update_build_id_info(
-                        self.db_logger_build_id,
-                        _muts=self.muts, _test_spec=self.test_spec)
-                    # Update Extra information in database (some options passed to test suite)
-                    self.db_logger.update_build_id_info(
-                        self.db_logger_build_id,
-                        _extra=json.dumps(self.dump_options()))
-                    self.db_logger.disconnect();
-
             valid_test_map_keys = self.get_valid_tests(test_map_keys, target, toolchain, test_ids, self.opts_include_non_automated)
             skipped_test_map_keys = self.get_skipped_tests(test_map_keys, valid_test_map_keys)
 
@@ -477,6 +676,13 @@ class SingleTestRunner(object):
                     continue
 
 
+            # Tests are run on the MUTs of the MUT pool while the next tests
+            # are built, with as many tests at once as there are MUTs
+            mut_threads = None
+            pending_tests = []
+            if self.mut_pool and not self.opts_only_build_tests:
+                mut_threads = ThreadPool(max(1, self.mut_pool.count(target)))
+
             for test_id in valid_test_map_keys:
                 test = TEST_MAP[test_id]
 
@@ -577,40 +783,59 @@ class SingleTestRunner(object):
                 test_suite_properties['test.path.%s.%s.%s'% (target, toolchain, test_id)] = path
 
                 # read MUTs, test specification and perform tests
+                if mut_threads:
+                    # The test runs once a MUT is free, while the next
+                    # tests are built
+                    pending_tests.append((test_id, mut_threads.apply_async(
+                        self.handle_pooled, (test_spec, target, toolchain),
+                        {'test_loops': test_loops})))
+                    continue
+
                 handle_results = self.handle(test_spec, target, toolchain, test_loops=test_loops)
+                self.add_handle_results(target, toolchain, test_id, handle_results)
 
-                if handle_results is None:
-                    continue
+            if mut_threads:
+                mut_threads.close()
+                for test_id, pending_test in pending_tests:
+                    self.add_handle_results(target, toolchain, test_id,
+                                            pending_test.get())
+                mut_threads.join()
 
-                for handle_result in handle_results:
-                    if handle_result:
-                        single_test_result, detailed_test_results = handle_result
-                    else:
-                        continue
+            test_suite_properties['skipped'] = ', '.join(test_suite_properties['skipped'])
+            self.test_suite_properties_ext[target][toolchain] = test_suite_properties
 
-                    # Append test results to global test summary
-                    if single_test_result is not None:
-                        self.test_summary.append(single_test_result)
+        q.put(target + '_'.join(toolchains))
+        return
 
-                    # Add detailed test result to test summary structure
-                    if target not in self.test_summary_ext[target][toolchain]:
-                        if test_id not in self.test_summary_ext[target][toolchain]:
-                            self.test_summary_ext[target][toolchain][test_id] = []
+    def add_handle_results(self, target, toolchain, test_id, handle_results):
+        """ Adds the results of handle() for a test to the test summaries
+        """
+        if handle_results is None:
+            return
 
-                        append_test_result = detailed_test_results
+        for handle_result in handle_results:
+            if handle_result:
+                single_test_result, detailed_test_results = handle_result
+            else:
+                continue
 
-                        # If waterfall and consolidate-waterfall options are enabled,
-                        # only include the last test result in the report.
-                        if self.opts_waterfall_test and self.opts_consolidate_waterfall_test:
-                            append_test_result = {0: detailed_test_results[len(detailed_test_results) - 1]}
+            # Append test results to global test summary
+            if single_test_result is not None:
+                self.test_summary.append(single_test_result)
 
-                        self.test_summary_ext[target][toolchain][test_id].append(append_test_result)
+            # Add detailed test result to test summary structure
+            if target not in self.test_summary_ext[target][toolchain]:
+                if test_id not in self.test_summary_ext[target][toolchain]:
+                    self.test_summary_ext[target][toolchain][test_id] = []
 
-            test_suite_properties['skipped'] = ', '.join(test_suite_properties['skipped'])
-            self.test_suite_properties_ext[target][toolchain] = test_suite_properties
+                append_test_result = detailed_test_results
 
-        q.put(target + '_'.join(toolchains))
-        return
+                # If waterfall and consolidate-waterfall options are enabled,
+                # only include the last test result in the report.
+                if self.opts_waterfall_test and self.opts_consolidate_waterfall_test:
+                    append_test_result = {0: detailed_test_results[len(detailed_test_results) - 1]}
+
+                self.test_summary_ext[target][toolchain][test_id].append(append_test_result)
 
     def execute(self):
         clean = self.test_spec.get('clean', False)
@@ -652,10 +877,11 @@ class SingleTestRunner(object):
                 q.get()
 
         if self.db_logger:
-            self.db_logger.reconnect();
-            if self.db_logger.is_connected():
-                self.db_logger.update_build_id_info(self.db_logger_build_id, _status_fk=self.db_logger.BUILD_ID_STATUS_COMPLETED)
-                self.db_logger.disconnect();
+            with self.db_lock:
+                self.db_logger.reconnect();
+                if self.db_logger.is_connected():
+                    self.db_logger.update_build_id_info(self.db_logger_build_id, _status_fk=self.db_logger.BUILD_ID_STATUS_COMPLETED)
+                    self.db_logger.disconnect();
 
         return self.test_summary, self.shuffle_random_seed, self.test_summary_ext, self.test_suite_properties_ext, self.build_report, self.build_properties
 
@@ -880,9 +1106,6 @@ class SingleTestRunner(object):
         mcu = mut['mcu']
         copy_method = mut.get('copy_method')        # Available board configuration selection e.g. core selection etc.
 
-        if self.db_logger:
-            self.db_logger.reconnect()
-
         selected_copy_method = self.opts_copy_method if copy_method is None else copy_method
 
         # Tests can be looped so test results must be stored for the same test
@@ -980,27 +1203,29 @@ class SingleTestRunner(object):
                 single_test_result, target_name_unique, toolchain_name, test_id,
                 test_description, elapsed_time, single_timeout))
 
-            # Update database entries for ongoing test
-            if self.db_logger and self.db_logger.is_connected():
-                test_type = 'SingleTest'
-                self.db_logger.insert_test_entry(self.db_logger_build_id,
-                                                 target_name,
-                                                 toolchain_name,
-                                                 test_type,
-                                                 test_id,
-                                                 single_test_result,
-                                                 single_test_output,
-                                                 elapsed_time,
-                                                 single_timeout,
-                                                 test_index)
+            # Update database entries for ongoing test. The connection is
+            # only held while writing, as the tests of the MUT pool share it
+            if self.db_logger:
+                with self.db_lock:
+                    self.db_logger.reconnect()
+                    if self.db_logger.is_connected():
+                        test_type = 'SingleTest'
+                        self.db_logger.insert_test_entry(self.db_logger_build_id,
+                                                         target_name,
+                                                         toolchain_name,
+                                                         test_type,
+                                                         test_id,
+                                                         single_test_result,
+                                                         single_test_output,
+                                                         elapsed_time,
+                                                         single_timeout,
+                                                         test_index)
+                        self.db_logger.disconnect()
 
             # If we perform waterfall test we test until we get OK and we stop testing
             if self.opts_waterfall_test and single_test_result == self.TEST_RESULT_OK:
                 break
 
-        if self.db_logger:
-            self.db_logger.disconnect()
-
         return (self.shape_global_test_loop_result(test_all_result, self.opts_waterfall_test and self.opts_consolidate_waterfall_test),
                 target_name_unique,
                 toolchain_name,
@@ -1027,6 +1252,38 @@ class SingleTestRunner(object):
 
         return handle_results
 
+    def handle_pooled(self, test_spec, target_name, toolchain_name, test_loops=1):
+        """ Runs a test on a MUT leased from the MUT pool, retrying it on
+            another MUT of the pool if the MUT fails to flash
+        """
+        data = json.loads(test_spec)
+        peripherals = TEST_MAP[data['test_id']].peripherals
+        tried = []
+        handle_result = None
+        while True:
+            lease = self.mut_pool.lease(data['mcu'], peripherals, exclude=tried)
+            if lease is None:
+                break
+            mut_id, mut = lease
+            handle_result = None
+            try:
+                handle_result = self.handle_mut(mut, data, target_name, toolchain_name, test_loops=test_loops)
+            finally:
+                if handle_result and handle_result[0][0] in self.MUT_RETRY_RESULTS:
+                    # Later tests would fail to flash the MUT as well
+                    self.mut_pool.quarantine(mut_id)
+                else:
+                    self.mut_pool.release(mut_id)
+            tried.append(mut_id)
+            if not handle_result or handle_result[0][0] not in self.MUT_RETRY_RESULTS:
+                break
+            print(self.logger.log_line(
+                self.logger.LogType.NOTIF,
+                'Test %s failed with %s on MUT %s, quarantining the MUT and retrying on another MUT'
+                % (data['test_id'], handle_result[0][0], mut_id)))
+
+        return [handle_result] if tried else []
+
     def print_test_result(self, test_result, target_name, toolchain_name,
                           test_id, test_description, elapsed_time, duration):
         """ Use specific convention to print test result and related data
@@ -1069,22 +1326,6 @@ class SingleTestRunner(object):
             printed by test runner and host test during test execution
         """
 
-        def get_char_from_queue(obs):
-            """ Get character from queue safe way
-            """
-            try:
-                c = obs.queue.get(block=True, timeout=0.5)
-            except Empty:
-                c = None
-            return c
-
-        def filter_queue_char(c):
-            """ Filters out non ASCII characters from serial port
-            """
-            if ord(c) not in range(128):
-                c = ' '
-            return c
-
         def get_test_result(output):
             """ Parse test 'output' data
             """
@@ -1096,17 +1337,6 @@ class SingleTestRunner(object):
                     break
             return result
 
-        def get_auto_property_value(property_name, line):
-            """ Scans auto detection line from MUT and returns scanned parameter 'property_name'
-                Returns string
-            """
-            result = None
-            if re.search("HOST: Property '%s'"% property_name, line) is not None:
-                property = re.search("HOST: Property '%s' = '([\w\d _]+)'"% property_name, line)
-                if property is not None and len(property.groups()) == 1:
-                    result = property.groups()[0]
-            return result
-
         cmd = ["python",
                '%s.py'% name,
                '-d', disk,
@@ -1134,54 +1364,8 @@ class SingleTestRunner(object):
 
         proc = Popen(cmd, stdout=PIPE, cwd=HOST_TESTS)
         obs = ProcessObserver(proc)
-        update_once_flag = {}   # Stores flags checking if some auto-parameter was already set
-        line = ''
-        output = []
-        start_time = time()
-        while (time() - start_time) < (2 * duration):
-            c = get_char_from_queue(obs)
-            if c:
-                if verbose:
-                    sys.stdout.write(c)
-                c = filter_queue_char(c)
-                output.append(c)
-                # Give the mbed under test a way to communicate the end of the test
-                if c in ['\n', '\r']:
-
-                    # Checking for auto-detection information from the test about MUT reset moment
-                    if 'reset_target' not in update_once_flag and "HOST: Reset target..." in line:
-                        # We will update this marker only once to prevent multiple time resets
-                        update_once_flag['reset_target'] = True
-                        start_time = time()
-
-                    # Checking for auto-detection information from the test about timeout
-                    auto_timeout_val = get_auto_property_value('timeout', line)
-                    if 'timeout' not in update_once_flag and auto_timeout_val is not None:
-                        # We will update this marker only once to prevent multiple time resets
-                        update_once_flag['timeout'] = True
-                        duration = int(auto_timeout_val)
-
-                    # Detect mbed assert:
-                    if 'mbed assertation failed: ' in line:
-                        output.append('{{mbed_assert}}')
-                        break
-
-                    # Check for test end
-                    if '{end}' in line:
-                        break
-                    line = ''
-                else:
-                    line += c
-        end_time = time()
-        testcase_duration = end_time - start_time   # Test case duration from reset to {end}
-
-        c = get_char_from_queue(obs)
-
-        if c:
-            if verbose:
-                sys.stdout.write(c)
-            c = filter_queue_char(c)
-            output.append(c)
+        output, testcase_duration, duration = read_host_test_output(
+            obs, duration, verbose)
 
         if verbose:
             print("Test::Output::Finish")
@@ -1926,6 +2110,12 @@ def get_default_test_options_parser():
                         action="store_true",
                         help='Experimental, you execute test runners for connected to your host MUTs in parallel (speeds up test result collection)')
 
+    parser.add_argument('--mut-pool',
+                        dest='mut_pool',
+                        default=False,
+                        action="store_true",
+                        help='Run every test once, on any free MUT of its MCU, running tests on all MUTs of the same MCU at once and retrying a test on another MUT when flashing fails. Not used with --auto')
+
     parser.add_argument('--config',
                         dest='verbose_test_configuration_only',
                         default=False,
@@ -2075,65 +2265,100 @@ def find_tests(base_dir, target_name, toolchain_name, app_config=None):
 
     # Temporary structure: tests referenced by (name, base, group, case) tuple
     tests = {}
-    # List of common folders: (predicate function, path) tuple
-    commons = []
+    # COMMON folders as (discovery order, path) tuples, indexed by the
+    # (base, group) of the tests that they apply to, or by the base alone
+    # for the COMMON folders that apply to all groups
+    group_commons = {}
+    base_commons = {}
+    common_count = 0
 
     # Prepare the toolchain
     toolchain = prepare_toolchain([base_dir], None, target_name, toolchain_name,
                                   app_config=app_config)
 
-    # Scan the directory for paths to probe for 'TESTS' folders
-    base_resources = scan_resources([base_dir], toolchain)
-
-    dirs = base_resources.inc_dirs
-    for directory in dirs:
-        subdirs = os.listdir(directory)
-
-        # If the directory contains a subdirectory called 'TESTS', scan it for test cases
-        if 'TESTS' in subdirs:
-            walk_base_dir = join(directory, 'TESTS')
-            test_resources = toolchain.scan_resources(walk_base_dir, base_path=base_dir)
-
-            # Loop through all subdirectories
-            for d in test_resources.inc_dirs:
-
-                # If the test case folder is not called 'host_tests' or 'COMMON' and it is
-                # located two folders down from the main 'TESTS' folder (ex. TESTS/testgroup/testcase)
-                # then add it to the tests
-                relative_path = relpath(d, walk_base_dir)
-                relative_path_parts = os.path.normpath(relative_path).split(os.sep)
-                if len(relative_path_parts) == 2:
-                    test_group_directory_path, test_case_directory = os.path.split(d)
-                    test_group_directory = os.path.basename(test_group_directory_path)
-
-                    # Check to make sure discoverd folder is not in a host test directory or common directory
-                    special_dirs = ['host_tests', 'COMMON']
-                    if test_group_directory not in special_dirs and test_case_directory not in special_dirs:
-                        test_name = test_path_to_name(d, base_dir)
-                        tests[(test_name, walk_base_dir, test_group_directory, test_case_directory)] = [d]
-
-                # Also find any COMMON paths, we'll add these later once we find all the base tests
-                if 'COMMON' in relative_path_parts:
-                    if relative_path_parts[0] != 'COMMON':
-                        def predicate(base_pred, group_pred, name_base_group_case):
-                            (name, base, group, case) = name_base_group_case
-                            return base == base_pred and group == group_pred
-                        commons.append((functools.partial(predicate, walk_base_dir, relative_path_parts[0]), d))
-                    else:
-                        def predicate(base_pred, name_base_group_case):
-                            (name, base, group, case) = name_base_group_case
-                            return base == base_pred
-                        commons.append((functools.partial(predicate, walk_base_dir), d))
+    # Scan the directory for paths to probe for 'TESTS' folders. The scan
+    # does not enter 'TESTS' folders, but records them with the other
+    # directories that it skips
+    base_resources = scan_resources([base_dir], toolchain,
+                                    collect_ignores=True)
+
+    tests_dirs = [d for d in base_resources.ignored_dirs
+                  if basename(d) == 'TESTS' and os.path.isdir(d)]
+    for walk_base_dir in tests_dirs:
+        # Scan the 'TESTS' folder for test cases
+        test_resources = toolchain.scan_resources(walk_base_dir, base_path=base_dir)
+
+        # Loop through all subdirectories
+        for d in test_resources.inc_dirs:
+
+            # If the test case folder is not called 'host_tests' or 'COMMON' and it is
+            # located two folders down from the main 'TESTS' folder (ex. TESTS/testgroup/testcase)
+            # then add it to the tests
+            relative_path = relpath(d, walk_base_dir)
+            relative_path_parts = os.path.normpath(relative_path).split(os.sep)
+            if len(relative_path_parts) == 2:
+                test_group_directory_path, test_case_directory = os.path.split(d)
+                test_group_directory = os.path.basename(test_group_directory_path)
+
+                # Check to make sure discoverd folder is not in a host test directory or common directory
+                special_dirs = ['host_tests', 'COMMON']
+                if test_group_directory not in special_dirs and test_case_directory not in special_dirs:
+                    test_name = test_path_to_name(d, base_dir)
+                    tests[(test_name, walk_base_dir, test_group_directory, test_case_directory)] = [d]
+
+            # Also find any COMMON paths, we'll add these later once we find all the base tests
+            if 'COMMON' in relative_path_parts:
+                if relative_path_parts[0] != 'COMMON':
+                    key = (walk_base_dir, relative_path_parts[0])
+                    group_commons.setdefault(key, []).append((common_count, d))
+                else:
+                    base_commons.setdefault(walk_base_dir, []).append((common_count, d))
+                common_count += 1
 
-    # Apply common directories
-    for pred, path in commons:
-        for test_identity, test_paths in six.iteritems(tests):
-            if pred(test_identity):
-                test_paths.append(path)
+    # Apply common directories, in the order that they were found
+    for (name, base, group, case), test_paths in six.iteritems(tests):
+        commons = group_commons.get((base, group), []) + base_commons.get(base, [])
+        test_paths.extend(path for _, path in sorted(commons))
 
     # Drop identity besides name
     return {name: paths for (name, _, _, _), paths in six.iteritems(tests)}
 
+def _find_tests_worker(args):
+    """Task runner for find_all_tests"""
+    base_dir, target_name, toolchain_name, app_config = args
+    return find_tests(base_dir, target_name, toolchain_name,
+                      app_config=app_config)
+
+def find_all_tests(base_dirs, targets_toolchains, app_config=None, jobs=1):
+    """ Finds all tests in many directories, for many targets and toolchains
+    base_dirs: paths to the directories to scan for tests
+    targets_toolchains: a list of (target name, toolchain name) tuples
+    app_config - location of a chosen mbed_app.json file
+    jobs - the number of processes to find tests with
+
+    returns a dictionary where keys are (target name, toolchain name) tuples
+    and the values are the tests of all base_dirs for that target and
+    toolchain, as returned by find_tests.
+    """
+    calls = [(base_dir, target_name, toolchain_name, app_config)
+             for target_name, toolchain_name in targets_toolchains
+             for base_dir in base_dirs]
+    jobs = jobs or cpu_count()
+    if jobs > 1 and len(calls) > 1:
+        p = Pool(processes=min(jobs, len(calls)))
+        try:
+            results = p.map(_find_tests_worker, calls)
+        finally:
+            p.terminate()
+            p.join()
+    else:
+        results = [_find_tests_worker(call) for call in calls]
+
+    all_tests = {}
+    for (_, target_name, toolchain_name, _), tests in zip(calls, results):
+        all_tests.setdefault((target_name, toolchain_name), {}).update(tests)
+    return all_tests
+
 def print_tests(tests, format="list", sort=True):
     """Given a dictionary of tests (as returned from "find_tests"), print them
     in the specified format"""
@@ -2162,23 +2387,26 @@ def norm_relative_path(path, start):
 
 def build_test_worker(*args, **kwargs):
     """This is a worker function for the parallel building of tests. The `args`
-    and `kwargs` are passed directly to `build_project`. It returns a dictionary
-    with the following structure:
+    and `kwargs` are passed directly to `build_project`, together with the job
+    server shared with this worker process, if any. The notifier in
+    kwargs['notify'] is a ForwardNotifier, which sends the notifications of
+    the build to the parent process as they happen, followed by a dictionary
+    with the following structure, which is also returned:
 
     {
         'result': `True` if no exceptions were thrown, `False` otherwise
         'reason': Instance of exception that was thrown on failure
         'bin_file': Path to the created binary if `build_project` was
                     successful. Not present otherwise
-        'kwargs': The keyword arguments that were passed to `build_project`.
-                  This includes arguments that were modified (ex. report)
+        'project_id': The project_id that was passed to `build_project`
+        'report': The report of this build alone, or None
+        'properties': The properties of this build alone, or None
     }
     """
     bin_file = None
     ret = {
         'result': False,
-        'args': args,
-        'kwargs': kwargs
+        'project_id': kwargs['project_id']
     }
 
     # Use parent TOOLCHAIN_PATHS variable
@@ -2187,11 +2415,13 @@ def build_test_worker(*args, **kwargs):
 
     del kwargs['toolchain_paths']
 
+    add_feature_scans(kwargs.pop('feature_scans', {}))
+
     try:
-        bin_file = build_project(*args, **kwargs)
+        bin_file = build_project(*args, job_server=current_job_server(),
+                                 **kwargs)
         ret['result'] = True
         ret['bin_file'] = bin_file
-        ret['kwargs'] = kwargs
 
     except NotSupportedException as e:
         ret['reason'] = e
@@ -2204,6 +2434,9 @@ def build_test_worker(*args, **kwargs):
         import traceback
         traceback.print_exc(file=sys.stdout)
 
+    ret['report'] = kwargs['report']
+    ret['properties'] = kwargs['properties']
+    kwargs['notify'].done(ret)
     return ret
 
 
@@ -2211,10 +2444,17 @@ def build_tests(tests, base_source_paths, build_path, target, toolchain_name,
                 clean=False, notify=None, jobs=1, macros=None,
                 silent=False, report=None, properties=None,
                 continue_on_build_fail=False, app_config=None,
-                build_profile=None, stats_depth=None, ignore=None):
+                build_profile=None, stats_depth=None, ignore=None,
+                job_server=None):
     """Given the data structure from 'find_tests' and the typical build parameters,
     build all the tests
 
+    The tests are built in a pool of worker processes that share a job server,
+    so that the compiles of all tests are scheduled together, with at most
+    *jobs* compilers running at once. Pass a job_server to share that limit
+    with other builds of the same run. The notifications of the builds reach
+    *notify* as they happen, and each build sends back its own report alone.
+
     Returns a tuple of the build result (True or False) followed by the test
     build data structure"""
 
@@ -2222,7 +2462,11 @@ def build_tests(tests, base_source_paths, build_path, target, toolchain_name,
     base_path = norm_relative_path(build_path, execution_directory)
 
     target_name = target.name if isinstance(target, Target) else target
-    cfg, _, _ = get_config(base_source_paths, target_name, toolchain_name, app_config=app_config)
+    # Getting the configuration scans the features that are enabled, which
+    # the test builds then reuse instead of scanning them again
+    cfg, _, _ = get_config(base_source_paths, target_name, toolchain_name,
+                           app_config=app_config, build_profile=build_profile)
+    shared_feature_scans = feature_scans()
 
     baud_rate = 9600
     if 'platform.stdio-baud-rate' in cfg:
@@ -2239,9 +2483,16 @@ def build_tests(tests, base_source_paths, build_path, target, toolchain_name,
 
     result = True
 
-    jobs_count = int(jobs if jobs else cpu_count())
-    p = Pool(processes=jobs_count)
-    results = []
+    if job_server is None:
+        job_server = JobServer(jobs)
+    # The workers send their notifications and results through this queue
+    events = multiprocessing.Queue()
+    p = job_server.pool(initializer=set_notification_queue, initargs=(events,))
+    # The output of every test build, for its build report
+    outputs = {}
+    # The results of the builds, which report failures to send a result
+    # through the queue, such as results that could not be pickled
+    async_results = {}
     for test_name, test_paths in tests.items():
         if not isinstance(test_paths, list):
             test_paths = [test_paths]
@@ -2253,98 +2504,114 @@ def build_tests(tests, base_source_paths, build_path, target, toolchain_name,
 
         args = (src_paths, test_build_path, target, toolchain_name)
         kwargs = {
-            'jobs': 1,
+            'jobs': job_server.jobs,
             'clean': clean,
             'macros': macros,
             'name': test_case_folder_name,
             'project_id': test_name,
-            'report': report,
-            'properties': properties,
+            'report': {} if report is not None else None,
+            'properties': {} if properties is not None else None,
             'app_config': app_config,
             'build_profile': build_profile,
             'toolchain_paths': TOOLCHAIN_PATHS,
             'stats_depth': stats_depth,
-            'notify': MockNotifier()
+            'notify': ForwardNotifier(test_name),
+            'feature_scans': shared_feature_scans
         }
 
-        results.append(p.apply_async(build_test_worker, args, kwargs))
+        outputs[test_name] = TerminalNotifier(getattr(notify, 'verbose', False),
+                                              silent=True)
+        async_results[test_name] = p.apply_async(build_test_worker, args,
+                                                 kwargs)
 
     p.close()
     result = True
-    itr = 0
-    while len(results):
-        itr += 1
-        if itr > 360000:
-            p.terminate()
-            p.join()
-            raise ToolException("Compile did not finish in 10 minutes")
-        else:
-            sleep(0.01)
-            pending = 0
-            for r in results:
-                if r.ready() is True:
-                    try:
-                        worker_result = r.get()
-                        results.remove(r)
-
-                        # Push all deferred notifications out to the actual notifier
-                        new_notify = deepcopy(notify)
-                        for message in worker_result['kwargs']['notify'].messages:
-                            new_notify.notify(message)
-
-                        # Take report from the kwargs and merge it into existing report
-                        if report:
-                            report_entry = worker_result['kwargs']['report'][target_name][toolchain_name]
-                            report_entry[worker_result['kwargs']['project_id'].upper()][0][0]['output'] = new_notify.get_output()
-                            for test_key in report_entry.keys():
-                                report[target_name][toolchain_name][test_key] = report_entry[test_key]
-
-                        # Set the overall result to a failure if a build failure occurred
-                        if ('reason' in worker_result and
-                            not worker_result['reason'] and
-                            not isinstance(worker_result['reason'], NotSupportedException)):
-                            result = False
-                            break
-
-
-                        # Adding binary path to test build result
-                        if ('result' in worker_result and
-                            worker_result['result'] and
-                            'bin_file' in worker_result):
-                            bin_file = norm_relative_path(worker_result['bin_file'], execution_directory)
-
-                            test_build['tests'][worker_result['kwargs']['project_id']] = {
-                                "binaries": [
-                                    {
-                                        "path": bin_file
-                                    }
-                                ]
-                            }
-
-                            test_key = worker_result['kwargs']['project_id'].upper()
-                            print('Image: %s\n' % bin_file)
+    try:
+        last_event = time()
+        while outputs:
+            try:
+                key, event, worker_result = events.get(timeout=1)
+            except Empty:
+                for key in list(outputs):
+                    if (async_results[key].ready() and
+                            not async_results[key].successful()):
+                        outputs.pop(key)
+                        try:
+                            async_results[key].get()
+                        except Exception as exc:
+                            if notify:
+                                notify.tool_error("Build of %s failed: %s"
+                                                  % (key, exc))
+                        result = False
+                if not result and not continue_on_build_fail:
+                    break
+                if time() - last_event > 600:
+                    raise ToolException("Compile did not finish in 10 minutes")
+                continue
+            last_event = time()
+            if key not in outputs:
+                # The build already failed to send its result
+                continue
 
-                    except:
-                        if p._taskqueue.queue:
-                            p._taskqueue.queue.clear()
-                            sleep(0.5)
-                        p.terminate()
-                        p.join()
-                        raise
-                else:
-                    pending += 1
-                    if pending >= jobs_count:
-                        break
+            if event is not None:
+                # Show the notification as it happens; the notifiers may
+                # change the event, so each of them gets its own copy
+                if notify:
+                    notify.notify(dict(event))
+                outputs[key].notify(event)
+                continue
 
-            # Break as soon as possible if there is a failure and we are not
+            output = outputs.pop(key)
+
+            # Merge the report of this build into the existing report
+            if report is not None and worker_result['report']:
+                report_entry = worker_result['report'][target_name][toolchain_name]
+                report_entry[key.upper()][0][0]['output'] = output.get_output()
+                for test_key in report_entry.keys():
+                    prep_report(report, target_name, toolchain_name, test_key)
+                    report[target_name][toolchain_name][test_key] = report_entry[test_key]
+            if properties is not None and worker_result['properties']:
+                merge_properties(properties, worker_result['properties'])
+
+            # Set the overall result to a failure if a build failure occurred
+            if ('reason' in worker_result and
+                not worker_result['reason'] and
+                not isinstance(worker_result['reason'], NotSupportedException)):
+                result = False
+
+            # Adding binary path to test build result
+            if ('result' in worker_result and
+                worker_result['result'] and
+                'bin_file' in worker_result):
+                bin_file = norm_relative_path(worker_result['bin_file'], execution_directory)
+
+                test_build['tests'][key] = {
+                    "binaries": [
+                        {
+                            "path": bin_file
+                        }
+                    ]
+                }
+
+                print('Image: %s\n' % bin_file)
+
+            # Stop as soon as possible if there is a failure and we are not
             # continuing on build failures
             if not result and not continue_on_build_fail:
-                if p._taskqueue.queue:
-                    p._taskqueue.queue.clear()
-                    sleep(0.5)
-                p.terminate()
                 break
-
+    except:
+        if p._taskqueue.queue:
+            p._taskqueue.queue.clear()
+            sleep(0.5)
+        p.terminate()
+        p.join()
+        raise
+
+    if outputs:
+        if p._taskqueue.queue:
+            p._taskqueue.queue.clear()
+            sleep(0.5)
+        p.terminate()
     p.join()
 
     test_builds = {}
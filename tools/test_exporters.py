@@ -18,6 +18,7 @@ Author: Przemyslaw Wirkus <Przemyslaw.wirkus@arm.com>
 """
 
 from tools.utils import construct_enum, mkdir
+from tools.build_timing import format_timing
 from prettytable import PrettyTable
 import os
 
@@ -278,6 +279,8 @@ class ReportExporter():
                             classname = '%s.%s.%s.%s'% (self.package, target, toolchain, test_result['id'])
                             elapsed_sec = test_result['elapsed_time']
                             _stdout = test_result['output']
+                            if 'timing' in test_result:
+                                _stdout += "\n" + format_timing(test_result['timing'])
 
                             if 'target_name_unique' in test_result:
                                 _stderr = test_result['target_name_unique']
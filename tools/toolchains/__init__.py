@@ -18,33 +18,81 @@ from __future__ import print_function, division, absolute_import
 
 import re
 import sys
-from os import stat, walk, getcwd, sep, remove
+import atexit
+from os import stat, walk, getcwd, sep, remove, listdir, getpid
 from copy import copy
-from time import time, sleep
-from shutil import copyfile
+from time import time
 from os.path import (join, splitext, exists, relpath, dirname, basename, split,
                      abspath, isfile, isdir, normcase)
-from itertools import chain
+from itertools import chain, islice
 from inspect import getmro
 from copy import deepcopy
 from abc import ABCMeta, abstractmethod
 from distutils.spawn import find_executable
-from multiprocessing import Pool, cpu_count
+from multiprocessing import Pool, cpu_count, TimeoutError
+from multiprocessing.pool import ThreadPool
+from functools import partial
 from hashlib import md5
-import fnmatch
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
 
 from ..utils import (run_cmd, mkdir, rel_path, ToolException,
-                    NotSupportedException, split_path, compile_worker)
-from ..settings import MBED_ORG_USER, PRINT_COMPILER_OUTPUT_AS_LINK
+                    NotSupportedException, split_path, compile_worker,
+                    replace_file)
+from ..settings import (MBED_ORG_USER, PRINT_COMPILER_OUTPUT_AS_LINK,
+                        COMPILE_TIMEOUT, BUILD_TIMEOUT, OBJECT_CACHE_DIR,
+                        OBJECT_CACHE_SIZE)
 from .. import hooks
 from ..notifier.term import TerminalNotifier
 from ..memap import MemapParser
+from ..build_timing import BuildTimer
+from .scan_cache import ScanCache, DirRecord, DependencyCache
+from .object_cache import ObjectCache, cached_compile_worker
+from .mbedignore import IgnoreTrie
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
 
 
 #Disables multiprocessing if set to higher number than the host machine CPUs
 CPU_COUNT_MIN = 1
 CPU_COEF = 1
 
+# The number of threads that read directories ahead of a resource scan
+SCAN_THREADS = 8
+_SCAN_POOL = (None, None)
+
+def _scan_pool():
+    """Get the thread pool of the resource scans of this process"""
+    global _SCAN_POOL
+    pid, pool = _SCAN_POOL
+    if pid != getpid():
+        # The threads of a pool do not survive a fork
+        pool = ThreadPool(SCAN_THREADS)
+        _SCAN_POOL = (getpid(), pool)
+    return pool
+
+@atexit.register
+def _close_scan_pool():
+    pid, pool = _SCAN_POOL
+    if pid == getpid():
+        pool.terminate()
+
+def remove_options(command, options):
+    """Remove the first occurrence of the sequence of options from a
+    command, or return None when the command does not contain it"""
+    for index in range(len(command) - len(options) + 1):
+        if command[index:index + len(options)] == options:
+            return command[:index] + command[index + len(options):]
+    return None
+
 class LazyDict(dict):
     def __init__(self):
         self.eager = {}
@@ -80,6 +128,10 @@ class LazyDict(dict):
     def __len__(self):
         return len(self.eager) + len(self.lazy)
 
+    def __reduce__(self):
+        # Copy and pickle the thunks instead of evaluating them
+        return (LazyDict, (), {'eager': self.eager, 'lazy': self.lazy})
+
     def __str__(self):
         return "Lazy{%s}" % (
             ", ".join("%r: %r" % (k, v) for k, v in
@@ -117,6 +169,70 @@ class LazyDict(dict):
         self.lazy = new_lazy
         self.eager = {}
 
+# The FEATURE_ scans of this process, as (Resources, ignore patterns) tuples
+# indexed by the scan key of the feature. See FeatureScan.
+_FEATURE_SCANS = {}
+
+def feature_scans():
+    """Get the FEATURE_ scans of this process, to share them with another
+    process"""
+    return dict(_FEATURE_SCANS)
+
+def add_feature_scans(scans):
+    """Reuse the FEATURE_ scans of another process, as returned by
+    feature_scans()"""
+    _FEATURE_SCANS.update(scans)
+
+
+class FeatureScan(object):
+    """A scan of a FEATURE_ directory, to be performed when the feature is
+    first used
+
+    A FeatureScan is the thunk of a feature in Resources.features. Unlike a
+    closure, it can be pickled, and the result of the scan is shared by all
+    of the scans of the same feature in this process, and by any process it
+    is passed to with feature_scans() and add_feature_scans(). A pickled
+    FeatureScan loses its toolchain, which is then set again by the
+    toolchain that uses it.
+    """
+    __slots__ = ['toolchain', 'path', 'base_path', 'collect_ignores']
+
+    def __init__(self, toolchain, path, base_path, collect_ignores):
+        self.toolchain = toolchain
+        self.path = path
+        self.base_path = base_path
+        self.collect_ignores = collect_ignores
+
+    def __getstate__(self):
+        return (self.path, self.base_path, self.collect_ignores)
+
+    def __setstate__(self, state):
+        self.toolchain = None
+        self.path, self.base_path, self.collect_ignores = state
+
+    def __call__(self):
+        toolchain = self.toolchain
+        key = toolchain._feature_scan_key(self.path, self.base_path,
+                                          self.collect_ignores)
+        if key in _FEATURE_SCANS:
+            stored, ignores = _FEATURE_SCANS[key]
+            # The scan also added the ignore patterns of the feature
+            for real_base, patterns in ignores:
+                toolchain._add_normcased_patterns(real_base, patterns)
+            resources = deepcopy(stored)
+        else:
+            first_ignore = len(toolchain._ignore_log)
+            resources = toolchain.scan_resources(
+                self.path, base_path=self.base_path,
+                collect_ignores=self.collect_ignores)
+            _FEATURE_SCANS[key] = (deepcopy(resources),
+                                   toolchain._ignore_log[first_ignore:])
+        for thunk in resources.features.lazy.values():
+            if isinstance(thunk, FeatureScan) and thunk.toolchain is None:
+                thunk.toolchain = toolchain
+        return resources
+
+
 class Resources:
     def __init__(self, base_path=None, collect_ignores=False):
         self.base_path = base_path
@@ -389,6 +505,19 @@ class mbedToolchain:
 
     PROFILE_FILE_NAME = ".profile"
 
+    SCAN_CACHE_FILE_NAME = ".scan_cache"
+
+    # The option that makes the compiler write the preprocessed source to
+    # stdout instead of compiling it. None when the object cache can not be
+    # used with the toolchain
+    PREPROCESS_OPTION = None
+
+    # Directories modified less than this many seconds before a scan started
+    # are always rescanned, as their mtime may not reflect later changes
+    SCAN_CACHE_MTIME_GUARD = 2
+
+    DEP_CACHE_FILE_NAME = ".dep_cache"
+
     __metaclass__ = ABCMeta
 
     profile_template = {'common':[], 'c':[], 'cxx':[], 'asm':[], 'ld':[]}
@@ -436,12 +565,38 @@ class mbedToolchain:
         self.build_dir = build_dir
         self.timestamp = time()
 
+        # The hash of the include paths, which names their response file
+        self.inc_md5 = None
+
         # Number of concurrent build jobs. 0 means auto (based on host system cores)
         self.jobs = 0
 
+        # Time limits, in seconds, for compiling one file and for a whole
+        # compile_sources call. None means no limit
+        self.compile_timeout = COMPILE_TIMEOUT
+        self.build_timeout = BUILD_TIMEOUT
+
+        # A JobServer shared with other builds, limiting the compiles that
+        # run at once across all of them. None means this build compiles on
+        # its own
+        self.job_server = None
+
+        # An ObjectCache shared with other builds, or None for no caching
+        self.object_cache = (ObjectCache(OBJECT_CACHE_DIR, OBJECT_CACHE_SIZE)
+                             if OBJECT_CACHE_DIR else None)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # The time taken by the phases of this build
+        self.timer = BuildTimer()
+
         # Ignore patterns from .mbedignore files
         self.ignore_patterns = []
-        self._ignore_regex = re.compile("$^")
+        self._ignore_trie = IgnoreTrie()
+        # The (directory, patterns) tuples added to the ignore trie, in order
+        self._ignore_log = []
+        # Changes whenever ignore patterns are added. See add_ignore_patterns()
+        self._ignore_key = ""
 
         # Pre-mbed 2.0 ignore dirs
         self.legacy_ignore_dirs = (LEGACY_IGNORE_DIRS | TOOLCHAINS) - set([target.name, LEGACY_TOOLCHAIN_NAMES[self.name]])
@@ -468,6 +623,14 @@ class mbedToolchain:
         # header files during dependency change. See need_update()
         self.stat_cache = {}
 
+        # Index of previous resource scans, stored in the build directory.
+        # See _add_dir()
+        self.scan_cache = None
+
+        # Index of parsed dependency files, stored in the build directory.
+        # See get_dependencies()
+        self.dep_cache = None
+
         # Used by the mbed Online Build System to build in chrooted environment
         self.CHROOT = None
 
@@ -559,28 +722,35 @@ class mbedToolchain:
         if self.build_all:
             return True
 
-        if not exists(target):
+        try:
+            target_mod_time = stat(target).st_mtime
+        except OSError:
             return True
 
-        target_mod_time = stat(target).st_mtime
-
+        counters = self.timer.counters
         for d in dependencies:
-            # Some objects are not provided with full path and here we do not have
-            # information about the library paths. Safe option: assume an update
-            if not d or not exists(d):
-                return True
-
-            if d not in self.stat_cache:
-                self.stat_cache[d] = stat(d).st_mtime
-
-            if self.stat_cache[d] >= target_mod_time:
+            try:
+                mod_time = self.stat_cache[d]
+                counters['stat_cache_hits'] += 1
+            except KeyError:
+                # Some objects are not provided with full path and here we do not have
+                # information about the library paths. Safe option: assume an update
+                if not d:
+                    return True
+                counters['stat_cache_misses'] += 1
+                try:
+                    mod_time = self.stat_cache[d] = stat(d).st_mtime
+                except OSError:
+                    return True
+
+            if mod_time >= target_mod_time:
                 return True
 
         return False
 
     def is_ignored(self, file_path):
         """Check if file path is ignored by any .mbedignore thus far"""
-        return self._ignore_regex.match(normcase(file_path))
+        return self._ignore_trie.match(normcase(file_path))
 
     def add_ignore_patterns(self, root, base_path, patterns):
         """Add a series of patterns to the ignored paths
@@ -592,11 +762,19 @@ class mbedToolchain:
         """
         real_base = relpath(root, base_path)
         if real_base == ".":
-            self.ignore_patterns.extend(normcase(p) for p in patterns)
+            new_patterns = [normcase(p) for p in patterns]
         else:
-            self.ignore_patterns.extend(normcase(join(real_base, pat)) for pat in patterns)
-        if self.ignore_patterns:
-            self._ignore_regex = re.compile("|".join(fnmatch.translate(p) for p in self.ignore_patterns))
+            new_patterns = [normcase(join(real_base, pat)) for pat in patterns]
+        self._add_normcased_patterns(normcase(real_base), new_patterns)
+
+    def _add_normcased_patterns(self, real_base, new_patterns):
+        """Add patterns that are already prefixed with their directory"""
+        self.ignore_patterns.extend(new_patterns)
+        if new_patterns:
+            self._ignore_key = md5("\n".join([self._ignore_key] + new_patterns)
+                                   .encode('utf-8')).hexdigest()
+            self._ignore_trie.add(real_base, new_patterns)
+            self._ignore_log.append((real_base, new_patterns))
 
     # Create a Resources object from the path pointed to by *path* by either traversing a
     # a directory structure, when *path* is a directory, or adding *path* to the resources,
@@ -616,96 +794,295 @@ class mbedToolchain:
                 base_path = path
         resources.base_path = base_path
 
-        if isfile(path):
-            self._add_file(path, resources, base_path, exclude_paths=exclude_paths)
-        else:
-            self._add_dir(path, resources, base_path, exclude_paths=exclude_paths)
+        with self.timer.phase("scan"):
+            if isfile(path):
+                self._add_file(path, resources, base_path, exclude_paths=exclude_paths)
+            else:
+                self._add_dir(path, resources, base_path, exclude_paths=exclude_paths)
         return resources
 
     # A helper function for scan_resources. _add_dir traverses *path* (assumed to be a
     # directory) and heeds the ".mbedignore" files along the way. _add_dir calls _add_file
     # on every file it considers adding to the resources object.
     def _add_dir(self, path, resources, base_path, exclude_paths=None):
-        """ os.walk(top[, topdown=True[, onerror=None[, followlinks=False]]])
-        When topdown is True, the caller can modify the dirnames list in-place
-        (perhaps using del or slice assignment), and walk() will only recurse into
-        the subdirectories whose names remain in dirnames; this can be used to prune
-        the search, impose a specific order of visiting, or even to inform walk()
-        about directories the caller creates or renames before it resumes walk()
-        again. Modifying dirnames when topdown is False is ineffective, because in
-        bottom-up mode the directories in dirnames are generated before dirpath
-        itself is generated.
+        """Traverse *path* in the same order as a top-down os.walk.
+
+        When there is a build directory, the result of the traversal is kept
+        in a scan cache within it. A later scan with the same parameters only
+        lists the directories that changed, replaying the resources of all of
+        the others from the cache. A directory is considered changed when its
+        mtime, its .mbedignore file or the ignore patterns in effect when
+        entering it differ from the previous scan.
+        """
+        cache = self.get_scan_cache()
+        key = old_record = None
+        if cache is not None:
+            key = self._scan_key(path, base_path, exclude_paths,
+                                 resources.collect_ignores)
+            old_record = cache.get(key)
+        self._scan_start = time()
+        record = self._scan_dir(path, old_record, resources, base_path,
+                                exclude_paths, self.get_labels())
+        if cache is not None:
+            cache.put(key, record)
+            cache.save()
+
+    def get_scan_cache(self):
+        """Get the scan cache of the build directory, loading it on first use
+
+        Returns None when there is no build directory.
         """
+        if self.scan_cache is None and self.build_dir:
+            self.scan_cache = ScanCache(
+                join(self.build_dir, self.SCAN_CACHE_FILE_NAME))
+            if not self.build_all:
+                self.scan_cache.load()
+        return self.scan_cache
+
+    def _scan_key(self, path, base_path, exclude_paths, collect_ignores):
+        """Identify all of the parameters that influence a scan, apart from
+        the contents of the scanned tree and the ignore patterns"""
         labels = self.get_labels()
-        for root, dirs, files in walk(path, followlinks=True):
-            # Check if folder contains .mbedignore
-            if ".mbedignore" in files:
-                with open (join(root,".mbedignore"), "r") as f:
-                    lines=f.readlines()
-                    lines = [l.strip() for l in lines] # Strip whitespaces
-                    lines = [l for l in lines if l != ""] # Strip empty lines
-                    lines = [l for l in lines if not re.match("^#",l)] # Strip comment lines
-                    # Append root path to glob patterns and append patterns to ignore_patterns
-                    self.add_ignore_patterns(root, base_path, lines)
-
-            # Skip the whole folder if ignored, e.g. .mbedignore containing '*'
-            root_path =join(relpath(root, base_path))
-            if  (self.is_ignored(join(root_path,"")) or
-                 self.build_dir == root_path):
-                resources.ignore_dir(root_path)
-                dirs[:] = []
-                continue
+        return md5(repr((
+            self.name, path, base_path, sorted(exclude_paths or []),
+            collect_ignores, self.build_dir, self.LIBRARY_EXT,
+            self.LINKER_EXT, sorted(self.legacy_ignore_dirs),
+            sorted((k, sorted(v)) for k, v in labels.items())
+        )).encode('utf-8')).hexdigest()
+
+    def _feature_scan_key(self, path, base_path, collect_ignores):
+        """Identify everything that influences the scan of a FEATURE_
+        directory, including the ignore patterns that may apply within it"""
+        labels = self.get_labels()
+        real_base = normcase(relpath(path, base_path))
+        build_dir = self.build_dir
+        if build_dir and not (build_dir == real_base or
+                              build_dir.startswith(join(real_base, ""))):
+            # The build directory is only skipped when it is scanned
+            build_dir = None
+        return md5(repr((
+            self.name, path, base_path, collect_ignores, build_dir,
+            self.LIBRARY_EXT, self.LINKER_EXT, sorted(self.legacy_ignore_dirs),
+            sorted(labels['TARGET']), sorted(labels['TOOLCHAIN']),
+            self._ignore_trie.patterns_for(real_base)
+        )).encode('utf-8')).hexdigest()
 
-            for d in copy(dirs):
-                dir_path = join(root, d)
-                # Add internal repo folders/files. This is needed for exporters
-                if d == '.hg' or d == '.git':
-                    resources.repo_dirs.append(dir_path)
-
-                if ((d.startswith('.') or d in self.legacy_ignore_dirs) or
-                    # Ignore targets that do not match the TARGET in extra_labels list
-                    (d.startswith('TARGET_') and d[7:] not in labels['TARGET']) or
-                    # Ignore toolchain that do not match the current TOOLCHAIN
-                    (d.startswith('TOOLCHAIN_') and d[10:] not in labels['TOOLCHAIN']) or
-                    # Ignore .mbedignore files
-                    self.is_ignored(join(relpath(root, base_path), d,"")) or
-                    # Ignore TESTS dir
-                    (d == 'TESTS')):
-                        resources.ignore_dir(dir_path)
-                        dirs.remove(d)
-                elif d.startswith('FEATURE_'):
-                    # Recursively scan features but ignore them in the current scan.
-                    # These are dynamically added by the config system if the conditions are matched
-                    def closure (dir_path=dir_path, base_path=base_path):
-                        return self.scan_resources(dir_path, base_path=base_path,
-                                                   collect_ignores=resources.collect_ignores)
-                    resources.features.add_lazy(d[8:], closure)
+    @staticmethod
+    def _list_dir(path):
+        """Split the entries of a directory into directories and files the
+        way os.walk does"""
+        dirs, files = [], []
+        if scandir is None:
+            for name in listdir(path):
+                if isdir(join(path, name)):
+                    dirs.append(name)
+                else:
+                    files.append(name)
+            return dirs, files
+        # The entries of scandir know their type on most systems, which
+        # saves a stat of every entry
+        for entry in scandir(path):
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                dirs.append(entry.name)
+            else:
+                files.append(entry.name)
+        return dirs, files
+
+    def _read_dir(self, root, known_mtime):
+        """Get the mtime of the directory *root* and, unless the mtime is
+        *known_mtime*, its entries
+
+        Return value:
+        A tuple of the mtime, or None when the mtime is too recent to be
+        trusted, and the (dirs, files) entries of the directory, or None when
+        they were not listed
+        """
+        mtime = stat(root).st_mtime
+        if mtime >= self._scan_start - self.SCAN_CACHE_MTIME_GUARD:
+            mtime = None
+        if mtime is not None and mtime == known_mtime:
+            return mtime, None
+        return mtime, self._list_dir(root)
+
+    @staticmethod
+    def _read_mbedignore(root):
+        with open(join(root, ".mbedignore"), "r") as f:
+            lines = [l.strip() for l in f.readlines()] # Strip whitespaces
+        return [l for l in lines
+                if l != "" and not l.startswith("#")] # Strip empty and comment lines
+
+    def _scan_dir(self, root, record, resources, base_path, exclude_paths,
+                  labels, pending=None):
+        """Add the directory *root* and everything below it to *resources*
+
+        The subdirectories to traverse are read ahead by the threads of the
+        scan pool, while the directories are added to the resources in the
+        order of a top-down os.walk, so that the result does not depend on
+        the order in which the reads complete.
+
+        Positional arguments:
+        root - the directory to scan
+        record - the DirRecord of this directory from a previous scan, or None
+        resources - the Resources object to add to
+        base_path - the location that the scan started from
+        exclude_paths - paths that should not be traversed
+        labels - the labels of this toolchain
+
+        Keyword arguments:
+        pending - the result of _read_dir for this directory, when it is being
+                  read ahead
+
+        Return value:
+        The DirRecord of this scan of the directory, or None if the directory
+        could not be listed
+        """
+        try:
+            if pending is not None:
+                mtime, entries = pending.get()
+            else:
+                mtime, entries = self._read_dir(
+                    root, record.mtime if record is not None else None)
+        except OSError:
+            return None
+
+        previous = record
+        if (record is None or mtime is None or record.mtime != mtime or
+                record.ignore_key != self._ignore_key):
+            record = None
+        elif record.mbedignore is not None:
+            try:
+                mbedignore = self._read_mbedignore(root)
+            except IOError:
+                mbedignore = None
+            if mbedignore == record.mbedignore:
+                self.add_ignore_patterns(root, base_path, mbedignore)
+            else:
+                record = None
+
+        if record is not None:
+            self.timer.counters['scan_cache_hits'] += 1
+            subdirs = [d for d, _ in record.children]
+        else:
+            if self.scan_cache is not None:
+                self.timer.counters['scan_cache_misses'] += 1
+            try:
+                dirs, files = entries or self._list_dir(root)
+            except OSError:
+                return None
+            if self.scan_cache is not None:
+                self.scan_cache.dirty = True
+            record, subdirs = self._scan_dir_entries(
+                root, dirs, files, mtime, resources.collect_ignores, base_path,
+                exclude_paths, labels)
+
+        if (record.resources.linker_script is not None and
+                resources.linker_script is not None):
+            self.notify.info("Warning: Multiple linker scripts detected: %s -> %s"
+                             % (resources.linker_script,
+                                record.resources.linker_script))
+        resources.add(record.resources)
+        for feature, dir_path in record.features:
+            # Recursively scan features but ignore them in the current scan.
+            # These are dynamically added by the config system if the conditions are matched
+            resources.features.add_lazy(feature, FeatureScan(
+                self, dir_path, base_path, resources.collect_ignores))
+
+        old_children = dict(previous.children) if previous is not None else {}
+        children = [(d, join(root, d), old_children.get(d)) for d in subdirs]
+        pool = _scan_pool()
+        reads = [pool.apply_async(self._read_dir, (
+                     path, child.mtime if child is not None else None))
+                 for _, path, child in children]
+        record.children = [
+            (d, self._scan_dir(path, child, resources, base_path,
+                               exclude_paths, labels, pending=read))
+            for (d, path, child), read in zip(children, reads)]
+        return record
+
+    def _scan_dir_entries(self, root, dirs, files, mtime, collect_ignores,
+                          base_path, exclude_paths, labels):
+        """Create the DirRecord of the directory *root* from its entries
+
+        Return value:
+        A tuple of the DirRecord, with no children yet, and the names of the
+        subdirectories that should be traversed
+        """
+        ignore_key = self._ignore_key
+        mbedignore = None
+        # Check if folder contains .mbedignore
+        if ".mbedignore" in files:
+            mbedignore = self._read_mbedignore(root)
+            # Append root path to glob patterns and append patterns to ignore_patterns
+            self.add_ignore_patterns(root, base_path, mbedignore)
+
+        resources = Resources(base_path, collect_ignores=collect_ignores)
+        features = []
+        record = DirRecord(mtime, ignore_key, mbedignore, resources, features)
+
+        # Skip the whole folder if ignored, e.g. .mbedignore containing '*'
+        root_path = relpath(root, base_path)
+        if  (self.is_ignored(join(root_path,"")) or
+             self.build_dir == root_path):
+            resources.ignore_dir(root_path)
+            return record, []
+
+        for d in copy(dirs):
+            dir_path = join(root, d)
+            # Add internal repo folders/files. This is needed for exporters
+            if d == '.hg' or d == '.git':
+                resources.repo_dirs.append(dir_path)
+
+            if ((d.startswith('.') or d in self.legacy_ignore_dirs) or
+                # Ignore targets that do not match the TARGET in extra_labels list
+                (d.startswith('TARGET_') and d[7:] not in labels['TARGET']) or
+                # Ignore toolchain that do not match the current TOOLCHAIN
+                (d.startswith('TOOLCHAIN_') and d[10:] not in labels['TOOLCHAIN']) or
+                # Ignore .mbedignore files
+                self.is_ignored(join(root_path, d,"")) or
+                # Ignore TESTS dir
+                (d == 'TESTS')):
                     resources.ignore_dir(dir_path)
                     dirs.remove(d)
-                elif exclude_paths:
-                    for exclude_path in exclude_paths:
-                        rel_path = relpath(dir_path, exclude_path)
-                        if not (rel_path.startswith('..')):
-                            resources.ignore_dir(dir_path)
-                            dirs.remove(d)
-                            break
-
-            # Add root to include paths
-            root = root.rstrip("/")
-            resources.inc_dirs.append(root)
-            resources.file_basepath[root] = base_path
+            elif d.startswith('FEATURE_'):
+                features.append((d[8:], dir_path))
+                resources.ignore_dir(dir_path)
+                dirs.remove(d)
+            elif exclude_paths:
+                for exclude_path in exclude_paths:
+                    rel_path = relpath(dir_path, exclude_path)
+                    if not (rel_path.startswith('..')):
+                        resources.ignore_dir(dir_path)
+                        dirs.remove(d)
+                        break
 
-            for file in files:
-                file_path = join(root, file)
-                self._add_file(file_path, resources, base_path)
+        # Add root to include paths
+        root = root.rstrip("/")
+        resources.inc_dirs.append(root)
+        resources.file_basepath[root] = base_path
+
+        for file in files:
+            file_path = join(root, file)
+            self._add_file(file_path, resources, base_path,
+                           rel_path=(file if root_path == "."
+                                     else join(root_path, file)))
+
+        return record, dirs
 
     # A helper function for both scan_resources and _add_dir. _add_file adds one file
     # (*file_path*) to the resources object based on the file type.
-    def _add_file(self, file_path, resources, base_path, exclude_paths=None):
-
-        if  (self.is_ignored(relpath(file_path, base_path)) or
+    # *rel_path* is the path of the file relative to *base_path*, when the
+    # caller knows it already.
+    def _add_file(self, file_path, resources, base_path, exclude_paths=None,
+                  rel_path=None):
+        if rel_path is None:
+            rel_path = relpath(file_path, base_path)
+        if  (self.is_ignored(rel_path) or
              basename(file_path).startswith(".")):
-            resources.ignore_dir(relpath(file_path, base_path))
+            resources.ignore_dir(rel_path)
             return
 
         resources.file_basepath[file_path] = base_path
@@ -795,7 +1172,8 @@ class mbedToolchain:
             if (target != source) and (self.need_update(target, [source])):
                 self.progress("copy", relative_path)
                 mkdir(dirname(target))
-                copyfile(source, target)
+                # Builds of other targets and toolchains may be reading it
+                replace_file(source, target)
 
     # THIS METHOD IS BEING OVERRIDDEN BY THE MBED ONLINE BUILD SYSTEM
     # ANY CHANGE OF PARAMETERS OR RETURN VALUES WILL BREAK COMPATIBILITY
@@ -856,10 +1234,16 @@ class mbedToolchain:
     # THIS METHOD IS BEING CALLED BY THE MBED ONLINE BUILD SYSTEM
     # ANY CHANGE OF PARAMETERS OR RETURN VALUES WILL BREAK COMPATIBILITY
     def compile_sources(self, resources, inc_dirs=None):
+        with self.timer.phase("compile"):
+            return self._compile_sources(resources, inc_dirs)
+
+    def _compile_sources(self, resources, inc_dirs=None):
         # Web IDE progress bar for project build
         files_to_compile = resources.s_sources + resources.c_sources + resources.cpp_sources
         self.to_be_compiled = len(files_to_compile)
         self.compiled = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
 
         self.notify.cc_verbose("Macros: "+' '.join(['-D%s' % s for s in self.get_symbols()]))
 
@@ -877,7 +1261,6 @@ class mbedToolchain:
         self.inc_md5 = md5(' '.join(inc_paths).encode('utf-8')).hexdigest()
 
         objects = []
-        queue = []
         work_dir = getcwd()
         self.prev_dir = None
 
@@ -887,101 +1270,220 @@ class mbedToolchain:
 
         # Sort compile queue for consistency
         files_to_compile.sort()
-        for source in files_to_compile:
+        queue = self.compile_items(resources, files_to_compile, inc_paths,
+                                   work_dir, objects)
+
+        # Use queues/multiprocessing if cpu count is higher than setting.
+        # A job server decides itself how many compiles may run at once.
+        # The queue is streamed into the pool, so compiling starts while the
+        # remaining sources are still being checked; only as many items are
+        # collected as it takes to choose between the pool and compiling
+        # sequentially
+        jobs = self.jobs if self.jobs else cpu_count()
+        if self.job_server is not None or jobs > CPU_COUNT_MIN:
+            threshold = 0 if self.job_server is not None else jobs
+            first = list(islice(queue, threshold + 1))
+            if len(first) > threshold:
+                objects = self.compile_queue(chain(first, queue), objects)
+            else:
+                objects = self.compile_seq(first, objects)
+        else:
+            # The objects that are up to date are counted before any
+            # compile completes, so that the progress ends at 100%
+            objects = self.compile_seq(list(queue), objects)
+
+        if self.cache_hits or self.cache_misses:
+            self.notify.info("Object cache: %d hits, %d misses" %
+                             (self.cache_hits, self.cache_misses))
+            if self.cache_misses:
+                self.object_cache.trim()
+        return objects
+
+    def compile_items(self, resources, sources, inc_paths, work_dir,
+                      objects):
+        """Generate the items of the compile queue for the sources that need
+        to be compiled, adding the objects of the others to *objects*
+
+        Positional arguments:
+        resources - the Resources that the sources belong to
+        sources - the source files, in the order in which they are checked
+        inc_paths - the include paths of the compile commands
+        work_dir - the directory that the compile commands run in
+        objects - the list of objects to extend
+        """
+        for source in sources:
             object = self.relative_object_path(
                 self.build_dir, resources.file_basepath[source], source)
 
             # Queue mode (multiprocessing)
             commands = self.compile_command(source, object, inc_paths)
             if commands is not None:
-                queue.append({
+                item = {
                     'source': source,
                     'object': object,
                     'commands': commands,
                     'work_dir': work_dir,
-                    'chroot': self.CHROOT
-                })
+                    'chroot': self.CHROOT,
+                    'queued': time()
+                }
+                self.add_object_cache(item)
+                yield item
             else:
                 self.compiled += 1
                 objects.append(object)
 
-        # Use queues/multiprocessing if cpu count is higher than setting
-        jobs = self.jobs if self.jobs else cpu_count()
-        if jobs > CPU_COUNT_MIN and len(queue) > jobs:
-            return self.compile_queue(queue, objects)
-        else:
-            return self.compile_seq(queue, objects)
+        # The dependency files of the queued objects are forgotten, so this
+        # is all that changes in the dependency cache during the build
+        dep_cache = self.get_dep_cache()
+        if dep_cache is not None:
+            dep_cache.save()
+
+    def add_object_cache(self, item):
+        """Make an item of the compile queue use the object cache, when
+        there is one and the compile command is suitable for it"""
+        if (self.object_cache is None or self.CHROOT or
+                len(item['commands']) != 1):
+            return
+        _, ext = splitext(item['source'])
+        if ext.lower() not in ('.c', '.cpp'):
+            return
+        preprocess = self.preprocess_command(item['commands'][0],
+                                             item['object'])
+        if preprocess is None:
+            return
+        base, _ = splitext(item['object'])
+        dependencies = base + '.d'
+        item['cache'] = self.object_cache
+        item['preprocess'] = preprocess
+        item['dependencies'] = (dependencies if dependencies in
+                                item['commands'][0] else None)
+        # The response file and configuration header are in the build
+        # directory, so they are hashed by their contents
+        build_files = [self.config_file]
+        if self.inc_md5:
+            build_files.append(join(self.build_dir,
+                                    ".includes_%s.txt" % self.inc_md5))
+        item['files'] = [path for path in build_files
+                         if path and any(path in arg for arg in preprocess)]
+
+    def preprocess_command(self, command, object):
+        """Derive from a compile command the command that writes the
+        preprocessed source to stdout, or return None when that is not
+        possible
+
+        Positional arguments:
+        command - the command that compiles a source file into object
+        object - the object file written by the command
+        """
+        if self.PREPROCESS_OPTION is None:
+            return None
+        command = remove_options(command, ["-o", object])
+        if command is None:
+            return None
+        return ((remove_options(command, self.get_dep_option(object)) or
+                 command) + [self.PREPROCESS_OPTION])
 
     # Compile source files queue in sequential order
     def compile_seq(self, queue, objects):
+        deadline = time() + self.build_timeout if self.build_timeout else None
+        worker = (compile_worker if self.object_cache is None
+                  else cached_compile_worker)
         for item in queue:
-            result = compile_worker(item)
-
-            self.compiled += 1
-            self.progress("compile", item['source'], build_update=True)
-            for res in result['results']:
-                self.notify.cc_verbose("Compile: %s" % ' '.join(res['command']), result['source'])
-                self.compile_output([
-                    res['code'],
-                    res['output'],
-                    res['command']
-                ])
-            objects.append(result['object'])
+            if deadline is not None and time() > deadline:
+                raise ToolException("Compile did not finish in %s seconds"
+                                    % self.build_timeout)
+            self.compile_done(worker(item), objects)
         return objects
 
-    # Compile source files queue in parallel by creating pool of worker threads
+    # Compile source files queue in parallel by creating pool of workers
     def compile_queue(self, queue, objects):
-        jobs_count = int(self.jobs if self.jobs else cpu_count() * CPU_COEF)
-        p = Pool(processes=jobs_count)
-
-        results = []
-        for i in range(len(queue)):
-            results.append(p.apply_async(compile_worker, [queue[i]]))
-        p.close()
-
-        itr = 0
-        while len(results):
-            itr += 1
-            if itr > 180000:
-                p.terminate()
+        """Compile all items of the queue in a pool of worker processes
+
+        The queue may be any iterable; compiling starts with its first item,
+        while the rest of it is generated. Results are handled in the order
+        that the compiles complete. The compile_timeout limits the time
+        waited for the next compile to complete; as every worker only starts
+        a new compile when it has completed the previous one, every compile
+        still running when it expires has been running for at least that
+        long. The build_timeout limits the time for the whole queue. When a
+        compile fails or a time limit is exceeded, all outstanding compiles
+        are cancelled. No result is handled before the whole queue is
+        generated.
+
+        With a job_server, the compiles run in worker threads that each hold
+        a token of the job server while compiling, so that the compiles of
+        all builds sharing the job server are scheduled together. The time
+        spent waiting for a token counts towards the compile_timeout.
+        """
+        worker = (compile_worker if self.object_cache is None
+                  else cached_compile_worker)
+        if self.job_server is not None:
+            p = ThreadPool(processes=self.job_server.jobs)
+            worker = partial(self.job_server.run, worker)
+        else:
+            jobs_count = int(self.jobs if self.jobs else cpu_count() * CPU_COEF)
+            p = Pool(processes=jobs_count)
+        deadline = time() + self.build_timeout if self.build_timeout else None
+
+        try:
+            # The items are handed to the pool while they are generated
+            items = Queue()
+            results = p.imap_unordered(worker, iter(items.get, None))
+            p.close()
+            count = 0
+            try:
+                for item in queue:
+                    items.put(item)
+                    count += 1
+            finally:
+                items.put(None)
+            for _ in range(count):
+                timeout = limit = self.compile_timeout
+                if deadline is not None and (
+                        timeout is None or deadline - time() < timeout):
+                    timeout = max(deadline - time(), 0)
+                    limit = self.build_timeout
+                try:
+                    result = results.next(timeout)
+                except TimeoutError:
+                    raise ToolException("Compile did not finish in %s seconds"
+                                        % limit)
+                self.compile_done(result, objects)
+        finally:
+            # Workers are idle when all compiles completed; otherwise this
+            # cancels the outstanding compiles. Worker threads can not be
+            # interrupted, so they are left to finish their current compile
+            p.terminate()
+            if self.job_server is None:
                 p.join()
-                raise ToolException("Compile did not finish in 5 minutes")
-
-            sleep(0.01)
-            pending = 0
-            for r in results:
-                if r.ready():
-                    try:
-                        result = r.get()
-                        results.remove(r)
-
-                        self.compiled += 1
-                        self.progress("compile", result['source'], build_update=True)
-                        for res in result['results']:
-                            self.notify.cc_verbose("Compile: %s" % ' '.join(res['command']), result['source'])
-                            self.compile_output([
-                                res['code'],
-                                res['output'],
-                                res['command']
-                            ])
-                        objects.append(result['object'])
-                    except ToolException as err:
-                        if p._taskqueue.queue:
-                            p._taskqueue.queue.clear()
-                            sleep(0.5)
-                        p.terminate()
-                        p.join()
-                        raise ToolException(err)
-                else:
-                    pending += 1
-                    if pending >= jobs_count:
-                        break
-
-        results = None
-        p.join()
 
         return objects
 
+    def compile_done(self, result, objects):
+        """Report the outcome of one completed item of the compile queue and
+        add its object to *objects*"""
+        self.compiled += 1
+        if 'cached' in result:
+            if result['cached']:
+                self.cache_hits += 1
+                self.timer.counters['object_cache_hits'] += 1
+            else:
+                self.cache_misses += 1
+                self.timer.counters['object_cache_misses'] += 1
+        if 'start' in result:
+            self.timer.add_compile(result['source'], result['queued'],
+                                   result['start'], result['end'],
+                                   result['worker'])
+        self.progress("compile", result['source'], build_update=True)
+        for res in result['results']:
+            self.notify.cc_verbose("Compile: %s" % ' '.join(res['command']), result['source'])
+            self.compile_output([
+                res['code'],
+                res['output'],
+                res['command']
+            ])
+        objects.append(result['object'])
+
     # Determine the compile command based on type of source file
     def compile_command(self, source, object, includes):
         # Check dependencies
@@ -992,7 +1494,7 @@ class mbedToolchain:
             base, _ = splitext(object)
             dep_path = base + '.d'
             try:
-                deps = self.parse_dependencies(dep_path) if (exists(dep_path)) else []
+                deps = self.get_dependencies(dep_path)
             except (IOError, IndexError):
                 deps = []
             config_file = ([self.config.app_config_location]
@@ -1003,6 +1505,8 @@ class mbedToolchain:
             else:
                 deps.append(join(self.build_dir, self.PROFILE_FILE_NAME + "-c"))
             if len(deps) == 0 or self.need_update(object, deps):
+                if self.dep_cache is not None:
+                    self.dep_cache.remove(dep_path)
                 if ext == '.cpp' or self.COMPILE_C_AS_CPP:
                     return self.compile_cpp(source, object, includes)
                 else:
@@ -1017,6 +1521,49 @@ class mbedToolchain:
 
         return None
 
+    def get_dep_cache(self):
+        """Get the dependency cache of the build directory, loading it on
+        first use
+
+        Returns None when there is no build directory.
+        """
+        if self.dep_cache is None and self.build_dir:
+            self.dep_cache = DependencyCache(
+                join(self.build_dir, self.DEP_CACHE_FILE_NAME))
+            if not self.build_all:
+                self.dep_cache.load()
+        return self.dep_cache
+
+    def get_dependencies(self, dep_path):
+        """Get the dependencies listed in a dependency file
+
+        The file is only parsed when it differs from when it was last parsed,
+        or when its object was recompiled since, as the compiler then
+        rewrote it. Otherwise the dependencies come from the dependency cache.
+
+        Positional arguments:
+        dep_path -- the path to a file generated by a previous run of the compiler
+
+        Return value:
+        A list of all source files that the dependency file indicated were
+        dependencies, or an empty list when there is no such file
+        """
+        try:
+            info = stat(dep_path)
+        except OSError:
+            return []
+        stamp = (info.st_mtime, info.st_size)
+        cache = self.get_dep_cache()
+        entry = cache.get(dep_path) if cache is not None else None
+        if entry is None or entry[0] != stamp:
+            entry = (stamp, self.parse_dependencies(dep_path))
+            if cache is not None:
+                self.timer.counters['dep_cache_misses'] += 1
+                cache.put(dep_path, entry)
+        else:
+            self.timer.counters['dep_cache_hits'] += 1
+        return list(entry[1])
+
     def parse_dependencies(self, dep_path):
         """Parse the dependency information generated by the compiler.
 
@@ -1086,7 +1633,8 @@ class mbedToolchain:
         fout = join(dir, lib)
         if self.need_update(fout, objects):
             self.info("Library: %s" % lib)
-            self.archive(objects, fout)
+            with self.timer.phase("archive"):
+                self.archive(objects, fout)
             needed_update = True
 
         return needed_update
@@ -1123,15 +1671,19 @@ class mbedToolchain:
         if self.need_update(elf, dependencies):
             needed_update = True
             self.progress("link", name)
-            self.link(elf, r.objects, r.libraries, r.lib_dirs, r.linker_script)
+            with self.timer.phase("link"):
+                self.link(elf, r.objects, r.libraries, r.lib_dirs,
+                          r.linker_script)
 
         if bin and self.need_update(bin, [elf]):
             needed_update = True
             self.progress("elf2bin", name)
-            self.binary(r, elf, bin)
+            with self.timer.phase("elf2bin"):
+                self.binary(r, elf, bin)
 
         # Initialize memap and process map file. This doesn't generate output.
-        self.mem_stats(map)
+        with self.timer.phase("memap"):
+            self.mem_stats(map)
 
         self.notify.var("compile_succeded", True)
         self.notify.var("binary", filename)
@@ -0,0 +1,71 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import print_function, division, absolute_import
+
+from multiprocessing import BoundedSemaphore, Pool, cpu_count
+
+
+class JobServer(object):
+    """Limits the number of compiles running at once across many builds
+
+    Like the job server of make, a JobServer hands out a fixed number of
+    tokens, and a compile may only run while it holds one. A single JobServer
+    may be used for all of the builds of a run, including builds running in
+    the worker processes of the pool returned by pool(). The compiles of all
+    of those builds are then scheduled together, while never running more
+    than *jobs* compilers at once.
+    """
+    def __init__(self, jobs=0):
+        self.jobs = int(jobs if jobs else cpu_count())
+        self._tokens = BoundedSemaphore(self.jobs)
+
+    def __enter__(self):
+        self._tokens.acquire()
+        return self
+
+    def __exit__(self, *_):
+        self._tokens.release()
+
+    def run(self, function, *args):
+        """Call function with args while holding a token"""
+        with self:
+            return function(*args)
+
+    def pool(self, processes=None, initializer=None, initargs=()):
+        """Create a pool of worker processes that share this job server
+
+        Within the workers, the job server is returned by
+        current_job_server(). Like the initializer of a Pool, *initializer*
+        is called with *initargs* as each worker starts, which lets workers
+        inherit objects that cannot be pickled, such as queues.
+        """
+        return Pool(processes=processes or self.jobs,
+                    initializer=_set_job_server,
+                    initargs=(self, initializer, initargs))
+
+
+_JOB_SERVER = None
+
+def _set_job_server(job_server, initializer=None, initargs=()):
+    global _JOB_SERVER
+    _JOB_SERVER = job_server
+    if initializer:
+        initializer(*initargs)
+
+def current_job_server():
+    """Get the job server shared with this worker process, if any"""
+    return _JOB_SERVER
@@ -0,0 +1,98 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import print_function, division, absolute_import
+
+import re
+import fnmatch
+from os import sep
+
+
+class _IgnoreNode(object):
+    """The ignore patterns of one directory, and the nodes of the
+    directories below it that have ignore patterns"""
+    __slots__ = ['children', 'patterns', 'regex']
+
+    def __init__(self):
+        self.children = {}
+        self.patterns = []
+        self.regex = None
+
+
+class IgnoreTrie(object):
+    """The patterns of the .mbedignore files found by a scan, organised as a
+    tree of the directories that hold them
+
+    The patterns of a .mbedignore file are prefixed with the path of its
+    directory, so they can only match the paths below that directory. A path
+    is therefore only matched against the patterns of the directories along
+    that path, and the patterns of each directory are compiled once, when
+    they are added.
+    """
+    def __init__(self):
+        self.root = _IgnoreNode()
+
+    def add(self, directory, patterns):
+        """Add the ignore patterns of a directory
+
+        Positional arguments:
+        directory - the path of the directory, relative to the start of the
+                    scan, or "." for the start of the scan itself
+        patterns - the patterns, already prefixed with directory
+        """
+        node = self.root
+        if directory != ".":
+            for component in directory.split(sep):
+                node = node.children.setdefault(component, _IgnoreNode())
+        node.patterns.extend(patterns)
+        node.regex = re.compile("|".join(fnmatch.translate(p)
+                                         for p in node.patterns))
+
+    def match(self, path):
+        """Check whether any pattern of a directory along path matches it"""
+        node = self.root
+        for component in path.split(sep):
+            if node.regex is not None and node.regex.match(path):
+                return True
+            node = node.children.get(component)
+            if node is None:
+                return False
+        return node.regex is not None and node.regex.match(path) is not None
+
+    def patterns_for(self, directory):
+        """Get all patterns that may match the paths within a directory: the
+        patterns of the directories at or above it, and those of the
+        directories below it
+
+        Positional arguments:
+        directory - the path of the directory, relative to the start of the
+                    scan, or "." for the start of the scan itself
+        """
+        patterns = []
+        node = self.root
+        if directory != ".":
+            for component in directory.split(sep):
+                patterns.extend(node.patterns)
+                node = node.children.get(component)
+                if node is None:
+                    return patterns
+        below = [node]
+        while below:
+            node = below.pop()
+            patterns.extend(node.patterns)
+            below.extend(node.children[name]
+                         for name in sorted(node.children, reverse=True))
+        return patterns
@@ -0,0 +1,262 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import print_function, division, absolute_import
+
+from os import stat, remove, rename, utime, walk, fdopen
+from os.path import join, exists, dirname
+from hashlib import sha1
+from distutils.spawn import find_executable
+from tempfile import mkstemp
+from time import time
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from ..utils import run_cmd, mkdir, compile_worker, worker_id
+
+
+class ObjectCache(object):
+    """A directory of compiled objects that may be shared between builds
+
+    Like ccache in its preprocessor mode, an object is looked up by a hash of
+    the preprocessed source, the command line that compiles it and the
+    compiler executable, so the object is reused whenever the compiler would
+    see exactly the same input. The entries that were used least recently
+    are removed when the directory grows larger than max_size bytes.
+    """
+    VERSION = 3
+
+    # Macros that differ between builds of the same sources, and that are
+    # already part of the preprocessed source wherever they are used
+    VOLATILE_DEFINES = ("-DMBED_BUILD_TIMESTAMP=",)
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+
+    @staticmethod
+    def compiler_id(executable):
+        """Identify a compiler by its location, size and modification time"""
+        path = find_executable(executable) or executable
+        try:
+            info = stat(path)
+        except OSError:
+            return path
+        return "%s:%d:%d" % (path, info.st_size, int(info.st_mtime))
+
+    @staticmethod
+    def file_digest(path):
+        """Hash the contents of a file, or its path when it cannot be read"""
+        try:
+            with open(path, "rb") as input_file:
+                return sha1(input_file.read()).hexdigest()
+        except (IOError, OSError):
+            return path
+
+    def key(self, preprocess, preprocessed, files=()):
+        """Hash everything that determines the compiled object
+
+        The key does not depend on the build directory or on the time of the
+        build, so that objects are shared between builds: the -D options are
+        sorted, VOLATILE_DEFINES are left out, and the files in *files* are
+        hashed by their contents instead of their paths, in both the command
+        and the preprocessed source.
+
+        Positional arguments:
+        preprocess - the command that produced the preprocessed source; this
+                     is the compile command without its output files
+        preprocessed - the preprocessed source
+
+        Keyword arguments:
+        files - the files named in the command, such as response files and
+                the configuration header, that are in the build directory
+        """
+        digests = [(path, self.file_digest(path)) for path in files]
+        command = []
+        defines = []
+        for arg in preprocess:
+            for path, file_digest in digests:
+                arg = arg.replace(path, file_digest)
+            if arg.startswith("-D") and len(arg) > 2:
+                if not arg.startswith(self.VOLATILE_DEFINES):
+                    defines.append(arg)
+            else:
+                command.append(arg)
+        for path, file_digest in digests:
+            preprocessed = preprocessed.replace(path.encode("utf-8"),
+                                                file_digest.encode("utf-8"))
+
+        digest = sha1()
+        digest.update(("%d\n%s\n" % (self.VERSION,
+                                     self.compiler_id(preprocess[0])))
+                      .encode("utf-8"))
+        digest.update("\0".join(command + sorted(defines)).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(preprocessed)
+        return digest.hexdigest()
+
+    def build_paths(self, job):
+        """The (path, placeholder) pairs of the paths of the build directory
+        that the dependency file of a job names: those of its 'files', by
+        their contents as in key, and that of its object. The placeholders
+        stand for the paths in the cache, as the paths of the build that
+        stored an entry are not those of the builds that use it.
+        """
+        paths = [(path, "@%s@" % self.file_digest(path))
+                 for path in job.get('files', ())]
+        paths.append((job['object'], "@object@"))
+        return [(path.encode("utf-8"), placeholder.encode("utf-8"))
+                for path, placeholder in paths]
+
+    def entry_path(self, key):
+        return join(self.directory, key[:2], key[2:])
+
+    def load(self, key):
+        """Get the (object, dependencies, output) tuple stored for key and
+        mark it as recently used, or None when there is no such entry"""
+        path = self.entry_path(key)
+        try:
+            with open(path, "rb") as entry_file:
+                version, entry = pickle.load(entry_file)
+            utime(path, None)
+        except Exception:
+            return None
+        return entry if version == self.VERSION else None
+
+    def store(self, key, entry):
+        """Store an (object, dependencies, output) tuple for key
+
+        The entry is written to a temporary file that is then renamed, so
+        that concurrent builds never see a partial entry.
+        """
+        path = self.entry_path(key)
+        try:
+            mkdir(dirname(path))
+            handle, temp_path = mkstemp(dir=dirname(path))
+            with fdopen(handle, "wb") as entry_file:
+                pickle.dump((self.VERSION, entry), entry_file, protocol=2)
+            try:
+                rename(temp_path, path)
+            except OSError:
+                # Another build stored the same entry in the meantime
+                remove(temp_path)
+        except (IOError, OSError):
+            pass
+
+    def trim(self):
+        """Remove the least recently used entries while the cache is larger
+        than max_size, leaving some room for new entries"""
+        entries = []
+        total = 0
+        for root, _, files in walk(self.directory):
+            for name in files:
+                path = join(root, name)
+                try:
+                    info = stat(path)
+                except OSError:
+                    continue
+                entries.append((info.st_mtime, info.st_size, path))
+                total += info.st_size
+        if total <= self.max_size:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size * 0.9:
+                break
+            try:
+                remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def compile(self, job):
+        """Compile one item of a compile queue, using the cache
+
+        The job is an item of the compile queue, as taken by compile_worker,
+        with the additional keys 'preprocess', the command that writes the
+        preprocessed source to stdout, 'dependencies', the dependency file
+        written by the compile command or None, and optionally 'files', the
+        files of the build directory named in the command, as taken by key.
+        The result is that of compile_worker with the additional key
+        'cached', which tells whether the object was taken from the cache.
+        """
+        start = time()
+        command = job['commands'][0]
+        object_path = join(job['work_dir'], job['object'])
+        dep_path = (join(job['work_dir'], job['dependencies'])
+                    if job['dependencies'] else None)
+        preprocessed, _, code = run_cmd(job['preprocess'],
+                                        work_dir=job['work_dir'])
+        if code != 0:
+            # Let the compiler report the problem
+            result = compile_worker(job)
+            result['cached'] = False
+            return result
+
+        key = self.key(job['preprocess'], preprocessed,
+                       job.get('files', ()))
+        build_paths = self.build_paths(job)
+        entry = self.load(key)
+        if entry is not None:
+            obj, dependencies, output = entry
+            mkdir(dirname(object_path))
+            with open(object_path, "wb") as object_file:
+                object_file.write(obj)
+            if dep_path and dependencies is not None:
+                for path, placeholder in build_paths:
+                    dependencies = dependencies.replace(placeholder, path)
+                with open(dep_path, "wb") as dep_file:
+                    dep_file.write(dependencies)
+            return {
+                'source': job['source'],
+                'object': job['object'],
+                'commands': job['commands'],
+                'results': [{'code': 0, 'output': output, 'command': command}],
+                'cached': True,
+                'queued': job.get('queued'),
+                'start': start,
+                'end': time(),
+                'worker': worker_id()
+            }
+
+        result = compile_worker(job)
+        result['cached'] = False
+        if all(res['code'] == 0 for res in result['results']):
+            try:
+                with open(object_path, "rb") as object_file:
+                    obj = object_file.read()
+                dependencies = None
+                if dep_path and exists(dep_path):
+                    with open(dep_path, "rb") as dep_file:
+                        dependencies = dep_file.read()
+                    for path, placeholder in build_paths:
+                        dependencies = dependencies.replace(path, placeholder)
+            except (IOError, OSError):
+                return result
+            self.store(key, (obj, dependencies,
+                             result['results'][0]['output']))
+        return result
+
+
+def cached_compile_worker(job):
+    """Task runner for compiling through the object cache of the job, if it
+    has one"""
+    if 'cache' in job:
+        return job['cache'].compile(job)
+    return compile_worker(job)
@@ -0,0 +1,120 @@
+"""
+mbed SDK
+Copyright (c) 2018 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import print_function, division, absolute_import
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+
+class DirRecord(object):
+    """The result of scanning a single directory
+
+    Attributes:
+    mtime - the mtime of the directory when it was scanned, or None when the
+            mtime was too recent to be trusted
+    ignore_key - identifies the ignore patterns in effect when the directory
+                 was entered
+    mbedignore - the patterns of the .mbedignore file within the directory,
+                 or None when there is no such file
+    resources - a Resources object holding only what was found directly
+                within the directory
+    features - a list of (feature name, directory) tuples
+    children - a list of (directory name, DirRecord) tuples for the
+               subdirectories that were traversed, in traversal order
+    """
+    __slots__ = ['mtime', 'ignore_key', 'mbedignore', 'resources', 'features',
+                 'children']
+
+    def __init__(self, mtime, ignore_key, mbedignore, resources, features):
+        self.mtime = mtime
+        self.ignore_key = ignore_key
+        self.mbedignore = mbedignore
+        self.resources = resources
+        self.features = features
+        self.children = []
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+
+class PickledIndex(object):
+    """A dictionary that is kept in a file between builds"""
+    VERSION = 1
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.entries = {}
+        self.dirty = False
+
+    def load(self):
+        """Load the index from disk. A missing, stale or unreadable index
+        is treated as empty"""
+        try:
+            with open(self.filename, "rb") as cache_file:
+                version, entries = pickle.load(cache_file)
+        except Exception:
+            return
+        if version == self.VERSION:
+            self.entries = entries
+
+    def save(self):
+        """Write the index to disk, when it was changed"""
+        if not self.dirty:
+            return
+        try:
+            with open(self.filename, "wb") as cache_file:
+                pickle.dump((self.VERSION, self.entries), cache_file,
+                            protocol=2)
+            self.dirty = False
+        except (IOError, OSError):
+            pass
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, entry):
+        if self.entries.get(key) is not entry:
+            self.entries[key] = entry
+            self.dirty = True
+
+    def remove(self, key):
+        if self.entries.pop(key, None) is not None:
+            self.dirty = True
+
+
+class ScanCache(PickledIndex):
+    """An on-disk index of previous resource scans
+
+    The index maps a scan key, which describes everything that influences a
+    scan apart from the scanned tree itself, to the DirRecord of the top
+    directory of that scan.
+    """
+
+
+class DependencyCache(PickledIndex):
+    """An on-disk index of parsed dependency files
+
+    The index maps the path of a dependency file to a tuple of the
+    (mtime, size) of the file when it was parsed and the list of
+    dependencies found in it.
+    """
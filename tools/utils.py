@@ -19,6 +19,7 @@ import sys
 import inspect
 import os
 import argparse
+import errno
 import math
 from os import listdir, remove, makedirs
 from shutil import copyfile
@@ -29,6 +30,8 @@ from math import ceil
 import json
 from collections import OrderedDict
 import logging
+from threading import current_thread
+from time import time
 from intelhex import IntelHex
 
 try:
@@ -46,7 +49,12 @@ def compile_worker(job):
     Positional argumets:
     job - a dict containing a list of commands and the remaining arguments
           to run_cmd
+
+    The result includes the time that the job was 'queued', if the job
+    records it, the times that compiling started and ended, in 'start' and
+    'end', and the 'worker' process and thread that compiled.
     """
+    start = time()
     results = []
     for command in job['commands']:
         try:
@@ -65,9 +73,17 @@ def compile_worker(job):
         'source': job['source'],
         'object': job['object'],
         'commands': job['commands'],
-        'results': results
+        'results': results,
+        'queued': job.get('queued'),
+        'start': start,
+        'end': time(),
+        'worker': worker_id()
     }
 
+def worker_id():
+    """Identify the process and thread that runs a job"""
+    return "%d:%d" % (os.getpid(), current_thread().ident)
+
 def cmd(command, check=True, verbose=False, shell=False, cwd=None):
     """A wrapper to run a command as a blocking job"""
     text = command if shell else ' '.join(command)
@@ -176,7 +192,38 @@ def mkdir(path):
     path - the path to maybe create
     """
     if not exists(path):
-        makedirs(path)
+        try:
+            makedirs(path)
+        except OSError as exc:
+            # Another build may create the same directory at the same time
+            if exc.errno != errno.EEXIST or not isdir(path):
+                raise
+
+
+def replace_file(src, dst):
+    """ Copy a file over another through a temporary file that is renamed,
+    so that builds reading the destination at the same time never see a
+    partial file
+
+    Positional arguments:
+    src - the file to copy
+    dst - the file to replace
+    """
+    head, tail = split(dst)
+    temp_path = join(head, ".%s.%d.%d" % (tail, os.getpid(),
+                                          current_thread().ident))
+    try:
+        copyfile(src, temp_path)
+        try:
+            os.rename(temp_path, dst)
+        except OSError:
+            # Windows does not rename over an existing file
+            remove(dst)
+            os.rename(temp_path, dst)
+    except BaseException:
+        if exists(temp_path):
+            remove(temp_path)
+        raise
 
 
 def copy_file(src, dst):